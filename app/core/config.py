@@ -3,6 +3,44 @@ import os
 # so during tests the real images are not replaced by test images
 IMAGES_DIR = os.environ.get("IMAGES_DIR", "./images")
 
+# optional path where approximate similarity index is stored between restarts (e.g. ./similarity_index.npz)
+SIMILARITY_INDEX_PATH = os.environ.get("SIMILARITY_INDEX_PATH")
+
+# SQLite database of materials (relative to the working directory)
+DATABASE_PATH = os.environ.get("DATABASE_PATH", "./materials.db")
+# read-only connections of each worker, writes use their own pool and are executed one at a time by the database writer
+DATABASE_READ_POOL_SIZE = int(os.environ.get("DATABASE_READ_POOL_SIZE", 8))
+# pragmas set on every connection - with WAL journal NORMAL synchronous never corrupts the DB (a commit can be lost on power loss)
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)) # bytes of the DB file mapped to memory
+SQLITE_CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE", 64 * 1024)) # KiB of page cache per connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)) # how long a connection waits for a lock held by another worker
+
+# fingerprinting models are loaded at startup, when disabled (PRELOAD_MODELS=0) they are loaded by the first analysis
+# (for workers that only serve the catalogue, startup then does not import torch and CLIP)
+PRELOAD_MODELS = os.environ.get("PRELOAD_MODELS", "1").lower() not in ("0", "false", "no")
+
+# size of the pool for image analysis (CLIP inference), number of CPU cores when not set
+ANALYSIS_WORKERS = int(os.environ["ANALYSIS_WORKERS"]) if "ANALYSIS_WORKERS" in os.environ else None
+# maximum number of analyses running or waiting at once, further requests are rejected with 503 (4 x workers when not set)
+ANALYSIS_QUEUE_SIZE = int(os.environ["ANALYSIS_QUEUE_SIZE"]) if "ANALYSIS_QUEUE_SIZE" in os.environ else None
+
+# concurrent analyses are batched for inference - at most this many materials in one batch
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", 8))
+# how long the first analysis waits for others to join its batch
+INFERENCE_MAX_WAIT_MS = float(os.environ.get("INFERENCE_MAX_WAIT_MS", 5))
+
+# ratings of analysed image pairs are cached, re-uploaded images skip inference
+# number of entries in the in-process cache of each worker (0 disables it)
+FINGERPRINT_CACHE_SIZE = int(os.environ.get("FINGERPRINT_CACHE_SIZE", 1024))
+# number of entries in the cache table in the DB shared by all workers (0 disables it)
+FINGERPRINT_CACHE_DB_SIZE = int(os.environ.get("FINGERPRINT_CACHE_DB_SIZE", 0))
+
+# stored materials get materialized lists of their most similar materials (0 disables them), built in the background at
+# startup and updated when materials are stored, similar materials of a stored material are read from its list when the
+# requested page is in it
+NEIGHBOUR_LIST_SIZE = int(os.environ.get("NEIGHBOUR_LIST_SIZE", 0))
+
 # returns full image path
 def get_image_path(filename: str) -> str:
     os.makedirs(IMAGES_DIR, exist_ok=True)
@@ -15,4 +53,8 @@ def get_specular_image_name(id: int) -> str:
     return f"{id}{SPECULAR_IMAGE_NAME_SUFFIX}"
 
 def get_non_specular_image_name(id: int) -> str:
-    return f"{id}{NON_SPECULAR_IMAGE_NAME_SUFFIX}"
\ No newline at end of file
+    return f"{id}{NON_SPECULAR_IMAGE_NAME_SUFFIX}"
+
+# rendered plots of ratings are cached beside the images, key identifies the ratings and style of the plot
+def get_plot_image_name(id: int, kind: str, key: str) -> str:
+    return f"{id}_{kind}_plot_{key}.png"
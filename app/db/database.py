@@ -1,17 +1,72 @@
-from sqlalchemy import create_engine
+import sqlite3
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = 'sqlite:///materials.db'
+import app.core.config as config
+
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+def set_sqlite_pragmas(dbapi_connection, read_only: bool):
+    if config.SQLITE_SYNCHRONOUS not in SYNCHRONOUS_MODES:
+        raise ValueError(f"Invalid SQLITE_SYNCHRONOUS {config.SQLITE_SYNCHRONOUS}, expected one of {SYNCHRONOUS_MODES}")
+
+    cursor = dbapi_connection.cursor()
+    try:
+        if not read_only: # WAL is stored in the DB file, readers then neither block the writer nor wait for it
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(config.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA mmap_size={int(config.SQLITE_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA cache_size={-int(config.SQLITE_CACHE_SIZE)}") # negative value is in KiB, not pages
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+def unicode_lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+@event.listens_for(Engine, "connect")
+def register_sqlite_functions(dbapi_connection, _):
+    # lower() of SQLite changes only ASCII letters, names are compared with unicode_lower() - the same case folding as
+    # in the name index (FTS5 folds all letters) - on every SQLite engine, including DBs of tests and benchmarks
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function("unicode_lower", 1, unicode_lower, deterministic=True)
+
+def create_sqlite_engine(path: str, read_only: bool = False, pool_size: int = 1, max_overflow: int = 0) -> Engine:
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        pool_size=pool_size,
+        max_overflow=max_overflow
+    )
+    event.listen(engine, "connect", lambda dbapi_connection, _: set_sqlite_pragmas(dbapi_connection, read_only))
+    return engine
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+def get_pool_status(engine: Engine) -> dict:
+    pool = engine.pool
+    return {"size": pool.size(), "checked_out": pool.checkedout(), "overflow": max(pool.overflow(), 0)}
+
+# writes (materials by the database writer, fingerprint cache, startup) - few connections, the writer uses one of them
+engine = create_sqlite_engine(config.DATABASE_PATH, pool_size=2, max_overflow=2)
+# reads of requests
+read_engine = create_sqlite_engine(config.DATABASE_PATH, read_only=True, pool_size=config.DATABASE_READ_POOL_SIZE, max_overflow=config.DATABASE_READ_POOL_SIZE)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+def get_write_bind(bind: Engine) -> Engine:
+    # engine for writes of a request session (sessions of the read engine cannot write)
+    return engine if bind is read_engine else bind
+
+def get_read_bind(bind: Engine) -> Engine:
+    # engine identifying the database of a session, sessions of both app engines share what is cached per database
+    return read_engine if bind is engine else bind
 
-def get_db(): # provides DB session for each request
-    db = SessionLocal()
+def get_db(): # provides DB session for each request, writes go through the database writer
+    db = ReadSessionLocal()
     try:
         yield db
     finally:
@@ -0,0 +1,98 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class DatabaseWriter:
+    # writes of materials are executed one at a time by one thread of the worker - concurrent analyses wait in this queue
+    # instead of competing for the SQLite write lock in busy timeouts, readers are not blocked (WAL)
+    # each write opens its own session on the write engine, so the request session stays read only
+
+    def __init__(self):
+        self._queue: "queue.Queue[Optional[Tuple[Callable, Future, float]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        self.writes = 0
+        self.failed_writes = 0
+        self.wait_time_seconds = 0.0 # time writes spent in the queue
+        self.max_wait_time_seconds = 0.0
+        self.write_time_seconds = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="database-writer", daemon=True)
+                self._thread.start()
+
+    def shutdown(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None) # writes already in the queue are executed before the thread stops
+            thread.join()
+
+    def submit(self, write: Callable[[], T]) -> Future:
+        self.start() # writer is normally started in app lifespan
+        future = Future()
+        self._queue.put((write, future, time.perf_counter()))
+        return future
+
+    def run(self, write: Callable[[], T]) -> T:
+        # executes write on the writer thread and waits for its result (or exception)
+        if threading.current_thread() is self._thread: # write from another write would wait for itself
+            return write()
+        return self.submit(write).result()
+
+    def get_status(self) -> dict:
+        with self._lock:
+            completed = self.writes + self.failed_writes
+            return {
+                "writes": self.writes,
+                "failed_writes": self.failed_writes,
+                "pending_writes": self._queue.qsize(),
+                "average_wait_seconds": self.wait_time_seconds / completed if completed else None,
+                "max_wait_seconds": self.max_wait_time_seconds,
+                "average_write_seconds": self.write_time_seconds / completed if completed else None,
+            }
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            write, future, submitted_at = item
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            started_at = time.perf_counter()
+            result, error = None, None
+            try:
+                result = write()
+            except Exception as e:
+                logger.exception("Database write failed")
+                error = e
+
+            with self._lock: # counted before the result is returned, so the writer of a finished write sees it in the status
+                if error is None:
+                    self.writes += 1
+                else:
+                    self.failed_writes += 1
+                self.wait_time_seconds += started_at - submitted_at
+                self.max_wait_time_seconds = max(self.max_wait_time_seconds, started_at - submitted_at)
+                self.write_time_seconds += time.perf_counter() - started_at
+
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+# one writer per worker process
+database_writer = DatabaseWriter()
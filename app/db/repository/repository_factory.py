@@ -2,8 +2,18 @@ from fastapi import Depends
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
+from app.db.repository.sqlite_material_neighbours_repository import SQLiteMaterialNeighboursRepository
 from app.db.repository.sqlite_material_repository import SQLiteMaterialRepository
+from app.db.repository.sqlite_material_statistics_repository import SQLiteMaterialStatisticsRepository
+from app.domain.repository.material_neighbours_repository import MaterialNeighboursRepository
 from app.domain.repository.material_repository import MaterialRepository
+from app.domain.repository.material_statistics_repository import MaterialStatisticsRepository
 
 def get_material_repository(db: Session = Depends(get_db)) -> MaterialRepository:
-    return SQLiteMaterialRepository(db)
\ No newline at end of file
+    return SQLiteMaterialRepository(db)
+
+def get_material_statistics_repository(db: Session = Depends(get_db)) -> MaterialStatisticsRepository:
+    return SQLiteMaterialStatisticsRepository(db)
+
+def get_material_neighbours_repository(db: Session = Depends(get_db)) -> MaterialNeighboursRepository:
+    return SQLiteMaterialNeighboursRepository(db)
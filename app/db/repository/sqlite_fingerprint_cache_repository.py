@@ -0,0 +1,59 @@
+import time
+from typing import Optional, Callable
+
+import numpy as np
+from sqlalchemy import select, delete, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.db.database_writer import database_writer
+from app.domain.repository.fingerprint_cache_repository import FingerprintCacheRepository
+from app.models.fingerprint_cache_entry import FingerprintCacheEntry
+
+class SQLiteFingerprintCacheRepository(FingerprintCacheRepository):
+    # uses its own short sessions, the cache is accessed from analysis workers, not from request sessions
+    # writes go through the database writer, so they do not compete with stored materials for the write lock
+
+    def __init__(self, session_factory: Callable[[], Session], max_entries: int, touch_interval_seconds: float = 60.0):
+        self.session_factory = session_factory
+        self.max_entries = max_entries
+        # hits move an entry to the front of the LRU order only when it was last used longer ago than this, so most hits
+        # do not write (eviction order is then only this precise)
+        self.touch_interval_seconds = touch_interval_seconds
+
+    def get_ratings(self, key: str) -> Optional[np.ndarray]:
+        with self.session_factory() as db:
+            entry = db.execute(select(FingerprintCacheEntry.ratings, FingerprintCacheEntry.last_used_at).where(FingerprintCacheEntry.key == key)).one_or_none()
+        if entry is None:
+            return None
+
+        ratings, last_used_at = entry
+        now = time.time()
+        if now - last_used_at >= self.touch_interval_seconds:
+            database_writer.submit(lambda: self._touch(key, now)) # the hit does not wait for the write
+        return np.frombuffer(ratings, dtype=np.float32).copy()
+
+    def add_ratings(self, key: str, ratings: np.ndarray):
+        # the same images can be analysed by two workers at once, the later one only refreshes the entry
+        statement = insert(FingerprintCacheEntry).values(
+            key=key,
+            ratings=np.asarray(ratings, dtype=np.float32).tobytes(),
+            last_used_at=time.time()
+        )
+        statement = statement.on_conflict_do_update(index_elements=[FingerprintCacheEntry.key], set_={"last_used_at": statement.excluded.last_used_at})
+
+        def write():
+            with self.session_factory() as db:
+                db.execute(statement)
+
+                # size based eviction of least recently used entries
+                stale = select(FingerprintCacheEntry.key).order_by(FingerprintCacheEntry.last_used_at.desc()).offset(self.max_entries)
+                db.execute(delete(FingerprintCacheEntry).where(FingerprintCacheEntry.key.in_(stale)))
+                db.commit()
+
+        database_writer.run(write)
+
+    def _touch(self, key: str, used_at: float):
+        with self.session_factory() as db:
+            db.execute(update(FingerprintCacheEntry).where(FingerprintCacheEntry.key == key).values(last_used_at=used_at))
+            db.commit()
@@ -0,0 +1,142 @@
+from typing import Optional, Tuple, Callable, TypeVar
+
+import numpy as np
+from sqlalchemy import select, func, update, delete, insert
+from sqlalchemy.orm import Session
+
+from app.db.database import get_write_bind
+from app.db.database_writer import database_writer
+from app.domain.repository.material_neighbours_repository import MaterialNeighboursRepository
+from app.domain.similarity.material_similarity import calculate_similarity_batch
+from app.domain.similarity.neighbour_lists import insert_neighbour, get_entry_threshold
+from app.domain.similarity.similarity_engine import select_top_k
+from app.models.material import Material, CHARACTERISTICS_COLUMNS
+from app.models.material_neighbours import MaterialNeighbours, MaterialNeighboursState
+
+T = TypeVar("T")
+
+STATE_ID = 1
+MAX_IDS_PER_QUERY = 500 # SQLite limits number of bound parameters in one statement
+MAX_ADDED_MATERIALS = 1000 # more materials stored without the lists (e.g. populated directly to DB) are left for the bulk build
+
+
+class SQLiteMaterialNeighboursRepository(MaterialNeighboursRepository):
+    def __init__(self, db_session: Session):
+        self.db = db_session
+
+    def get_neighbours(self, material_id: int, size: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        # list of the material together with the state, which has to include the last stored material
+        statement = select(MaterialNeighbours.neighbour_ids, MaterialNeighbours.similarities) \
+            .join(MaterialNeighboursState, MaterialNeighboursState.id == STATE_ID) \
+            .where(
+                MaterialNeighbours.material_id == material_id,
+                MaterialNeighboursState.size == size,
+                MaterialNeighboursState.max_material_id == select(func.max(Material.id)).scalar_subquery()
+            )
+        row = self.db.execute(statement).first()
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.int64), np.frombuffer(row[1], dtype=np.float64)
+
+    def is_up_to_date(self, size: int) -> bool:
+        state = self.db.execute(select(MaterialNeighboursState.size, MaterialNeighboursState.max_material_id)).first()
+        max_id = self.db.execute(select(func.max(Material.id))).scalar() or 0
+        return state is not None and state.size == size and state.max_material_id == max_id
+
+    def replace_neighbours(self, ids: np.ndarray, vectors: np.ndarray, neighbour_positions: np.ndarray, similarities: np.ndarray, size: int):
+        ids = np.asarray(ids, dtype=np.int64)
+
+        def write(db: Session):
+            db.execute(delete(MaterialNeighbours))
+            for start in range(0, len(ids), MAX_IDS_PER_QUERY):
+                db.execute(insert(MaterialNeighbours), [
+                    {
+                        "material_id": int(ids[i]),
+                        "neighbour_ids": ids[neighbour_positions[i]].tobytes(),
+                        "similarities": similarities[i].tobytes(),
+                        "threshold": get_entry_threshold(similarities[i], size)
+                    }
+                    for i in range(start, min(start + MAX_IDS_PER_QUERY, len(ids)))
+                ])
+            db.merge(MaterialNeighboursState(id=STATE_ID, size=size, max_material_id=int(ids[-1]) if len(ids) else 0))
+            db.flush()
+            self._add_new_materials(db, ids, vectors, size) # materials stored while the lists were computed
+
+        self._write(write)
+
+    def update_neighbours(self, ids: np.ndarray, vectors: np.ndarray, size: int) -> int:
+        return self._write(lambda db: self._add_new_materials(db, np.asarray(ids, dtype=np.int64), vectors, size))
+
+    def _write(self, write: Callable[[Session], T]) -> T:
+        write_bind = get_write_bind(self.db.get_bind())
+
+        def run():
+            with Session(bind=write_bind) as db:
+                # the transaction holds the write lock from its start (no-op update), so the lists are read and written
+                # by one worker at a time and no material is stored in the meantime
+                db.execute(update(MaterialNeighboursState).values(size=MaterialNeighboursState.size))
+                result = write(db)
+                db.commit()
+                return result
+
+        return database_writer.run(run)
+
+    def _add_new_materials(self, db: Session, ids: np.ndarray, vectors: np.ndarray, size: int) -> int:
+        # materials are added in the order they were stored - each gets the list of materials stored before it and enters
+        # the lists of those materials where it is more similar than their last neighbour (similarity is symmetric)
+        state = db.get(MaterialNeighboursState, STATE_ID)
+        if state is None or state.size != size:
+            return 0 # lists were not built (with this size)
+
+        # materials stored after the caller read them
+        rows = db.execute(select(Material.id, *CHARACTERISTICS_COLUMNS).where(Material.id > (int(ids[-1]) if len(ids) else 0)).order_by(Material.id)).all()
+        if rows:
+            ids = np.concatenate((ids, np.array([row[0] for row in rows], dtype=np.int64)))
+            vectors = np.concatenate((vectors, np.array([row[1:] for row in rows], dtype=vectors.dtype)))
+
+        start = int(np.searchsorted(ids, state.max_material_id, side="right"))
+        if start == len(ids) or len(ids) - start > MAX_ADDED_MATERIALS:
+            return 0
+
+        thresholds = np.full(len(ids), np.nan) # nan - list is not full
+        has_list = np.zeros(len(ids), dtype=bool)
+        for material_id, threshold in db.execute(select(MaterialNeighbours.material_id, MaterialNeighbours.threshold)):
+            position = np.searchsorted(ids, material_id)
+            if position < len(ids) and ids[position] == material_id:
+                has_list[position] = True
+                thresholds[position] = np.nan if threshold is None else threshold
+
+        for position in range(start, len(ids)):
+            similarities = calculate_similarity_batch(vectors[position], vectors[:position + 1])
+            selected = select_top_k(similarities, limit=size)
+            threshold = get_entry_threshold(similarities[selected], size)
+            db.merge(MaterialNeighbours(
+                material_id=int(ids[position]),
+                neighbour_ids=ids[selected].tobytes(),
+                similarities=similarities[selected].tobytes(),
+                threshold=threshold
+            ))
+            has_list[position] = True
+            thresholds[position] = np.nan if threshold is None else threshold
+
+            keys = np.where(np.isnan(similarities[:position]), -np.inf, similarities[:position])
+            entered = np.flatnonzero(has_list[:position] & (np.isnan(thresholds[:position]) | (keys > thresholds[:position])))
+            for chunk_start in range(0, len(entered), MAX_IDS_PER_QUERY):
+                chunk = ids[entered[chunk_start:chunk_start + MAX_IDS_PER_QUERY]].tolist()
+                for entry in db.scalars(select(MaterialNeighbours).where(MaterialNeighbours.material_id.in_(chunk))):
+                    entry_position = int(np.searchsorted(ids, entry.material_id))
+                    result = insert_neighbour(
+                        np.frombuffer(entry.neighbour_ids, dtype=np.int64),
+                        np.frombuffer(entry.similarities, dtype=np.float64),
+                        int(ids[position]),
+                        float(similarities[entry_position]),
+                        size
+                    )
+                    if result is None:
+                        continue
+                    entry.neighbour_ids, entry.similarities = result[0].tobytes(), result[1].tobytes()
+                    entry.threshold = get_entry_threshold(result[1], size)
+                    thresholds[entry_position] = np.nan if entry.threshold is None else entry.threshold
+
+        state.max_material_id = int(ids[-1])
+        return len(ids) - start
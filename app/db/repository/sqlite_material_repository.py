@@ -1,10 +1,42 @@
-from typing import List, Optional
-from sqlalchemy import func
+import math
+import threading
+import weakref
+from typing import List, Optional, Tuple, Iterator
+from sqlalchemy import func, select, type_coerce, cast, String, LargeBinary, or_, and_, literal_column, table, column, union_all
 from sqlalchemy.orm import Session
 
+from app.db.database import get_read_bind, get_write_bind
+from app.db.database_writer import database_writer
 from app.domain.repository.material_repository import MaterialRepository
-from app.models.material import Material
+from app.domain.similarity.similarity_engine import SimilarityEngine
+from app.models.material import Material, CHARACTERISTICS_COLUMNS
+from app.models.material_name_search import MATERIAL_NAME_SEARCH_TABLE
 from app.schemas.material_category import MaterialCategory
+from app.schemas.name_match import NameMatch
+
+# similarity engines are shared by all sessions (requests, startup, neighbour lists) of the same database - sessions of
+# the read and write engines of the app use one engine
+# weak keys so engines of dropped databases (e.g. in-memory DBs in tests) are released
+_similarity_engines: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_similarity_engines_lock = threading.Lock()
+
+MAX_IDS_PER_QUERY = 500 # SQLite limits number of bound parameters in one statement
+
+# lower() of SQLite changes only ASCII letters
+SQLITE_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+# names are searched in the trigram index, which matches only filters of at least 3 characters
+MIN_SEARCH_LENGTH = 3
+FUZZY_MIN_SCORE = 0.5 # share of trigrams of the filter found in the name
+FUZZY_TYPO_TRIGRAMS = 3 # trigrams of the filter one changed character can break, short filters need only the rest
+FUZZY_MAX_TRIGRAMS = 32
+
+name_search = table(MATERIAL_NAME_SEARCH_TABLE, column("rowid"))
+
+# columns loaded into similarity engine
+SIMILARITY_COLUMNS = [Material.id, Material.category, *CHARACTERISTICS_COLUMNS]
+# columns of material rows (projection without ORM objects), category as stored string (not converted to enum for every row)
+MATERIAL_ROW_COLUMNS = [Material.id, Material.name, type_coerce(Material.category, String), *CHARACTERISTICS_COLUMNS]
 
 
 class SQLiteMaterialRepository(MaterialRepository):
@@ -16,20 +48,222 @@ class SQLiteMaterialRepository(MaterialRepository):
 
     def get_materials(self,
                       name_filter: Optional[str] = None,
-                      categories: Optional[List[MaterialCategory]] = None) -> List[Material]:
+                      categories: Optional[List[MaterialCategory]] = None,
+                      name_match: NameMatch = NameMatch.SUBSTRING) -> List[Material]:
+
+        return self.db.scalars(self._filter_materials(select(Material), name_filter, categories, name_match)).all()
+
+    def get_material_rows(self,
+                          name_filter: Optional[str] = None,
+                          categories: Optional[List[MaterialCategory]] = None,
+                          after: Optional[Tuple[str, int]] = None,
+                          limit: Optional[int] = None,
+                          name_match: NameMatch = NameMatch.SUBSTRING) -> List[tuple]:
+
+        statement = self._filter_materials(select(*MATERIAL_ROW_COLUMNS), name_filter, categories, name_match)
+
+        if after is not None:
+            # same as (lower(name), id) > after, but in the form SQLite can search in the index with (row value is a scan)
+            after_name, after_id = after
+            lower_name = func.lower(Material.name)
+            statement = statement.where(lower_name >= after_name, or_(lower_name > after_name, Material.id > after_id))
+
+        if limit is not None:
+            statement = statement.limit(limit)
 
-        query = self.db.query(Material).order_by(func.lower(Material.name))
+        return self._get_rows(statement)
+
+    def get_material_row_key(self, row: tuple) -> Tuple[str, int]:
+        return row[1].translate(SQLITE_LOWER), row[0]
+
+    def iterate_material_rows(self,
+                              name_filter: Optional[str] = None,
+                              categories: Optional[List[MaterialCategory]] = None,
+                              after: Optional[Tuple[str, int]] = None,
+                              page_size: int = 1000,
+                              name_match: NameMatch = NameMatch.SUBSTRING) -> Iterator[tuple]:
+        # streamed responses are sent after the request session was closed by its dependency, the session is used
+        # again for each page and closed right after it, so no connection is held while the page is being sent
+        while True:
+            rows = self.get_material_rows(name_filter, categories, after=after, limit=page_size, name_match=name_match)
+            self.db.close()
+            yield from rows
+
+            if len(rows) < page_size:
+                return
+            after = self.get_material_row_key(rows[-1])
+
+    def search_material_ids(self, name: str, name_match: NameMatch = NameMatch.SUBSTRING) -> List[int]:
+        statement = _search_name_ids(name, name_match)
+        if statement is None:
+            statement = select(Material.id).where(_get_name_condition(name, name_match))
+        return self.db.execute(statement).scalars().all()
+
+    def search_material_rows(self,
+                             name: str,
+                             categories: Optional[List[MaterialCategory]] = None,
+                             limit: Optional[int] = None) -> List[Tuple[tuple, float]]:
+        scores = _get_fuzzy_scores(name)
+        if scores is None:
+            return []
+
+        scores = scores.subquery()
+        statement = select(*MATERIAL_ROW_COLUMNS, scores.c.score) \
+            .join(scores, scores.c.id == Material.id) \
+            .order_by(scores.c.score.desc(), func.length(Material.name), func.lower(Material.name), Material.id) # shorter names are closer
+        if categories:
+            statement = statement.where(Material.category.in_(categories))
+        if limit is not None:
+            statement = statement.limit(limit)
+
+        return [(tuple(row[:-1]), row[-1]) for row in self._get_rows(statement)]
+
+    def _filter_materials(self,
+                          statement,
+                          name_filter: Optional[str],
+                          categories: Optional[List[MaterialCategory]],
+                          name_match: NameMatch = NameMatch.SUBSTRING):
+        statement = statement.order_by(func.lower(Material.name), Material.id)
 
         if name_filter:
-            query = query.filter(Material.name.contains(name_filter))
+            statement = statement.where(_get_name_condition(name_filter, name_match))
 
         if categories: # if categories are null then returned materials can have any category
-            query = query.filter(Material.category.in_(categories))
+            statement = statement.where(Material.category.in_(categories))
+
+        return statement
+
+    def _get_rows(self, statement) -> List[tuple]:
+        # Core rows (tuples), no ORM objects and identity map
+        return self.db.execute(statement).all()
+
+    def get_materials_by_ids(self, material_ids: List[int]) -> List[Material]:
+        materials = {}
+        for start in range(0, len(material_ids), MAX_IDS_PER_QUERY):
+            chunk = material_ids[start:start + MAX_IDS_PER_QUERY]
+            for material in self.db.query(Material).filter(Material.id.in_(chunk)):
+                materials[material.id] = material
 
-        return query.all()
+        return [materials[material_id] for material_id in material_ids if material_id in materials]
+
+    def get_material_rows_by_ids(self, material_ids: List[int]) -> List[tuple]:
+        rows = {}
+        for start in range(0, len(material_ids), MAX_IDS_PER_QUERY):
+            chunk = material_ids[start:start + MAX_IDS_PER_QUERY]
+            for row in self._get_rows(select(*MATERIAL_ROW_COLUMNS).where(Material.id.in_(chunk))):
+                rows[row[0]] = row
+
+        return [rows[material_id] for material_id in material_ids if material_id in rows]
 
     def add_material(self, material: Material) -> Material:
-        self.db.add(material)
-        self.db.commit()
-        self.db.refresh(material) # reloads data from DB = material now has ID assigned from DB and so on
-        return material
\ No newline at end of file
+        write_bind = get_write_bind(self.db.get_bind())
+
+        def write():
+            with Session(bind=write_bind, expire_on_commit=False) as db:
+                db.add(material)
+                db.commit()
+                db.refresh(material) # reloads data from DB = material now has ID assigned from DB and so on
+            return material
+
+        material = database_writer.run(write)
+
+        # new material is inserted to already loaded similarity engine (and its approximate index) right away
+        with _similarity_engines_lock:
+            engine = _similarity_engines.get(get_read_bind(self.db.get_bind()))
+        if engine is not None:
+            self._refresh_similarity_engine(engine)
+
+        return material
+
+    def get_similarity_engine(self) -> SimilarityEngine:
+        bind = get_read_bind(self.db.get_bind())
+        with _similarity_engines_lock:
+            engine = _similarity_engines.get(bind)
+            if engine is None:
+                engine = SimilarityEngine(vector_size=len(CHARACTERISTICS_COLUMNS))
+                _similarity_engines[bind] = engine
+
+        self._refresh_similarity_engine(engine)
+        return engine
+
+    def _refresh_similarity_engine(self, engine: SimilarityEngine):
+        # materials can be added by other workers, so the cached matrix is checked against the DB on every use
+        # (count + max ID is enough because materials are only ever appended)
+        count, max_id = self.db.query(func.count(Material.id), func.max(Material.id)).one()
+        revision = (count, max_id or 0)
+
+        with _similarity_engines_lock:
+            if engine.revision == revision:
+                return
+
+            cached_count, last_id = engine.revision or (0, 0)
+            rows = self.db.query(*SIMILARITY_COLUMNS) \
+                .filter(Material.id > last_id) \
+                .order_by(Material.id) \
+                .all()
+
+            if cached_count + len(rows) != count:
+                # something else than appending happened (e.g. DB was recreated), load everything again
+                engine.clear()
+                rows = self.db.query(*SIMILARITY_COLUMNS).order_by(Material.id).all()
+
+            if rows:
+                engine.add(
+                    ids=[row[0] for row in rows],
+                    vectors=[row[2:] for row in rows],
+                    categories=[row[1] for row in rows]
+                )
+            engine.revision = revision
+
+def _quote(text: str) -> str:
+    # FTS5 string - matched literally, as a sequence of trigrams
+    return '"' + text.replace('"', '""') + '"'
+
+def _search_names(query: str):
+    return select(name_search.c.rowid.label("id")).where(literal_column(MATERIAL_NAME_SEARCH_TABLE).op("MATCH")(query))
+
+def _get_trigrams(name: str) -> List[str]:
+    name = name.lower()
+    return list(dict.fromkeys(name[i:i + 3] for i in range(len(name) - 2)))[:FUZZY_MAX_TRIGRAMS]
+
+def _get_fuzzy_scores(name: str):
+    # select of (id, score) of materials with score >= FUZZY_MIN_SCORE (or with one typo in short names, e.g. "stell"
+    # shares only "ste" with "steel"), None when the name is too short for trigrams
+    # score is the share of trigrams of the name found in the material name, they are counted by one index search per
+    # trigram, so only materials with at least one common trigram are read
+    trigrams = _get_trigrams(name)
+    if not trigrams:
+        return None
+
+    matches = union_all(*(_search_names(_quote(trigram)) for trigram in trigrams)).subquery()
+    shared = select(matches.c.id, func.count().label("shared")).group_by(matches.c.id).subquery()
+    score = shared.c.shared * 1.0 / len(trigrams)
+    min_shared = min(math.ceil(FUZZY_MIN_SCORE * len(trigrams)), max(1, len(trigrams) - FUZZY_TYPO_TRIGRAMS))
+    return select(shared.c.id, score.label("score")).where(shared.c.shared >= min_shared)
+
+def _search_name_ids(name: str, name_match: NameMatch):
+    # select of IDs of the matching materials read only from the name index, None when the name is too short for it
+    if len(name) < MIN_SEARCH_LENGTH:
+        return None
+    if name_match == NameMatch.FUZZY:
+        return select(_get_fuzzy_scores(name).subquery().c.id)
+    return _search_names(("^" if name_match == NameMatch.PREFIX else "") + _quote(name))
+
+def _get_name_condition(name: str, name_match: NameMatch):
+    # all matches are case-insensitive, "_" and "%" in the name are matched literally (not as LIKE wildcards)
+    ids = _search_name_ids(name, name_match)
+    if ids is not None:
+        return Material.id.in_(ids)
+
+    # too short for the trigram index, names are scanned with the same (Unicode) case folding as the index uses
+    # (prefix is used for fuzzy match of 1 or 2 characters too) - lower() of SQLite folds only ASCII letters, which is
+    # enough for ASCII names, only names with other characters are folded by unicode_lower() (a name has them when its
+    # UTF-8 encoding is longer than the name), all is read from the (lower(name), id) index, not from the table
+    lower_name = func.lower(Material.name)
+    def match(value):
+        if name_match == NameMatch.SUBSTRING:
+            return value.contains(name.lower(), autoescape=True)
+        return value.startswith(name.lower(), autoescape=True)
+
+    non_ascii = func.length(cast(lower_name, LargeBinary)) > func.length(lower_name)
+    return or_(match(lower_name), and_(non_ascii, match(func.unicode_lower(lower_name))))
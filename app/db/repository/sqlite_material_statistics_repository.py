@@ -0,0 +1,37 @@
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.db.database import get_write_bind
+from app.db.database_writer import database_writer
+from app.domain.repository.material_statistics_repository import MaterialStatisticsRepository
+from app.models.material_statistics import MaterialStatistics
+
+class SQLiteMaterialStatisticsRepository(MaterialStatisticsRepository):
+    def __init__(self, db_session: Session):
+        self.db = db_session
+
+    def get_statistics(self, material_id: int) -> Optional[np.ndarray]:
+        statistics = self.db.execute(select(MaterialStatistics.statistics).where(MaterialStatistics.material_id == material_id)).scalar()
+        if statistics is None:
+            return None
+        return np.frombuffer(statistics, dtype=np.float64).reshape(2, -1).copy()
+
+    def add_statistics(self, material_id: int, statistics: np.ndarray):
+        # statistics of the same material can be computed by two requests at once, the first stored ones are kept
+        statement = insert(MaterialStatistics).values(
+            material_id=material_id,
+            statistics=np.asarray(statistics, dtype=np.float64).tobytes()
+        )
+        statement = statement.on_conflict_do_nothing(index_elements=[MaterialStatistics.material_id])
+        write_bind = get_write_bind(self.db.get_bind())
+
+        def write():
+            with Session(bind=write_bind) as db:
+                db.execute(statement)
+                db.commit()
+
+        database_writer.run(write)
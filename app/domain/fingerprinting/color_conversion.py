@@ -0,0 +1,77 @@
+# conversion of sRGB images to the Lab and LCh spaces (D65 illuminant, 2° observer) the statistical features operate in
+# same results as skimage.color.rgb2lab + lab2lch up to float32 precision, but fused into a few in-place float32 passes
+# (skimage makes several full size float64 copies of the image), gamma expansion of uint8 images is a lookup table
+
+import threading
+
+import numpy as np
+
+# same constants as in skimage.color
+XYZ_FROM_RGB = np.array([
+	[0.412453, 0.357580, 0.180423],
+	[0.212671, 0.715160, 0.072169],
+	[0.019334, 0.119193, 0.950227]
+])
+D65_WHITE = np.array([0.95047, 1., 1.08883])
+
+def srgb_to_linear(rgb:np.ndarray)->np.ndarray:
+	# gamma expansion of sRGB values in [0, 1]
+	return np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055)**2.4, rgb / 12.92)
+
+class LChConverter:
+
+	def __init__(self) -> None:
+		self._linear_lut = srgb_to_linear(np.arange(256) / 255).astype(np.float32) # uint8 value -> linear rgb
+		self._xyz_matrix = (XYZ_FROM_RGB / D65_WHITE[:, np.newaxis]).T.astype(np.float32) # linear rgb (row) -> xyz relative to the white point
+		self._buffers = threading.local() # buffers are per thread, analyses run in parallel threads
+
+	def convert(self, img:np.ndarray, reuse_buffers:bool=False)->tuple[np.ndarray, np.ndarray]:
+		# returns (img_lab, img_lch) float32 arrays, hue in [0, 2pi) as in skimage
+		# img: rgb HxWx3 or stack NxHxWx3, uint8 or float in [0, 1]
+		# reuse_buffers - results are written to buffers of the calling thread, the next call with reuse_buffers from the same
+		# thread overwrites them (for callers that only use the results until they convert another image)
+		if reuse_buffers:
+			lab, temp, lch = self._get_buffers(img.shape)
+		else:
+			lab, temp, lch = (np.empty(img.shape, dtype=np.float32) for _ in range(3))
+
+		# linear rgb (temporarily in lch)
+		if img.dtype == np.uint8:
+			np.take(self._linear_lut, img, out=lch)
+		else:
+			lch[...] = srgb_to_linear(np.asarray(img, dtype=np.float32))
+
+		# xyz and its nonlinear distortion f(t)
+		np.matmul(lch, self._xyz_matrix, out=lab)
+		np.cbrt(lab, out=temp)
+		small = lab <= 0.008856
+		lab *= 7.787
+		lab += 16 / 116
+		np.copyto(temp, lab, where=small)
+
+		# Lab
+		fx, fy, fz = temp[..., 0], temp[..., 1], temp[..., 2]
+		L, a, b = lab[..., 0], lab[..., 1], lab[..., 2]
+		np.multiply(fy, 116, out=L)
+		L -= 16
+		np.subtract(fx, fy, out=a)
+		a *= 500
+		np.subtract(fy, fz, out=b)
+		b *= 200
+
+		# LCh
+		lch[..., 0] = L
+		np.hypot(a, b, out=lch[..., 1])
+		h = lch[..., 2]
+		np.arctan2(b, a, out=h)
+		np.add(h, 2*np.pi, out=h, where=h < 0)
+
+		return lab, lch
+
+	def _get_buffers(self, shape:tuple)->tuple[np.ndarray, np.ndarray, np.ndarray]:
+		# only buffers of the last used shape are kept (uploaded images have always the same size)
+		buffers = getattr(self._buffers, "arrays", None)
+		if buffers is None or buffers[0].shape != shape:
+			buffers = tuple(np.empty(shape, dtype=np.float32) for _ in range(3))
+			self._buffers.arrays = buffers
+		return buffers
@@ -1,25 +1,45 @@
 # whole code in fingerprinting package was created by Jiri Filip, Veronika Vilimovska and Daniel Pilar
 
 import logging
+import time
 
-import torch
 import numpy as np
-import clip
-import yaml
 
-from typing import Tuple
+from typing import Tuple, TYPE_CHECKING
 
-from app.domain.fingerprinting.source import get_plot_res, get_polar_plot, RATING_CHANGE, MEANS, STDS
+from app.domain.fingerprinting.source import get_plot_res, get_polar_plot, RATING_CHANGE
+from app.domain.fingerprinting.settings import fingerprinting_settings
 
-from app.domain.fingerprinting.veronika_features import StatisticalFeatures
-from app.domain.fingerprinting.fingerprint_clip import MLP, clip_preprocess
+# torch, clip and the statistical features are imported only when FingerPrintAnalyzer is created, so the server (and
+# workers that never analyse images) can import this module without them
+if TYPE_CHECKING:
+    import torch
+    from app.domain.fingerprinting.veronika_features import StatisticalFeatures
 
 class ImageStats:
 
-    def __init__(self, statistics: np.ndarray, normalized_statistics: np.ndarray, ratings: np.ndarray):
+    def __init__(self, statistics: np.ndarray, normalized_statistics: np.ndarray):
         self.statistics = statistics
         self.normalized_statistics = normalized_statistics
 
+
+def normalize_image_statistics(non_specular_stats: np.ndarray, specular_stats: np.ndarray) -> Tuple[ImageStats, ImageStats]:
+    # statistics are normalized by means and stds of the statistics of the training set
+
+    means, stds = fingerprinting_settings.means, fingerprinting_settings.stds
+    non_specular_means = means[:len(means)//2]
+    non_specular_stds = stds[:len(stds)//2]
+    specular_means = means[len(means)//2:]
+    specular_stds = stds[len(stds)//2:]
+
+    non_specular_stats_normalized = (non_specular_stats - non_specular_means) / non_specular_stds
+    specular_stats_normalized = (specular_stats - specular_means) / specular_stds
+
+    non_specular_image_stats = ImageStats(non_specular_stats, non_specular_stats_normalized)
+    specular_image_stats = ImageStats(specular_stats, specular_stats_normalized)
+
+    return non_specular_image_stats, specular_image_stats
+
     
 class MaterialRatings:
 
@@ -42,38 +62,68 @@ class FingerPrintAnalyzer:
         
         logging.debug("Initializing StatisticalFeatures object.")
         
+        self.load_times = {} # seconds spent loading each component, reported by the model registry
+
+        start = time.perf_counter()
+        import torch
+        import clip
+        from app.domain.fingerprinting.fingerprint_clip import MLP
+        from app.domain.fingerprinting.veronika_features import StatisticalFeatures
+        self.load_times["imports"] = time.perf_counter() - start
+
+        start = time.perf_counter()
         self.sf = StatisticalFeatures()
+        self.load_times["statistical_features"] = time.perf_counter() - start
 
 
         logging.debug("Initializing clip model")
         # clip model
+        start = time.perf_counter()
         self.device = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
         self.clip_model, _ = clip.load("ViT-B/32", device=self.device)
         self.clip_model.eval()
+        self.load_times["clip"] = time.perf_counter() - start
 
 
         logging.debug("Initializing custom MLP model")
         # mlp model
+        start = time.perf_counter()
 
-        with open('app/domain/fingerprinting/config.yaml', 'r') as file:
-            config = yaml.safe_load(file)
-        model_path = config['mlp_model_path']
+        model_path = fingerprinting_settings.mlp_model_path
+        self.model_version = fingerprinting_settings.model_version # cached ratings are only valid for the model version they were computed by
 
         self.mlp_model = MLP((2*512,512,512,16)).to(device=self.device)
         checkpoint = torch.load(model_path, map_location=self.device)
         self.mlp_model.load_state_dict(checkpoint["model"])
         self.mlp_model.eval()
+        self.load_times["mlp"] = time.perf_counter() - start
 
 
 
     def get_material_ratings(self, non_specular_image: np.ndarray, specular_image: np.ndarray) -> MaterialRatings:
 
-        
+        imgs = self.preprocess_images(non_specular_image, specular_image)
+        ratings = self.get_ratings_batch(imgs)[0]
+
+        return MaterialRatings(ratings)
+
+    def preprocess_images(self, non_specular_image: np.ndarray, specular_image: np.ndarray) -> "torch.Tensor":
+        import torch
+        from app.domain.fingerprinting.fingerprint_clip import clip_preprocess
 
         logging.debug("Preprocessing images for clip and MLP features computation")
         target_sz = 256 # smaller of the two dimensions after resize; this size needs to be set so that it corresponds in DPI to height=256 on the training set (the trainig set images are downscaled from 412 to 256 in height)
         imgs = [clip_preprocess(image, target_sz) for image in (non_specular_image, specular_image)]
-        imgs = torch.stack(imgs, dim=0).to(device=self.device) # input frames as batch
+        return torch.stack(imgs, dim=0) # input frames as batch (non specular, specular)
+
+    def get_ratings_batch(self, imgs: "torch.Tensor") -> np.ndarray:
+        # imgs: preprocessed pairs of images of N materials stacked to one batch (2N x 3 x 224 x 224) in order
+        # non specular 1, specular 1, non specular 2, specular 2, ...; returns ratings of the materials (N x 16)
+        # running more materials at once uses CPU much better than batch of one pair
+
+        import torch
+
+        imgs = imgs.to(device=self.device)
 
         with torch.no_grad():
 
@@ -83,32 +133,22 @@ class FingerPrintAnalyzer:
 
             logging.debug("Computing rating using MLP model")
             # run mlp
-            features = features.reshape(1, 2*512).to(dtype=torch.float32)
+            features = features.reshape(-1, 2*512).to(dtype=torch.float32)
             fingerprint = self.mlp_model(features).cpu().numpy()
 
-
-            ratings = fingerprint[0]
-        
-
-        return MaterialRatings(ratings)
+        return fingerprint
     
     def get_image_statistics(self, non_specular_image: np.ndarray, specular_image: np.ndarray) -> Tuple[ImageStats, ImageStats]:
-        
-        logging.debug("Computing non-specular image stats")
-        non_specular_stats= self.sf.compute(non_specular_image)
+        return get_image_statistics(self.sf, non_specular_image, specular_image)
 
-        logging.debug("Computing specular image stats")
-        specular_stats = self.sf.compute(specular_image)
-    
-        non_specular_means = MEANS[:len(MEANS)//2]
-        non_specular_stds = STDS[:len(STDS)//2]
-        specular_means = MEANS[len(MEANS)//2:]
-        specular_stds = STDS[len(STDS)//2:]
 
-        non_specular_stats_normalized = (non_specular_stats - non_specular_means) / non_specular_stds
-        specular_stats_normalized = (specular_stats - specular_means) / specular_stds
+def get_image_statistics(sf: "StatisticalFeatures", non_specular_image: np.ndarray, specular_image: np.ndarray) -> Tuple[ImageStats, ImageStats]:
+    # statistics need only the statistical features, not CLIP and the MLP
+
+    logging.debug("Computing non-specular image stats")
+    non_specular_stats= sf.compute(non_specular_image)
 
-        non_specular_image_stats = ImageStats(non_specular_stats, non_specular_stats_normalized)
-        specular_image_stats = ImageStats(specular_stats, specular_stats_normalized)
+    logging.debug("Computing specular image stats")
+    specular_stats = sf.compute(specular_image)
 
-        return non_specular_image_stats, specular_image_stats
\ No newline at end of file
+    return normalize_image_statistics(non_specular_stats, specular_stats)
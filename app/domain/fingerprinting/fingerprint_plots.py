@@ -0,0 +1,109 @@
+# rendering of the line and polar plots of material ratings (same plots as get_plot_res and get_polar_plot in source.py)
+# each kind of plot is a figure template built once - axes, labels, ticks and layout are reused and only the data and
+# color of the line are updated for every rendered material
+
+import io
+import threading
+
+import numpy as np
+from PIL import Image
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from app.domain.fingerprinting.ratings import RATING_NAMES, RATING_CHANGE
+
+PLOT_KINDS = ("line", "polar")
+
+class LinePlotTemplate:
+
+    def __init__(self, size=(15, 9), ylim=(-2.5, 2.5, 0.5), label="Predicted PHOTO"):
+        self.figure = Figure(figsize=size)
+        FigureCanvasAgg(self.figure)
+        ax = self.figure.add_subplot()
+
+        self.line, = ax.plot(RATING_NAMES, np.zeros(len(RATING_NAMES)), marker="o", label=label, linestyle='-', linewidth=2)
+        self.legend = ax.legend(loc='upper center', fontsize=12)
+        ax.grid(alpha=0.5, linestyle='--', linewidth=0.5)
+        ax.set_xticks(range(len(RATING_NAMES)), RATING_NAMES, rotation=45, ha="right", fontsize=10)
+        ax.set_ylim(ylim[0], ylim[1])
+        ax.set_yticks(np.arange(ylim[0], ylim[1]+ylim[2], ylim[2]))
+        ax.set_ylabel('Rating', fontsize=12)
+        ax.set_xlabel('Rating Categories', fontsize=12)
+        ax.set_title('Rating Plot', fontsize=14)
+        self.figure.tight_layout()
+
+    def update(self, ratings: np.ndarray, color: str):
+        self.line.set_ydata(ratings)
+        self.line.set_color(color)
+        self.legend.get_lines()[0].set_color(color)
+
+class PolarPlotTemplate:
+
+    def __init__(self, size=(15, 10), ylim=(-2.5, 2.5), zero_width=0.01, zero_color="black", line_width=2,
+                 label_size_x=15, label_size_y=15, fill_rate=0.05):
+        self.figure = Figure(figsize=size)
+        FigureCanvasAgg(self.figure)
+        ax = self.figure.add_subplot(111, polar=True)
+
+        ratings = np.array(RATING_NAMES)[RATING_CHANGE]
+        theta = np.linspace(0, 2 * np.pi, len(ratings), endpoint=False)
+        self.theta = np.concatenate((theta, [theta[0]])) # closed line
+
+        # Black circle around 0
+        ax.fill_between(np.linspace(0, 2*np.pi, 100), -zero_width, zero_width, color=zero_color, zorder=10)
+
+        self.line, = ax.plot(self.theta, np.zeros(len(self.theta)), marker="o", linewidth=line_width)
+        self.fill, = ax.fill(self.theta, np.zeros(len(self.theta)), alpha=fill_rate)
+
+        ax.set_thetagrids((theta * 180/np.pi), ratings)
+        ax.set_theta_offset(np.pi / 2)
+        ax.set_theta_direction(direction='clockwise')
+
+        # Positioning the labels around the circle
+        for label, angle in zip(ax.get_xticklabels(), theta):
+            if angle in (0, np.pi):
+                label.set_horizontalalignment('center')
+            elif 0 < angle < np.pi:
+                label.set_horizontalalignment('left')
+            else:
+                label.set_horizontalalignment('right')
+
+        ax.set_ylim(ylim[0], ylim[1])
+        ax.tick_params(axis="y", labelsize=label_size_y)
+        ax.tick_params(axis="x", labelsize=label_size_x)
+        ax.set_rlabel_position(180 / len(ratings))
+
+    def update(self, ratings: np.ndarray, color: str):
+        data = np.asarray(ratings)[RATING_CHANGE]
+        data = np.concatenate((data, [data[0]]))
+        self.line.set_ydata(data)
+        self.line.set_color(color)
+        self.fill.set_xy(np.column_stack((self.theta, data)))
+        self.fill.set_color(color)
+
+class PlotRenderer:
+    # templates are created on first use, rendering with a template is serialized (matplotlib figures are not thread safe)
+
+    def __init__(self):
+        self._templates = {}
+        self._locks = {kind: threading.Lock() for kind in PLOT_KINDS}
+
+    def render_png(self, kind: str, ratings: np.ndarray, color: str = "blue") -> bytes:
+        # ratings - 16 ratings in the order of the model outputs (RATING_NAMES)
+        with self._locks[kind]:
+            template = self._templates.get(kind)
+            if template is None:
+                template = LinePlotTemplate() if kind == "line" else PolarPlotTemplate()
+                self._templates[kind] = template
+
+            template.update(ratings, color)
+            template.figure.canvas.draw()
+            image = Image.fromarray(np.array(template.figure.canvas.buffer_rgba())[..., :3]) # copy, the buffer is reused by the next render
+
+        # figure.savefig would draw the figure again, fast compression is used as the plots are cached
+        file = io.BytesIO()
+        image.save(file, format="PNG", compress_level=3)
+        return file.getvalue()
+
+# one renderer (and one set of templates) per worker process
+plot_renderer = PlotRenderer()
@@ -0,0 +1,12 @@
+# names and order of the ratings predicted by the fingerprinting model, without any heavy imports (used by charts and
+# plots as well as by source.py)
+
+# Rating stats names
+RATING_NAMES = ['Color vibrancy', 'Surface roughness','Pattern complexity', 'Striped pattern',
+                'Checkered pattern', 'Brightness', 'Shininess', 'Sparkle', 'Hardness',
+                'Movement effect', 'Scale of pattern', 'Naturalness', 'Thickness',
+                'Multicolored', 'Value', 'Warmth']
+# Rearranging for polar plot
+RATING_CHANGE = [6, 7, 2, 3, 4, 1, 10, 13, 0, 5, 11, 14, 15, 12, 8, 9]
+# Range of the rating axis of the plots
+RATING_RANGE = (-2.5, 2.5)
@@ -0,0 +1,68 @@
+# settings of the fingerprinting package (config.yaml) and the data they point to, loaded on first use and not on import
+# paths are resolved relative to the package, so the server does not depend on being started from the repository root
+
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+import yaml
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(PACKAGE_DIR, "config.yaml")
+
+class FingerprintingSettings:
+
+    def __init__(self, config_path: str = CONFIG_PATH):
+        self.config_path = config_path
+        self._config: Optional[dict] = None
+        self._means_stds: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def _get_config(self) -> dict:
+        config = self._config
+        if config is None:
+            with self._lock:
+                if self._config is None:
+                    with open(self.config_path, "r") as file:
+                        self._config = yaml.safe_load(file)
+                config = self._config
+        return config
+
+    def _resolve(self, path: str) -> str:
+        return os.path.join(os.path.dirname(self.config_path), path)
+
+    @property
+    def mlp_model_path(self) -> str:
+        return self._resolve(self._get_config()["mlp_model_path"])
+
+    @property
+    def stats_mean_std_path(self) -> str:
+        return self._resolve(self._get_config()["stats-mean-std"])
+
+    @property
+    def model_version(self) -> str:
+        return self._get_config()["model_version"]
+
+    def _get_means_stds(self) -> np.ndarray:
+        # both columns of the file in one read
+        means_stds = self._means_stds
+        if means_stds is None:
+            path = self.stats_mean_std_path
+            with self._lock:
+                if self._means_stds is None:
+                    self._means_stds = np.loadtxt(path, dtype=float, usecols=(0, 1), delimiter=" ")
+                means_stds = self._means_stds
+        return means_stds
+
+    @property
+    def means(self) -> np.ndarray:
+        # means of statistical features of the training set (non specular features followed by specular)
+        return self._get_means_stds()[:, 0]
+
+    @property
+    def stds(self) -> np.ndarray:
+        return self._get_means_stds()[:, 1]
+
+# one instance per process
+fingerprinting_settings = FingerprintingSettings()
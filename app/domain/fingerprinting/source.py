@@ -4,25 +4,23 @@
 # Imports
 # ------------------------------------------------------------------
 import numpy as np
-from findpeaks import findpeaks
-from matplotlib import pyplot as plt
 import copy
-import yaml
 
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+from app.domain.fingerprinting.ratings import RATING_NAMES, RATING_CHANGE
+from app.domain.fingerprinting.settings import fingerprinting_settings
 
 
 # File paths
 # Current version of model parameters
 MODEL_PARAM_1 = './modelParams'
-# Current version of STDs and MEANs used in standardization
 
-with open('app/domain/fingerprinting/config.yaml', 'r') as file:
-    config = yaml.safe_load(file)
-file = config['stats-mean-std']
-
-MEANS = np.loadtxt(file, dtype=float, usecols=0, delimiter=" ")
-STDS = np.loadtxt(file, dtype=float, usecols=1, delimiter=" ")
+# Current version of STDs and MEANs used in standardization (MEANS and STDS) are loaded on first use
+def __getattr__(name):
+    if name == "MEANS":
+        return fingerprinting_settings.means
+    if name == "STDS":
+        return fingerprinting_settings.stds
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # Constants
@@ -30,15 +28,14 @@ STDS = np.loadtxt(file, dtype=float, usecols=1, delimiter=" ")
 STAT_NAMES = ['Max','Min','Mean', 'Variance', 'Skewness', 'Kurtosis', 'Directionality',
               'Low frequencies', 'Middle frequencies', 'High frequencies',
               'Mean chroma', 'Pattern strength', 'Pattern number', 'Colors number']
-# Rating stats names
-RATING_NAMES = ['Color vibrancy', 'Surface roughness','Pattern complexity', 'Striped pattern',
-                'Checkered pattern', 'Brightness', 'Shininess', 'Sparkle', 'Hardness',
-                'Movement effect', 'Scale of pattern', 'Naturalness', 'Thickness',
-                'Multicolored', 'Value', 'Warmth']
-# Rearranging for polar plot
-RATING_CHANGE = [6, 7, 2, 3, 4, 1, 10, 13, 0, 5, 11, 14, 15, 12, 8, 9]
+# Rating stats names (RATING_NAMES) and rearranging for polar plot (RATING_CHANGE) are in ratings.py
+
+# matplotlib is imported only by the plotting functions, so it is not loaded with the server
 
 def get_plot_res(data, colors=["blue"], labels=["Data"], SIZE=[15, 9], YLIM=[-2.5, 2.5, 0.5]):
+    from matplotlib import pyplot as plt
+    from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+
     fig, ax = plt.subplots(figsize=(SIZE[0], SIZE[1]))
     for i in range(len(data)):
         ax.plot(RATING_NAMES, data[i], color=colors[i], marker="o", label=labels[i], linestyle='-', linewidth=2)
@@ -56,9 +53,7 @@ def get_plot_res(data, colors=["blue"], labels=["Data"], SIZE=[15, 9], YLIM=[-2.
     canvas = FigureCanvas(fig)
     canvas.draw()
 
-    image = np.frombuffer(canvas.tostring_rgb(), dtype='uint8')
-    width, height = canvas.get_width_height()
-    image = image.reshape(height, width, 3)
+    image = np.asarray(canvas.buffer_rgba())[..., :3].copy() # tostring_rgb is deprecated
 
     plt.close(fig)
 
@@ -66,6 +61,8 @@ def get_plot_res(data, colors=["blue"], labels=["Data"], SIZE=[15, 9], YLIM=[-2.
 
 # General function for showing images
 def show_images(images, SIZE=[20, 3]):
+    from matplotlib import pyplot as plt
+
     fig, ax = plt.subplots(1, len(images), figsize=(SIZE[0], SIZE[1]))
     plt.subplots_adjust(wspace=0, hspace=0)
     for i in range(len(images)):
@@ -81,6 +78,9 @@ def get_polar_plot(data_all_old, COLORS=["blue", "red", "green"], RATINGS=RATING
                     SIZE=[15, 10], ZERO_WIDTH=0.01, ZERO_COLOR="black", LINE_WIDTH=2,
                     LABEL_SIZE_X=15, LABEL_SIZE_Y=15, YLIM=[-2.5, 2.5], LEGEND_SIZE=15,
                     TITLE_SIZE=15, FILL_RATE=0.05):
+    from matplotlib import pyplot as plt
+    from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+
     # Rearranging order
     data_all = copy.deepcopy(data_all_old)
     if order is not None:
@@ -139,10 +139,7 @@ def get_polar_plot(data_all_old, COLORS=["blue", "red", "green"], RATINGS=RATING
     canvas = FigureCanvas(fig)
     canvas.draw()
 
-    image = np.frombuffer(canvas.tostring_rgb(), dtype='uint8')
-
-    width, height = canvas.get_width_height()
-    image = image.reshape(height, width, 3)
+    image = np.asarray(canvas.buffer_rgba())[..., :3].copy() # tostring_rgb is deprecated
 
     plt.close(fig)
     return image
\ No newline at end of file
@@ -0,0 +1,108 @@
+# peak counting by topological persistence, replacement of the findpeaks package used by the statistical features
+# reproduces results of findpeaks (2.6.x) "topology" method for the two ways the features call it, including its handling of
+# equal values, but without pandas and without findpeaks' quadratic deduplication of values (minutes per color histogram)
+
+import functools
+
+import cv2
+import numpy as np
+
+def topology_persistence(keys:np.ndarray, values:np.ndarray, limit:float)->list[tuple[int, float]]:
+	# persistence of peaks of 2D array, returns (flat index of the peak, score) of the peaks with score > limit
+	# keys - order of processing (highest first, equal keys in raster order), values - levels for scores
+	# (keys and values differ when findpeaks made the values unique)
+	# only pixels with value >= limit are processed, so islands separated by lower pixels never merge and only
+	# the island of the global maximum and islands that die in a merge get a score (same as findpeaks)
+	flat_keys = keys.reshape(-1).tolist()
+	flat_values = values.reshape(-1).astype(float).tolist()
+	neighbours = _get_neighbours(*keys.shape)
+
+	candidates = np.flatnonzero(values.reshape(-1) >= limit)
+	order = candidates[np.argsort(-keys.reshape(-1)[candidates].astype(float), kind="stable")].tolist()
+
+	parent = [-1]*len(flat_keys) # -1 - not processed yet
+	added = [0]*len(flat_keys) # order in which pixels were added, earlier added pixel becomes root of the merged island
+	groups = {} # root of the dying island -> score
+
+	def find(p):
+		root = p
+		while parent[root] != root:
+			root = parent[root]
+		while parent[p] != root: # path compression
+			parent[p], p = root, parent[p]
+		return root
+
+	for i, p in enumerate(order):
+		roots = {find(q) for q in neighbours[p] if parent[q] >= 0}
+		parent[p] = p
+		added[p] = i
+		if i == 0:
+			groups[p] = flat_values[p]
+
+		if len(roots) == 1: # pixel extends one island (the most common case)
+			parent[p] = roots.pop()
+		elif roots:
+			v = flat_values[p]
+			# island with the highest birth survives, on equal births the one later in raster order
+			islands = sorted(((flat_keys[q], q) for q in roots), reverse=True)
+			oldest = islands[0][1]
+			parent[p] = oldest
+			for _, q in islands[1:]:
+				# when islands with equal births merge, the dying one can be the root of the merged island, which then
+				# never gets another score - findpeaks behaves the same way
+				if q not in groups:
+					groups[q] = flat_values[q] - v
+				root = find(oldest)
+				if added[q] < added[root]:
+					parent[root] = q
+				else:
+					parent[q] = root
+
+	return [(p, score) for p, score in groups.items() if score > limit]
+
+@functools.lru_cache(maxsize=4)
+def _get_neighbours(h:int, w:int)->list[list[int]]:
+	# flat indices of the 8-neighbourhood (as in findpeaks) of each pixel
+	return [
+		[(y + dy)*w + x + dx for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dy, dx) != (0, 0) and 0 <= y + dy < h and 0 <= x + dx < w]
+		for y in range(h) for x in range(w)
+	]
+
+def count_peaks_1d(X:np.ndarray, min_score:float)->list[int]:
+	# positions of peaks of vector X with persistence score > min_score
+	# same as findpeaks(method="topology").fit(X) filtered by the score; findpeaks made values unique by lowering repeated
+	# values by the smallest possible step, so equal values are ordered by position
+	X = np.asarray(X, dtype=float)
+	ranks = np.empty(len(X), dtype=np.int64)
+	ranks[np.lexsort((-np.arange(len(X)), X))] = np.arange(len(X)) # higher value first, then earlier position
+	keys = np.repeat(ranks, 2).reshape(-1, 2)*2 + [1, 0] # findpeaks runs on the vector repeated to 2 columns
+	values = np.c_[X, X]
+
+	peaks = topology_persistence(keys, values, limit=np.min(X) - 1)
+	return sorted(p//2 for p, score in peaks if score > min_score)
+
+def count_peaks_2d(X:np.ndarray, limit:float)->int:
+	# number of peaks and valleys of 2D array X with persistence score > limit
+	# same as len(findpeaks(limit=limit).fit(X)["persistence"]) with its default preprocessing (scaling to uint8 and
+	# fastNlMeans denoising with window 3) and both peaks and valleys
+	X = X - X.min()
+	with np.errstate(invalid="ignore"):
+		X = np.uint8(X / X.max() * 255)
+	X = cv2.fastNlMeansDenoising(X, h=3)
+
+	if X.max() < limit:
+		limit = int(X.max()) - 1
+
+	peaks = topology_persistence(*_unique_levels(X), limit)
+	valleys = topology_persistence(*_unique_levels(X.max() - X), limit)
+	return len(peaks) + len(valleys)
+
+def _unique_levels(X:np.ndarray)->tuple[np.ndarray, np.ndarray]:
+	# what findpeaks' value deduplication does to uint8 arrays - first occurrence of a value (in raster order) keeps it,
+	# later occurrences of non zero values are lowered by 1
+	flat = X.reshape(-1)
+	_, first = np.unique(flat, return_index=True)
+	levels = np.maximum(flat.astype(np.int64) - 1, 0)
+	levels[first] = flat[first]
+	levels = levels.reshape(X.shape)
+	return levels, levels
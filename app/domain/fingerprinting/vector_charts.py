@@ -0,0 +1,109 @@
+# line and polar charts of material ratings as JSON geometry or SVG, computed directly from the ratings (same layout as
+# the plots in fingerprint_plots.py, but without matplotlib and without rasterization)
+
+import math
+from html import escape
+
+from app.domain.fingerprinting.ratings import RATING_NAMES, RATING_CHANGE, RATING_RANGE
+
+RATING_TICKS = [RATING_RANGE[0] + i*0.5 for i in range(int((RATING_RANGE[1] - RATING_RANGE[0]) / 0.5) + 1)]
+POLAR_TICKS = [-2.0, -1.0, 0.0, 1.0, 2.0]
+
+def _to_unit(rating: float) -> float:
+    # position of the rating on the rating axis, 0 at the lower end of RATING_RANGE and 1 at the upper end
+    return (rating - RATING_RANGE[0]) / (RATING_RANGE[1] - RATING_RANGE[0])
+
+def get_line_geometry(ratings) -> dict:
+    # points in unit square, x from the first to the last category, y from the lower to the upper end of the rating axis
+    n = len(RATING_NAMES)
+    return {
+        "kind": "line",
+        "rating_range": list(RATING_RANGE),
+        "points": [
+            {"name": name, "rating": float(rating), "x": i / (n - 1), "y": _to_unit(float(rating))}
+            for i, (name, rating) in enumerate(zip(RATING_NAMES, ratings))
+        ]
+    }
+
+def get_polar_geometry(ratings) -> dict:
+    # points in RATING_CHANGE order clockwise from the top, angle in degrees, x and y relative to the center
+    # (y up, radius 1 at the upper end of the rating axis)
+    n = len(RATING_CHANGE)
+    points = []
+    for i, index in enumerate(RATING_CHANGE):
+        angle = 2 * math.pi * i / n
+        radius = _to_unit(float(ratings[index]))
+        points.append({
+            "name": RATING_NAMES[index],
+            "rating": float(ratings[index]),
+            "angle": 360 * i / n,
+            "x": radius * math.sin(angle),
+            "y": radius * math.cos(angle)
+        })
+    return {"kind": "polar", "rating_range": list(RATING_RANGE), "points": points}
+
+def get_chart_geometry(kind: str, ratings) -> dict:
+    return get_line_geometry(ratings) if kind == "line" else get_polar_geometry(ratings)
+
+def _format(value: float) -> str:
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+def render_line_svg(ratings, color: str = "blue", width=750, height=450) -> str:
+    left, right, top, bottom = 60, 20, 40, 130
+    plot_width, plot_height = width - left - right, height - top - bottom
+    geometry = get_line_geometry(ratings)
+    points = [(left + p["x"] * plot_width, top + (1 - p["y"]) * plot_height) for p in geometry["points"]]
+
+    parts = [f'<text x="{width / 2}" y="24" text-anchor="middle" font-size="16">Rating Plot</text>']
+    for tick in RATING_TICKS:
+        y = top + (1 - _to_unit(tick)) * plot_height
+        parts.append(f'<line x1="{left}" y1="{y:.1f}" x2="{left + plot_width}" y2="{y:.1f}" stroke="#b0b0b0" stroke-width="0.5" stroke-dasharray="3 3"/>')
+        parts.append(f'<text x="{left - 6}" y="{y + 4:.1f}" text-anchor="end" font-size="11">{_format(tick)}</text>')
+    for (x, _), p in zip(points, geometry["points"]):
+        parts.append(f'<line x1="{x:.1f}" y1="{top}" x2="{x:.1f}" y2="{top + plot_height}" stroke="#b0b0b0" stroke-width="0.5" stroke-dasharray="3 3"/>')
+        parts.append(f'<text transform="translate({x:.1f} {top + plot_height + 12}) rotate(-45)" text-anchor="end" font-size="11">{escape(p["name"])}</text>')
+    parts.append(f'<rect x="{left}" y="{top}" width="{plot_width}" height="{plot_height}" fill="none" stroke="black"/>')
+
+    path = " ".join(f"{x:.1f},{y:.1f}" for x, y in points)
+    parts.append(f'<polyline points="{path}" fill="none" stroke="{color}" stroke-width="2"/>')
+    parts.extend(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="3.5" fill="{color}"/>' for x, y in points)
+    parts.append(f'<text x="14" y="{top + plot_height / 2}" transform="rotate(-90 14 {top + plot_height / 2})" text-anchor="middle" font-size="12">Rating</text>')
+    return _svg(width, height, parts)
+
+def render_polar_svg(ratings, color: str = "blue", width=750, height=500) -> str:
+    cx, cy, radius = width / 2, height / 2, min(width, height) / 2 - 80
+    geometry = get_polar_geometry(ratings)
+
+    parts = []
+    for tick in POLAR_TICKS:
+        parts.append(f'<circle cx="{cx}" cy="{cy}" r="{_to_unit(tick) * radius:.1f}" fill="none" stroke="#b0b0b0" stroke-width="0.5"/>')
+        parts.append(f'<text x="{cx + 4}" y="{cy - _to_unit(tick) * radius - 2:.1f}" font-size="11">{_format(tick)}</text>')
+    parts.append(f'<circle cx="{cx}" cy="{cy}" r="{radius}" fill="none" stroke="black"/>')
+
+    for p in geometry["points"]:
+        angle = math.radians(p["angle"])
+        x, y = cx + radius * math.sin(angle), cy - radius * math.cos(angle)
+        parts.append(f'<line x1="{cx}" y1="{cy}" x2="{x:.1f}" y2="{y:.1f}" stroke="#b0b0b0" stroke-width="0.5"/>')
+        # labels are aligned away from the circle, as in the matplotlib plot
+        anchor = "middle" if p["angle"] in (0, 180) else "start" if p["angle"] < 180 else "end"
+        lx, ly = cx + (radius + 10) * math.sin(angle), cy - (radius + 10) * math.cos(angle)
+        parts.append(f'<text x="{lx:.1f}" y="{ly + 4:.1f}" text-anchor="{anchor}" font-size="12">{escape(p["name"])}</text>')
+
+    # circle around 0
+    parts.append(f'<circle cx="{cx}" cy="{cy}" r="{_to_unit(0) * radius:.1f}" fill="none" stroke="black" stroke-width="1.5"/>')
+
+    points = [(cx + p["x"] * radius, cy - p["y"] * radius) for p in geometry["points"]]
+    path = " ".join(f"{x:.1f},{y:.1f}" for x, y in points)
+    parts.append(f'<polygon points="{path}" fill="{color}" fill-opacity="0.05" stroke="{color}" stroke-width="2"/>')
+    parts.extend(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="3.5" fill="{color}"/>' for x, y in points)
+    return _svg(width, height, parts)
+
+def render_svg(kind: str, ratings, color: str = "blue") -> str:
+    # ratings - 16 ratings in the order of the model outputs (RATING_NAMES), color - SVG color (e.g. #0000ff)
+    return render_line_svg(ratings, color) if kind == "line" else render_polar_svg(ratings, color)
+
+def _svg(width: int, height: int, parts: list) -> str:
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}" '
+        f'font-family="sans-serif">' + "".join(parts) + "</svg>"
+    )
@@ -4,10 +4,13 @@
 # parts of the code more or less directly copied from the initial Veronika's jupyter ntb
 
 import math
+import threading
 import numpy as np
+import scipy.fft
 import scipy.stats
-import skimage.color
-import findpeaks
+
+from app.domain.fingerprinting.color_conversion import LChConverter
+from app.domain.fingerprinting.topology_peaks import count_peaks_1d, count_peaks_2d
 
 import logging
 
@@ -23,21 +26,35 @@ class StatisticalFeatures:
 		sz = 256 # expected size of the img on input to most functions (square SZxSZ, the cached masks etc are based on this value so the actual input must correspond); changing to 512 will NOT make the code equivalent to the 512 version
 	
 		# FT
+		# power spectra are computed by real input FFT (rfft2) - only the sz x (sz//2+1) half of the spectrum with non negative
+		# frequencies on the last axis is kept (the other half mirrors it), pixels of the full spectrum that the masks and bins
+		# of the original code use are mapped to this half spectrum, each half spectrum pixel has weight of how many pixels
+		# of the full spectrum it stands for
+		self._ft_half_index = self.half_spectrum_index(sz) # half spectrum pixel of each pixel of the full spectrum
+		self._ft_buffers = threading.local() # FFT input and power spectrum buffers, per thread as analyses run in parallel threads
 		kfreq = np.fft.fftfreq(sz) * sz
-		self._ft_knrm = np.sqrt(kfreq.reshape(-1,1)**2+kfreq.reshape(1,-1)**2).reshape(-1) # amplitudes of fourier vectors
+		ft_knrm = np.sqrt(kfreq.reshape(-1,1)**2+kfreq.reshape(1,-1)**2) # amplitudes of fourier vectors of the full spectrum
+		self._ft_knrm = ft_knrm[:, :sz//2+1].reshape(-1) # the same for the half spectrum
 		self._ft_kbins = np.linspace(.5, sz//2+.5, sz//2+1) # bins for the FT scpecturum histogram
+		self._ft_kcounts = scipy.stats.binned_statistic(ft_knrm.reshape(-1), None, statistic="count", bins=self._ft_kbins)[0] # full spectrum pixels in each bin
 		self._ft_kbins2 = np.pi * (self._ft_kbins[1:]**2 - self._ft_kbins[:-1]**2) # some multiplication factor for the PSD binning
+		self._ft_kpixels, self._ft_kbin, self._ft_kweights = self.precompute_psd_bins() # half spectrum pixels in the PSD bins, their bins and weights
 
 		# pattern
-		self._patt_mean_mask, self._patt_sum_all = self.precompute_sector_masks(sz) # the original "mean_mask" and "sum_all" variables from "mean_circular_sectors_cut" script
+		self._patt_pixels, self._patt_bins, self._patt_weights, self._patt_sum_all = self.precompute_sector_masks(sz) # (pixel, sector bin, weight) of all the masks from "mean_circular_sectors_cut" script and the original "sum_all" variable
 
 		# color
 		self._clr_multicolored_bins = np.linspace(-128, 128, 129)
+		self._clr_converter = LChConverter()
 
 	def precompute_sector_masks(self, sz:int):
 		# all the calls to "sector_mask" in "mean_circular_sectors_cut" (very slow in the original implementation) done once and cached
 		# img assumed square sz x sz
 		# do not change the default args, they ahve the same const values in other functions
+		# instead of 384 full size masks only (pixel, bin) pairs are kept - masks of neighbouring sectors share their border pixels,
+		# so one label image is not enough; pixels are indices into the not shifted half spectrum (fftshift and mapping to the half
+		# spectrum are applied to the indices once here), weight of a pair is the number of mask pixels mapped to the same half spectrum pixel
+		# bin of mask (i,j) is j*sectors + i, i.e. the position of [j,i] in the flattened result matrix
 
 		# Size of 1 sector in angles
 		sector_size = int(360/self.SECTORS_NUM)
@@ -47,8 +64,10 @@ class StatisticalFeatures:
 		middle = (math.floor(sz/2), math.floor(sz/2))
 
 		# result
-		mean_mask = {}
+		pixels = []
+		bins = []
 		sum_all = np.zeros((self.CIR_NUM, math.ceil(self.SECTORS_NUM/2)))
+		shifted_index = np.fft.fftshift(np.arange(sz*sz).reshape(sz, sz)) # index in the original spectrum of each pixel of the shifted one
 
 		# Iterate through half of the sectors
 		for i in range(math.ceil(self.SECTORS_NUM/2)):
@@ -70,10 +89,30 @@ class StatisticalFeatures:
 				
 				# result
 				mm = big_mask & (~small_mask)
-				mean_mask[(i,j)] = mm
+				pixels.append(shifted_index[mm])
+				bins.append(np.full(np.count_nonzero(mm), j*sum_all.shape[1] + i))
 				sum_all[j,i] = np.count_nonzero(mm)
 
-		return mean_mask, sum_all # Used in "mean_circular_sectors_cut" as: mean_mask = _mean_mask[(i,j)] etc, sum_all is just like 'sum_all' from the original code, just computed once
+		half_size = sz*(sz//2+1)
+		pairs, weights = np.unique(np.concatenate(bins)*half_size + self._ft_half_index[np.concatenate(pixels)], return_counts=True)
+		return (pairs % half_size).astype(np.int32), (pairs // half_size).astype(np.int16), weights.astype(float), sum_all # sum_all is just like 'sum_all' from the original code, just computed once
+
+	def precompute_psd_bins(self):
+		# binning of the constant amplitudes of fourier vectors done once (binned_statistic per image did it for every image)
+		# pixels outside of all the bins (zero frequency and the corners) are left out as in binned_statistic
+		weights = np.bincount(self._ft_half_index, minlength=self._ft_knrm.size) # full spectrum pixels each half spectrum pixel stands for
+		kbin = scipy.stats.binned_statistic(self._ft_knrm, None, statistic="count", bins=self._ft_kbins).binnumber - 1
+		pixels = np.flatnonzero((kbin >= 0) & (kbin < len(self._ft_kbins2)))
+		return pixels.astype(np.int32), kbin[pixels], weights[pixels].astype(float)
+
+	def half_spectrum_index(self, sz:int)->np.ndarray:
+		# index in the half spectrum (sz x (sz//2+1), rfft2 layout) of each pixel of the flattened full sz x sz spectrum
+		# power spectrum of a real image is symmetric, P[u, v] == P[-u, -v]
+		u, v = np.indices((sz, sz))
+		mirrored = v > sz//2
+		u = np.where(mirrored, -u % sz, u)
+		v = np.where(mirrored, sz - v, v)
+		return (u*(sz//2+1) + v).reshape(-1)
 
 
 	def sector_mask(self, sz,centre,radius,angle_range):
@@ -100,57 +139,89 @@ class StatisticalFeatures:
 		anglemask = theta <= (tmax-tmin)
 		return circmask*anglemask
 
-	def rgb2other(self, img):
+	def rgb2other(self, img, reuse_buffers=False):
 		# conversion to the LCH space that the features operate in
-		
-		# Converting RGB to Lab image
-		img_lab = skimage.color.rgb2lab(img, "D65")
-		img_lch = skimage.color.lab2lch(img_lab)
-		return img_lab, img_lch
+		# img: HxWx3 or stack of images NxHxWx3, uint8 or float in [0, 1]
+		# float32 equivalent of skimage.color.rgb2lab(img, "D65") and lab2lch used originally
+		# reuse_buffers - results are only valid until the next conversion in the same thread (see LChConverter)
+		return self._clr_converter.convert(img, reuse_buffers)
 
 	def center_crop(self, img:np.ndarray, sz:int)->np.ndarray:
 		# square center crop (should be compatible with the original veronika's jupyter)
+		# img: 1 channel HW or stack of them NxHxW, the last two dimensions are cropped
 		# crashes when img.size < sz
-		if(img.shape[0] < sz or img.shape[1] < sz): raise ValueError(f"img of size {img.shape[:2]} too small for crop to {sz}")
+		if(img.shape[-2] < sz or img.shape[-1] < sz): raise ValueError(f"img of size {img.shape[-2:]} too small for crop to {sz}")
 
-		pad = math.floor((img.shape[0]-sz)/2), math.floor((img.shape[1]-sz)/2)
-		return img[pad[0]:pad[0]+sz, pad[1]:pad[1]+sz]
+		pad = math.floor((img.shape[-2]-sz)/2), math.floor((img.shape[-1]-sz)/2)
+		return img[..., pad[0]:pad[0]+sz, pad[1]:pad[1]+sz]
 
 	def simple_features(self, img:np.ndarray)->tuple[float]:
-		# img - just 1 channel HW (luminance)
+		# img - just 1 channel HW (luminance) or stack of them NxHxW, then each value is an array of N values
+		axes = (-2, -1)
 		# percentiles
-		min_val, max_val = np.percentile(img, (1,99))
+		min_val, max_val = np.percentile(img, (1,99), axis=axes)
 		# mean, var
-		mean_val = np.mean(img)
-		val0 = img-mean_val
-		var_val = np.mean(val0**2)
-		if(var_val > 0):
-			skew_val = np.mean(val0**3)/var_val**(3/2)
-			kurt_val = np.mean(val0**4)/var_val**2 - 3
-		else:
-			skew_val = 0
-			kurt_val = 0
+		mean_val = np.mean(img, axis=axes, dtype=np.float64) # moments in float64 also for float32 images
+		val0 = img-np.expand_dims(mean_val, axis=axes)
+		var_val = np.mean(val0**2, axis=axes)
+		# skew and kurtosis are 0 for constant images
+		constant = ~(var_val > 0)
+		with np.errstate(divide="ignore", invalid="ignore"):
+			skew_val = np.where(constant, 0, np.mean(val0**3, axis=axes)/var_val**(3/2))
+			kurt_val = np.where(constant, 0, np.mean(val0**4, axis=axes)/var_val**2 - 3)
 		return max_val, min_val, mean_val, var_val, skew_val, kurt_val
 
 	### FT features
 
+	def power_spectrum(self, img:np.ndarray, reuse_buffers=False)->np.ndarray:
+		# power spectrum abs(fft2(img))**2 in the half spectrum layout (HxW image -> H x W//2+1), the input of the FT and pattern features
+		# img: 1 channel HxW or stack NxHxW, transformed in float64 as np.fft does
+		# reuse_buffers - input copy and result are kept in buffers of the calling thread, the result is only valid until the next call
+		# with reuse_buffers from the same thread
+		if reuse_buffers:
+			x, ps = self._get_ft_buffers(img.shape)
+			np.copyto(x, img)
+		else:
+			x = np.array(img, dtype=np.float64)
+			ps = np.empty(img.shape[:-1] + (img.shape[-1]//2+1,))
+
+		ft = scipy.fft.rfft2(x, overwrite_x=True) # scipy.fft caches plans of the transforms
+		np.multiply(ft.real, ft.real, out=ps)
+		ps += np.square(ft.imag, out=ft.real) # real part of the transform is not needed anymore
+		return ps
+
+	def _get_ft_buffers(self, shape:tuple)->tuple[np.ndarray, np.ndarray]:
+		# only buffers of the last used shape are kept (uploaded images have always the same size)
+		buffers = getattr(self._ft_buffers, "arrays", None)
+		if buffers is None or buffers[0].shape != shape:
+			buffers = np.empty(shape), np.empty(shape[:-1] + (shape[-1]//2+1,))
+			self._ft_buffers.arrays = buffers
+		return buffers
+
 	def count_only_psd(self, ft_ps:np.ndarray):
-		# NOTE: requires already precomputed fft2 power spectrum on input: abs(fft2(img))**2
-		# Binning the values of amplitudes
-		Abins, _, _ = scipy.stats.binned_statistic(self._ft_knrm,  ft_ps.reshape(-1), statistic="mean", bins=self._ft_kbins)
-		return Abins*self._ft_kbins2
+		# NOTE: requires already precomputed power spectrum on input (power_spectrum)
+		# ft_ps: half spectrum HxW//2+1 or stack of them, returns PSD of each spectrum
+		# mean of the full spectrum in each bin is the weighted sum of the half spectrum divided by the number of full spectrum pixels
+		# Binning the values of amplitudes - one bincount over precomputed bins, bins of n-th spectrum are offset by n*bins_num
+		# (pixels are summed in the same order as binned_statistic did, so the results are identical)
+		bins_num = len(self._ft_kbins2)
+		spectra = ft_ps.reshape(-1, self._ft_knrm.size)
+		bins = (np.arange(len(spectra))[:, None]*bins_num + self._ft_kbin).reshape(-1)
+		Asums = np.bincount(bins, weights=(spectra[:, self._ft_kpixels]*self._ft_kweights).reshape(-1), minlength=len(spectra)*bins_num)
+		return (Asums.reshape(ft_ps.shape[:-2] + (bins_num,))/self._ft_kcounts)*self._ft_kbins2
 
 	def count_freq(self, ft_ps, borders = (0, 5, 50, 128)):
-		# ft_ps: already precomputed fft2 power spectrum of the img: abs(fft2(img))**2
+		# ft_ps: already precomputed power spectrum of the img (power_spectrum)
 		# borders - list of borders between which the mean of the frequency will be computed
 		# returns a list of means of amplitudes of frequencies between borders
 		mean_all = []
 		# Getting the PSD
 		Abins = self.count_only_psd(ft_ps)
 		# Iterating through the area set by borders
+		# (np.add.reduceat over the borders does not sum pairwise like np.mean, so its results would differ in the last bits)
 		for i in range(len(borders)-1):
 			# Calculating the mean of the amplitudes between borders
-			mean_all.append(np.mean(Abins[borders[i]:borders[i+1]]))
+			mean_all.append(np.mean(Abins[..., borders[i]:borders[i+1]], axis=-1))
 		return mean_all
 
 	### pattern features
@@ -178,30 +249,29 @@ class StatisticalFeatures:
 		return np.mean(ratio)
 
 	def mean_circular_sectors_cut(self, ft_ps):
-		# NOTE: ft_ps: already precomputed fft2 power spectrum of the img: abs(fft2(img))**2
+		# NOTE: ft_ps: already precomputed power spectrum of the img (power_spectrum)
 		# requires pre-computed masks by precompute_sector_masks
+		# ft_ps: half spectrum HxW//2+1 or stack of them, result has the same leading dimensions
 
-		# Setting up the containers, only half of the image is used - sectors are divided by 2
-		mean_all = np.zeros((self.CIR_NUM, math.ceil(self.SECTORS_NUM/2)))
-		
-		# Prepare the image for Fourier transform
-		fourier = np.fft.fftshift(ft_ps)
-
-		# Iterate through half of the sectors
-		for i in range(math.ceil(self.SECTORS_NUM/2)):
-			# Iterate through dividing circles
-			for j in range(self.CIR_NUM):
-				mean_mask = self._patt_mean_mask[(i,j)]
-				mean_all[j,i] = np.mean(fourier[mean_mask])
-				
-		return mean_all*self._patt_sum_all
+		# only half of the image is used - sectors are divided by 2
+		# original code computed mean of each sector and multiplied it by the sector size (sum_all), that is the sum of the sector,
+		# so sums of all the sectors are computed in one weighted bincount
+		bins_num = self._patt_sum_all.size
+		spectra = ft_ps.reshape(-1, ft_ps.shape[-2]*ft_ps.shape[-1])
+		# bins of n-th spectrum are offset by n*bins_num, so the whole stack is still one bincount
+		bins = (np.arange(len(spectra))[:, None]*bins_num + self._patt_bins).reshape(-1)
+		sums = np.bincount(bins, weights=(spectra[:, self._patt_pixels]*self._patt_weights).reshape(-1), minlength=len(spectra)*bins_num)
+		return sums.reshape(ft_ps.shape[:-2] + self._patt_sum_all.shape)
 
 
 	def count_pattern(self, ft_ps):
-		# NOTE: (ft_ps): requries precomputed fft2 power spectrum of the img: abs(fft2(img))**2
+		# NOTE: (ft_ps): requries precomputed power spectrum of the img (power_spectrum)
 		# +also requires pre-computed sector masks
 
-		means_mult = self.mean_circular_sectors_cut(ft_ps)
+		return self.count_pattern_cut(self.mean_circular_sectors_cut(ft_ps))
+
+	def count_pattern_cut(self, means_mult):
+		# pattern features from already computed sector sums (mean_circular_sectors_cut) of one image
 
 		# Compute sum of columns - info about the whole sector of Fourier from center to edge - through all frequencies
 		all_sum = np.sum(means_mult, axis=0)
@@ -210,7 +280,7 @@ class StatisticalFeatures:
 		if(not np.any(all_sum)):
 			direct = 0
 			patt_str = 1
-			len_peaks = 1 # this is what findpeaks returns for constant vectors
+			len_peaks = 1 # this is what findpeaks (used originally) returns for constant vectors
 			return direct, patt_str, len_peaks
 		
 		# Directionality computation
@@ -225,14 +295,8 @@ class StatisticalFeatures:
 		min_ = np.min(all_sum, axis=0); max_ = np.max(all_sum, axis=0)
 		all_sum_red = (all_sum - min_) / (max_ - min_) # sklearn...minmax_scale
 
-		# Find peaks
-		fp = findpeaks.findpeaks(method="topology", verbose=0)
-		local_max = fp.fit(all_sum_red)
-		# Peaks values
-		peaks = local_max["persistence"][["y", "score"]].values
-
-		# Select only the important peaks - higher score than 0.5
-		peaks_new = [i[0] for i in peaks if i[1] > 0.5]
+		# Find peaks, select only the important peaks - higher score than 0.5
+		peaks_new = count_peaks_1d(all_sum_red, min_score=0.5)
 
 		# If both peaks at the ends are found, the end one is deleted - ensures the "circle" nature, connect them into one peak
 		if 0 in peaks_new and 11 in peaks_new:
@@ -246,9 +310,15 @@ class StatisticalFeatures:
 
 	def color_features(self, img_lab, img_lch):
 		# NOTE: the two color features merged into one function (originally "count_multicolored" and one liner in the main script)
+		return self.mean_chroma(img_lch), self.count_multicolored(img_lab)
 
+	def mean_chroma(self, img_lch):
 		# Mean chroma - weighted by luminance
-		mean_chr_int = np.mean((img_lch[..., 0]*img_lch[..., 1]))
+		# img_lch: HxWx3 or stack NxHxWx3
+		return np.mean((img_lch[..., 0]*img_lch[..., 1]), axis=(-2, -1))
+
+	def count_multicolored(self, img_lab):
+		# img_lab: one HxWx3 image
 
 		# 1 - A color channel
 		# 2 - B color channel
@@ -260,13 +330,10 @@ class StatisticalFeatures:
 		
 		# Finding peaks in the 2D histogram
 		# Important parameter "limit", to limit the score of peaks - suppresses noise
-		fp = findpeaks.findpeaks(limit=30, verbose=0)
-		local_max = fp.fit(Z)
-		
 		# Return number of peaks for image
-		multicol = len(local_max["persistence"][["x", "y"]].values) - 1 # JK: for some reason, I keep getting +1 values wrt to the original veronika's script...? (also, findpeaks is nondeterministic so the values can fluctuate)
+		multicol = count_peaks_2d(Z, limit=30) - 1 # JK: for some reason, I keep getting +1 values wrt to the original veronika's script...? (count includes valleys, as findpeaks did)
 
-		return mean_chr_int, multicol
+		return multicol
 
 
 	### ALL FEATURES
@@ -277,14 +344,13 @@ class StatisticalFeatures:
 
 		logger.debug("Precomputing common stuff")
 		# precompute common stuff
-		img_lab, img_lch = self.rgb2other(img)
+		img_lab, img_lch = self.rgb2other(img, reuse_buffers=True) # the converted images are not needed after this call
 		crop_sz = 256
 		if(img_lch.shape[:2] != (crop_sz, crop_sz)):
 			img_crop = self.center_crop(img_lch[...,0], crop_sz) # pre-cropped luma channel
 		else:
 			img_crop = img_lch[...,0]
-		ft_ps = np.fft.fft2(img_crop)
-		ft_ps = np.abs(np.conj(ft_ps)*ft_ps) # FT power spectrum
+		ft_ps = self.power_spectrum(img_crop, reuse_buffers=True) # FT power spectrum, not needed after this call
 
 		logger.debug("Computing rest of the features")
 		# features
@@ -295,5 +361,3 @@ class StatisticalFeatures:
 
 		logger.debug("Returning stats results")
 		return np.array((*simple, pattern[0], *ft, clr[0], *pattern[1:], clr[1]))
-
-	
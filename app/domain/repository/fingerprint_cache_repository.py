@@ -0,0 +1,15 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import numpy as np
+
+class FingerprintCacheRepository(ABC):
+    # persistent storage of ratings of already analysed image pairs, shared by all worker processes
+
+    @abstractmethod
+    def get_ratings(self, key: str) -> Optional[np.ndarray]:
+        pass
+
+    @abstractmethod
+    def add_ratings(self, key: str, ratings: np.ndarray):
+        pass
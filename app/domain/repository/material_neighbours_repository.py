@@ -0,0 +1,28 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+
+import numpy as np
+
+class MaterialNeighboursRepository(ABC):
+    # materialized neighbour lists (first size materials of the similarity ranking) of all stored materials
+    # lists are valid only when they include all stored materials, otherwise the similarity is computed
+
+    @abstractmethod
+    def get_neighbours(self, material_id: int, size: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        # (neighbour IDs, similarities) of a material, None when the material has no valid list
+        pass
+
+    @abstractmethod
+    def is_up_to_date(self, size: int) -> bool:
+        pass
+
+    @abstractmethod
+    def replace_neighbours(self, ids: np.ndarray, vectors: np.ndarray, neighbour_positions: np.ndarray, similarities: np.ndarray, size: int):
+        # stores lists of a bulk build (positions in ids) and adds materials stored while they were computed
+        pass
+
+    @abstractmethod
+    def update_neighbours(self, ids: np.ndarray, vectors: np.ndarray, size: int) -> int:
+        # adds materials stored after the lists were built or last updated to the lists, ids and vectors - materials
+        # already known to the caller (similarity engine), returns the number of added materials
+        pass
@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import List, Optional, Tuple, Iterator
 from app.schemas.material_category import MaterialCategory
+from app.schemas.name_match import NameMatch
 from app.models.material import Material
+from app.domain.similarity.similarity_engine import SimilarityEngine
 
 class MaterialRepository(ABC):
     @abstractmethod
@@ -11,9 +13,59 @@ class MaterialRepository(ABC):
     @abstractmethod
     def get_materials(self,
                       name_filter: Optional[str] = None,
-                      categories: Optional[List[MaterialCategory]] = None) -> List[Material]:
+                      categories: Optional[List[MaterialCategory]] = None,
+                      name_match: NameMatch = NameMatch.SUBSTRING) -> List[Material]:
+        pass
+
+    @abstractmethod
+    def get_materials_by_ids(self, material_ids: List[int]) -> List[Material]: # returned in the same order as material_ids
+        pass
+
+    # rows are plain (id, name, category, *characteristics) tuples, category as its name and characteristics in the order of
+    # CHARACTERISTICS_COLUMNS, for reads of many materials that do not need ORM objects
+    # rows are ordered by their keys (case-insensitive name, id), after - key of the last row of the previous page
+    @abstractmethod
+    def get_material_rows(self,
+                          name_filter: Optional[str] = None,
+                          categories: Optional[List[MaterialCategory]] = None,
+                          after: Optional[Tuple[str, int]] = None,
+                          limit: Optional[int] = None,
+                          name_match: NameMatch = NameMatch.SUBSTRING) -> List[tuple]: # same materials and order as get_materials
+        pass
+
+    @abstractmethod
+    def get_material_row_key(self, row: tuple) -> Tuple[str, int]:
+        pass
+
+    @abstractmethod
+    def iterate_material_rows(self,
+                              name_filter: Optional[str] = None,
+                              categories: Optional[List[MaterialCategory]] = None,
+                              after: Optional[Tuple[str, int]] = None,
+                              page_size: int = 1000,
+                              name_match: NameMatch = NameMatch.SUBSTRING) -> Iterator[tuple]: # all rows read page by page, for streaming
+        pass
+
+    @abstractmethod
+    def search_material_ids(self, name: str, name_match: NameMatch = NameMatch.SUBSTRING) -> List[int]: # IDs of materials matching the name
+        pass
+
+    @abstractmethod
+    def search_material_rows(self,
+                             name: str,
+                             categories: Optional[List[MaterialCategory]] = None,
+                             limit: Optional[int] = None) -> List[Tuple[tuple, float]]:
+        # (row, score) pairs of materials with names similar to the name, the most similar first
+        pass
+
+    @abstractmethod
+    def get_material_rows_by_ids(self, material_ids: List[int]) -> List[tuple]: # returned in the same order as material_ids
         pass
 
     @abstractmethod
     def add_material(self, material: Material) -> Material:
+        pass
+
+    @abstractmethod
+    def get_similarity_engine(self) -> SimilarityEngine: # engine with characteristics of all stored materials, kept up to date with the storage
         pass
\ No newline at end of file
@@ -0,0 +1,15 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import numpy as np
+
+class MaterialStatisticsRepository(ABC):
+    # statistics of images of stored materials, computed only once per material
+
+    @abstractmethod
+    def get_statistics(self, material_id: int) -> Optional[np.ndarray]: # 2 x 14 - non specular and specular image
+        pass
+
+    @abstractmethod
+    def add_statistics(self, material_id: int, statistics: np.ndarray):
+        pass
@@ -0,0 +1,183 @@
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+import numpy as np
+
+from app.domain.similarity.material_similarity import calculate_similarity_batch
+
+
+class ApproximateIndex(ABC):
+    # index over rows of the similarity engine (row positions, not material IDs) that returns a small set of
+    # candidate rows likely containing the most similar materials, candidates are then scored exactly
+
+    @abstractmethod
+    def add(self, positions: np.ndarray, vectors: np.ndarray):
+        pass
+
+    @abstractmethod
+    def search(self, target_vector: np.array) -> np.ndarray: # sorted positions of candidate rows
+        pass
+
+    @abstractmethod
+    def save(self, path: str, ids: np.ndarray):
+        pass
+
+    @abstractmethod
+    def needs_rebuild(self, size: int) -> bool: # true when the index was trained on too small part of current data
+        pass
+
+
+def quantizer_features(vectors: np.ndarray) -> np.ndarray:
+    # vectors are clustered by both parts of the similarity score - raw values (L1 part) and
+    # normalized centered values (Pearson part, correlation is dot product of these)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centered = vectors - vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(centered, axis=1, keepdims=True)
+    normalized = np.divide(centered, norms, out=np.zeros_like(centered), where=norms > 0)
+    return np.hstack((vectors / 4, normalized)) # /4 puts typical distances of both parts to the same range
+
+
+class IVFIndex(ApproximateIndex):
+    # inverted file index - vectors are clustered by k-means, a query scores only rows from n_probe nearest clusters
+
+    def __init__(self, centroids: np.ndarray, n_probe: int):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.n_probe = min(n_probe, len(self.centroids))
+        self.trained_size = 0 # number of rows the centroids were trained on
+
+        self._assignments = np.empty(0, dtype=np.int32) # cluster of each row position
+        self._lists: List[np.ndarray] = [np.empty(0, dtype=np.int64) for _ in range(len(self.centroids))]
+        self._pending: List[List[int]] = [[] for _ in range(len(self.centroids))] # incrementally added rows not merged to _lists yet
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, n_lists: Optional[int] = None, n_probe: Optional[int] = None,
+              iterations=10, sample_size_per_list=256, seed=0) -> "IVFIndex":
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(len(vectors))))
+        if n_probe is None:
+            n_probe = max(1, n_lists // 8)
+
+        features = quantizer_features(vectors)
+        rng = np.random.default_rng(seed)
+
+        # centroids are trained on a sample, then all the rows are assigned
+        sample = features
+        if len(features) > n_lists * sample_size_per_list:
+            sample = features[rng.choice(len(features), n_lists * sample_size_per_list, replace=False)]
+
+        centroids = sample[rng.choice(len(sample), min(n_lists, len(sample)), replace=False)].copy()
+        for _ in range(iterations): # Lloyd's k-means
+            assignments = _nearest_centroids(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=len(centroids))
+            non_empty = counts > 0 # empty clusters keep their previous centroid
+            centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+
+        index = cls(centroids, n_probe)
+        index.add(np.arange(len(vectors)), vectors)
+        index.trained_size = len(vectors)
+        return index
+
+    @classmethod
+    def load(cls, path: str, ids: np.ndarray, n_probe: Optional[int] = None) -> Optional["IVFIndex"]:
+        # returns None when the saved index does not belong to the given rows (e.g. DB was replaced)
+        data = np.load(path)
+        saved_ids = data["ids"]
+        if len(saved_ids) > len(ids) or not np.array_equal(saved_ids, ids[:len(saved_ids)]):
+            return None
+
+        centroids = data["centroids"]
+        index = cls(centroids, int(data["n_probe"]) if n_probe is None else n_probe)
+        index.trained_size = int(data["trained_size"])
+        index._assign(np.arange(len(saved_ids)), data["assignments"])
+        return index
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, positions: np.ndarray, vectors: np.ndarray):
+        if len(positions) == 0:
+            return
+        self._assign(np.asarray(positions, dtype=np.int64), _nearest_centroids(quantizer_features(vectors), self.centroids))
+
+    def search(self, target_vector: np.array) -> np.ndarray:
+        target = quantizer_features(np.asarray(target_vector).reshape(1, -1))
+        distances = _squared_distances(target, self.centroids)[0]
+        probed = np.argpartition(distances, self.n_probe - 1)[:self.n_probe]
+
+        with self._lock:
+            for cluster in probed:
+                if self._pending[cluster]:
+                    self._lists[cluster] = np.concatenate((self._lists[cluster], self._pending[cluster]))
+                    self._pending[cluster] = []
+            candidates = np.concatenate([self._lists[cluster] for cluster in probed])
+
+        return np.sort(candidates)
+
+    def save(self, path: str, ids: np.ndarray):
+        with self._lock:
+            assignments = self._assignments[:self._size].copy()
+        np.savez(
+            path,
+            centroids=self.centroids,
+            assignments=assignments,
+            ids=ids[:len(assignments)],
+            n_probe=self.n_probe,
+            trained_size=self.trained_size
+        )
+
+    def needs_rebuild(self, size: int) -> bool:
+        return size > 4 * max(self.trained_size, 1)
+
+    def _assign(self, positions: np.ndarray, clusters: np.ndarray):
+        if len(positions) == 0:
+            return
+
+        with self._lock:
+            end = int(positions.max()) + 1
+            if end > len(self._assignments):
+                grown = np.full(max(end, 2 * len(self._assignments)), -1, dtype=np.int32)
+                grown[:len(self._assignments)] = self._assignments
+                self._assignments = grown
+            self._assignments[positions] = clusters
+            self._size = max(self._size, end)
+
+            if len(positions) == 1: # incremental insert of one material
+                self._pending[int(clusters[0])].append(int(positions[0]))
+            else:
+                order = np.argsort(clusters, kind="stable")
+                bounds = np.searchsorted(clusters[order], np.arange(len(self.centroids) + 1))
+                for cluster in range(len(self.centroids)):
+                    members = positions[order[bounds[cluster]:bounds[cluster + 1]]]
+                    if len(members):
+                        self._lists[cluster] = np.concatenate((self._lists[cluster], members))
+
+
+def _squared_distances(features: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return (features ** 2).sum(axis=1)[:, None] - 2 * features @ centroids.T + (centroids ** 2).sum(axis=1)[None, :]
+
+def _nearest_centroids(features: np.ndarray, centroids: np.ndarray, chunk_size=65536) -> np.ndarray:
+    # chunked so the distance matrix stays small for large catalogues
+    result = np.empty(len(features), dtype=np.int32)
+    for start in range(0, len(features), chunk_size):
+        result[start:start + chunk_size] = np.argmin(_squared_distances(features[start:start + chunk_size], centroids), axis=1)
+    return result
+
+
+def recall_at_k(index: ApproximateIndex, vectors: np.ndarray, queries: np.ndarray, k: int) -> float:
+    # average share of the exact top k (ranking of calculate_similarity) that the approximate search returns in its top k
+    recalls = []
+    for query in queries:
+        exact = calculate_similarity_batch(query, vectors)
+        exact_top = set(np.argsort(-exact, kind="stable")[:k].tolist())
+
+        candidates = index.search(query)
+        candidates = candidates[candidates < len(vectors)]
+        approximate = candidates[np.argsort(-exact[candidates], kind="stable")[:k]] # candidates are ranked by exact score
+        recalls.append(len(exact_top.intersection(approximate.tolist())) / min(k, len(vectors)))
+
+    return float(np.mean(recalls)) if recalls else 1.0
@@ -1,13 +1,58 @@
 import numpy as np
-from scipy.stats import pearsonr
 
 # Dan’s code
 # returns float -1 <= 0 <= 1 where the more negative it is the more dissimilarity two arrays have (their aspects move in opposite directions); 0 is no similarity; 1 is absolute similarity (e.g. for two same arrays)
 def calculate_similarity(v1: np.array, v2: np.array, alpha=0.5) -> float:
     assert v1.ndim == 1 and v1.ndim == v2.ndim
+    from scipy.stats import pearsonr # only the reference implementation needs scipy, it is not imported with the server
 
     size = len(v1)
     corr, _ = pearsonr(v1, v2)
     l1 = np.linalg.norm(v1 - v2, ord=1)
 
-    return alpha * corr + (1 - alpha) * (1 - (l1 / (2 * size)))
\ No newline at end of file
+    return alpha * corr + (1 - alpha) * (1 - (l1 / (2 * size)))
+
+# batched version of calculate_similarity - compares v1 with every row of vectors (N x size) in one numpy pass
+# results are the same as calling calculate_similarity for each row (up to floating point rounding)
+def calculate_similarity_batch(v1: np.array, vectors: np.ndarray, alpha=0.5) -> np.ndarray:
+    assert v1.ndim == 1 and vectors.ndim == 2 and vectors.shape[1] == len(v1)
+
+    size = len(v1)
+    v1 = np.asarray(v1, dtype=np.float64)
+
+    # Pearson correlation of v1 with each row
+    v1_centered = v1 - v1.mean()
+    centered = vectors - vectors.mean(axis=1, keepdims=True, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"): # constant vectors have undefined correlation (nan), same as in pearsonr
+        corr = (centered @ v1_centered) / np.sqrt(np.einsum("ij,ij->i", centered, centered) * np.dot(v1_centered, v1_centered))
+    corr = np.clip(corr, -1.0, 1.0) # pearsonr clips the result as well because of rounding errors
+
+    l1 = np.abs(vectors - v1).sum(axis=1)
+
+    return alpha * corr + (1 - alpha) * (1 - (l1 / (2 * size)))
+
+# matrix version of calculate_similarity - similarities of every row of block (B x size) with every row of vectors (N x size)
+def calculate_similarity_matrix(block: np.ndarray, vectors: np.ndarray, alpha=0.5) -> np.ndarray:
+    assert block.ndim == 2 and vectors.ndim == 2 and block.shape[1] == vectors.shape[1]
+
+    size = block.shape[1]
+    block = np.asarray(block, dtype=np.float64)
+    columns = np.ascontiguousarray(vectors.T, dtype=np.float64) # one characteristic of all vectors per row
+
+    block_centered = block - block.mean(axis=1, keepdims=True)
+    centered = columns - columns.mean(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        norms = np.outer(np.einsum("ij,ij->i", block_centered, block_centered), np.einsum("ij,ij->j", centered, centered))
+        corr = (block_centered @ centered) / np.sqrt(norms)
+    np.clip(corr, -1.0, 1.0, out=corr)
+
+    # one characteristic at a time and in place, so only B x N values are held (not B x N x size)
+    l1 = np.zeros((len(block), len(columns[0])))
+    difference = np.empty_like(l1)
+    for i in range(size):
+        np.subtract(block[:, i, None], columns[i], out=difference)
+        l1 += np.abs(difference, out=difference)
+
+    corr *= alpha
+    l1 *= -(1 - alpha) / (2 * size)
+    return corr + (1 - alpha) + l1
@@ -0,0 +1,71 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.domain.similarity.material_similarity import calculate_similarity_matrix
+
+# similarities computed at once by one thread of the bulk build (block of rows x all materials), bounds its memory
+# (a few arrays of 8 B values of this size per thread)
+BLOCK_ELEMENTS = 1_000_000
+MAX_WORKERS = 4
+
+# neighbour lists are the first k materials of the similarity ranking of a material (the material itself included),
+# ordered as select_top_k orders them - by similarity (descending), ties in the order of the materials and materials
+# with undefined similarity (nan) last
+
+def _get_keys(similarities: np.ndarray) -> np.ndarray:
+    return np.where(np.isnan(similarities), -np.inf, similarities)
+
+def compute_neighbour_lists(vectors: np.ndarray, k: int, alpha=0.5, block_size: Optional[int] = None, workers: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    # returns (positions, similarities), both N x min(k, N) - neighbour lists of all rows of vectors
+    # blocks of rows are computed by a few threads in parallel (numpy releases the GIL)
+    n = len(vectors)
+    k = min(k, n)
+    if block_size is None:
+        block_size = max(1, BLOCK_ELEMENTS // max(n, 1))
+    if workers is None:
+        workers = min(MAX_WORKERS, os.cpu_count() or 1)
+
+    positions = np.empty((n, k), dtype=np.int64)
+    similarities = np.empty((n, k), dtype=np.float64)
+
+    def compute_block(start: int):
+        block_similarities = calculate_similarity_matrix(vectors[start:start + block_size], vectors, alpha)
+        keys = _get_keys(block_similarities)
+
+        if k < n:
+            selected = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+        else:
+            selected = np.broadcast_to(np.arange(n), keys.shape)
+        order = np.lexsort((selected, -np.take_along_axis(keys, selected, axis=1)), axis=1)
+        selected = np.take_along_axis(selected, order, axis=1)
+
+        end = start + len(selected)
+        positions[start:end] = selected
+        similarities[start:end] = np.take_along_axis(block_similarities, selected, axis=1)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="neighbour-lists") as executor:
+        list(executor.map(compute_block, range(0, n, block_size))) # list re-raises exceptions of the blocks
+
+    return positions, similarities
+
+def insert_neighbour(neighbour_ids: np.ndarray, similarities: np.ndarray, material_id: int, similarity: float, k: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    # returns the list with a material added after all materials of the list (after the neighbours with the same similarity),
+    # None when the material does not get among the first k or is in the list already
+    if material_id in neighbour_ids:
+        return None
+
+    key = -np.inf if np.isnan(similarity) else similarity
+    position = int(np.searchsorted(-_get_keys(similarities), -key, side="right"))
+    if position >= k:
+        return None
+
+    return np.insert(neighbour_ids, position, material_id)[:k], np.insert(similarities, position, similarity)[:k]
+
+def get_entry_threshold(similarities: np.ndarray, k: int) -> Optional[float]:
+    # materials with higher similarity enter the list, None when any material does (list is not full)
+    if len(similarities) < k or np.isnan(similarities[-1]):
+        return None
+    return float(similarities[-1])
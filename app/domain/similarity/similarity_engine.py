@@ -0,0 +1,256 @@
+import logging
+import threading
+from typing import Optional, Tuple, Sequence
+
+import numpy as np
+
+from app.domain.similarity.ann_index import ApproximateIndex, IVFIndex
+from app.domain.similarity.material_similarity import calculate_similarity_batch
+
+logger = logging.getLogger(__name__)
+
+MIN_INDEX_SIZE = 1000 # below this size approximate queries are exact, scoring everything is fast enough
+
+
+class SimilarityEngine:
+    # keeps characteristics of all materials as one contiguous float32 matrix (N x 16) so that a similarity
+    # query is a single batched numpy pass over the matrix instead of one scipy call per material
+    # next to the matrix the engine keeps category codes of materials, so category filters (and IDs of materials found by
+    # name) select candidate rows before scoring and only the candidates are scored
+    # rows are only ever appended (stored materials never change), so snapshots taken by queries stay valid
+    # for approximate queries the engine maintains an approximate index (IVF) over the rows, new rows are inserted
+    # to the index as they are added, the index is built (and rebuilt when the rows outgrow it) in a background thread
+
+    def __init__(self, vector_size: int = 16, min_index_size: int = MIN_INDEX_SIZE):
+        self.vector_size = vector_size
+        self.min_index_size = min_index_size
+        self.revision: Optional[Tuple[int, int]] = None # (count, max ID) of the materials the engine was built from
+
+        self._ids = np.empty(0, dtype=np.int64)
+        self._vectors = np.empty((0, vector_size), dtype=np.float32)
+        self._category_codes = np.empty(0, dtype=np.int16)
+        self._categories = {} # category -> code in _category_codes
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self._index: Optional[ApproximateIndex] = None
+        self._index_lock = threading.Lock() # only one thread builds the index
+        self._index_thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, ids: Sequence[int], vectors: np.ndarray, categories: Sequence[str]):
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.vector_size)
+        assert len(ids) == len(vectors) == len(categories)
+
+        with self._lock:
+            codes = np.array([self._get_category_code(category, create=True) for category in categories], dtype=np.int16)
+
+            new_size = self._size + len(ids)
+            if new_size > len(self._ids):
+                # grow capacity geometrically so adding materials one by one is amortized O(1)
+                capacity = max(new_size, 2 * len(self._ids), 64)
+                self._ids = self._grow(self._ids, capacity)
+                self._vectors = self._grow(self._vectors, capacity)
+                self._category_codes = self._grow(self._category_codes, capacity)
+
+            self._ids[self._size:new_size] = ids
+            self._vectors[self._size:new_size] = vectors
+            self._category_codes[self._size:new_size] = codes
+            old_size, self._size = self._size, new_size
+
+            if self._index is not None:
+                self._index.add(np.arange(old_size, new_size), vectors)
+
+    def clear(self):
+        with self._lock:
+            self._size = 0
+            self._index = None
+            self.revision = None
+
+    def get_index(self) -> Optional[ApproximateIndex]:
+        # returns the current index without waiting for a build - missing or outgrown index is (re)built in the background,
+        # until then queries use the outgrown index (it has all the rows) or are exact when there is none
+        index = self._index
+        if self._needs_index(index):
+            self._start_index_build()
+        return index
+
+    def build_index(self) -> Optional[ApproximateIndex]:
+        # builds missing or outgrown index right away (background build, benchmarks)
+        with self._index_lock:
+            index = self._index
+            if not self._needs_index(index):
+                return index
+
+            _, vectors = self.get_snapshot()
+            index = IVFIndex.build(vectors)
+            self._set_index(index)
+            return index
+
+    @property
+    def index(self) -> Optional[ApproximateIndex]:
+        # current index, does not start a build
+        return self._index
+
+    def is_index_building(self) -> bool:
+        return self._index_thread is not None
+
+    def _needs_index(self, index: Optional[ApproximateIndex]) -> bool:
+        return self._size >= self.min_index_size and (index is None or index.needs_rebuild(self._size))
+
+    def _start_index_build(self):
+        with self._lock:
+            if self._index_thread is not None:
+                return
+            self._index_thread = threading.Thread(target=self._build_index_in_background, name="similarity-index", daemon=True)
+            self._index_thread.start()
+
+    def _build_index_in_background(self):
+        try:
+            self.build_index()
+        except Exception:
+            logger.exception("Similarity index was not built")
+        finally:
+            with self._lock:
+                self._index_thread = None
+
+    def save_index(self, path: str) -> bool:
+        index = self._index
+        if index is None:
+            return False
+
+        ids, _ = self.get_snapshot()
+        index.save(path, ids)
+        return True
+
+    def load_index(self, path: str) -> bool:
+        # returns False when the saved index does not match materials in the engine
+        ids, _ = self.get_snapshot()
+        index = IVFIndex.load(path, ids)
+        if index is None:
+            return False
+
+        with self._index_lock:
+            self._set_index(index)
+        return True
+
+    def _set_index(self, index: ApproximateIndex):
+        with self._lock:
+            # rows added while the index was being built or loaded
+            if self._size > len(index):
+                index.add(np.arange(len(index), self._size), self._vectors[len(index):self._size])
+            self._index = index
+
+    def get_snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        # returns (ids, vectors) views of all materials currently in the engine
+        with self._lock:
+            size = self._size
+            return self._ids[:size], self._vectors[:size]
+
+    def get_candidates(self,
+                       categories: Optional[Sequence[str]] = None,
+                       material_ids: Optional[Sequence[int]] = None) -> Optional[np.ndarray]:
+        # returns sorted row positions of materials matching the filters, None when there is no filter
+        # categories are matched as any of the given categories, material_ids - only these materials (e.g. found by
+        # name search of the repository)
+        if not categories and material_ids is None:
+            return None
+
+        with self._lock:
+            size = self._size
+            category_codes = self._category_codes[:size]
+            ids = self._ids[:size]
+
+            mask = np.ones(size, dtype=bool)
+            if categories:
+                codes = [self._get_category_code(category) for category in categories]
+                mask &= np.isin(category_codes, codes)
+            if material_ids is not None:
+                mask &= np.isin(ids, np.asarray(material_ids, dtype=np.int64))
+            positions = np.flatnonzero(mask)
+
+        return positions
+
+    def score(self,
+              target_vector: np.array,
+              categories: Optional[Sequence[str]] = None,
+              approximate: bool = False,
+              alpha=0.5,
+              material_ids: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # returns (ids, similarities) of the materials matching the filters in the order they were added
+        # only the matching rows are scored, approximate query scores only rows returned by the approximate index
+        ids, vectors = self.get_snapshot()
+
+        positions = self.get_candidates(categories, material_ids)
+        if approximate:
+            index = self.get_index()
+            if index is not None:
+                found = index.search(target_vector)
+                positions = found if positions is None else np.intersect1d(positions, found, assume_unique=True)
+
+        if positions is not None:
+            positions = positions[positions < len(ids)] # rows added after the snapshot was taken
+            ids, vectors = ids[positions], vectors[positions]
+
+        if len(ids) == 0:
+            return ids, np.empty(0, dtype=np.float64)
+
+        return ids, calculate_similarity_batch(target_vector, vectors, alpha)
+
+    def rank(self, target_vector: np.array, alpha=0.5) -> Tuple[np.ndarray, np.ndarray]:
+        # returns (ids, similarities) sorted by similarity (descending), materials with undefined similarity are last
+        ids, similarities = self.score(target_vector, alpha=alpha)
+        order = np.argsort(-similarities, kind="stable")
+        return ids[order], similarities[order]
+
+    def _get_category_code(self, category, create=False) -> int:
+        category = getattr(category, "value", category) # enum members and their values are the same category
+        code = self._categories.get(category)
+        if code is None:
+            if not create:
+                return -1 # category that no material has, matches nothing
+            code = len(self._categories)
+            self._categories[category] = code
+        return code
+
+    @staticmethod
+    def _grow(array: np.ndarray, capacity: int) -> np.ndarray:
+        grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+
+def select_top_k(similarities: np.ndarray,
+                 limit: Optional[int] = None,
+                 offset: int = 0,
+                 min_similarity: Optional[float] = None,
+                 candidates: Optional[np.ndarray] = None) -> np.ndarray:
+    # returns positions of the best similarities (descending) for the requested page
+    # only the first offset + limit results are selected by partial selection (argpartition) and sorted, not the whole array
+    # candidates - optional boolean mask of rows that can be returned at all
+    # materials with undefined similarity (nan) are always last
+    keys = np.where(np.isnan(similarities), -np.inf, similarities)
+
+    mask = candidates
+    if min_similarity is not None:
+        above = similarities >= min_similarity
+        mask = above if mask is None else mask & above
+
+    positions = np.arange(len(keys)) if mask is None else np.flatnonzero(mask)
+    if mask is not None:
+        keys = keys[positions]
+
+    end = len(keys) if limit is None else min(offset + limit, len(keys))
+    if offset >= end:
+        return np.empty(0, dtype=np.int64)
+
+    if end < len(keys):
+        selected = np.sort(np.argpartition(-keys, end - 1)[:end]) # sorted so ties keep the original order like in full sort
+    else:
+        selected = np.arange(len(keys))
+    selected = selected[np.argsort(-keys[selected], kind="stable")]
+
+    return positions[selected[offset:end]]
@@ -1,18 +1,75 @@
+import threading
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from sqlalchemy.schema import CreateIndex
+
+import app.core.config as config
+from app.db.repository.sqlite_fingerprint_cache_repository import SQLiteFingerprintCacheRepository
+from app.db.repository.sqlite_material_repository import SQLiteMaterialRepository
+from app.models.material import Base, MATERIAL_NAME_ORDER_INDEX
+from app.models.fingerprint_cache_entry import FingerprintCacheEntry # registers the table for create_all
+from app.models.material_statistics import MaterialStatistics # registers the table for create_all
+from app.models.material_name_search import create_material_name_search
+from app.models.material_neighbours import MaterialNeighbours # registers the table for create_all
+from app.routers import materials, health
+from app.db.database import engine, SessionLocal, ReadSessionLocal
+from app.db.database_writer import database_writer
+from app.services.analysis_executor import analysis_executor
+from app.services.fingerprint_cache import fingerprint_cache
+from app.services.inference_batcher import inference_batcher
+from app.services.material_service import load_similarity_index, save_similarity_index
+from app.services.model_registry import model_registry
+from app.services.neighbour_service import prepare_stored_neighbour_lists
+
+def create_database():
+    Base.metadata.create_all(bind=engine)  # creates all tables based on models
+    with engine.begin() as connection: # create_all does not add indexes to existing tables (and cannot check expression indexes)
+        connection.execute(CreateIndex(MATERIAL_NAME_ORDER_INDEX, if_not_exists=True))
+        create_material_name_search(connection)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    create_database() # at startup, not on import, so importing the app does not change the DB
+    if config.PRELOAD_MODELS:
+        model_registry.load() # CLIP and MLP are loaded once per worker at startup and shared by all requests
+    analysis_executor.start()
+    inference_batcher.start()
+    database_writer.start()
+
+    if config.FINGERPRINT_CACHE_DB_SIZE > 0:
+        fingerprint_cache.repository = SQLiteFingerprintCacheRepository(SessionLocal, config.FINGERPRINT_CACHE_DB_SIZE)
+
+    if config.SIMILARITY_INDEX_PATH:
+        with ReadSessionLocal() as db: # same session as requests, so they use the loaded index
+            load_similarity_index(SQLiteMaterialRepository(db), config.SIMILARITY_INDEX_PATH)
+
+    if config.NEIGHBOUR_LIST_SIZE > 0:
+        # until the neighbour lists are built, similar materials are computed
+        threading.Thread(target=prepare_stored_neighbour_lists, name="neighbour-lists", daemon=True).start()
+
+    yield
+
+    if config.SIMILARITY_INDEX_PATH:
+        with ReadSessionLocal() as db:
+            save_similarity_index(SQLiteMaterialRepository(db), config.SIMILARITY_INDEX_PATH)
+
+    inference_batcher.shutdown()
+    analysis_executor.shutdown()
+    database_writer.shutdown() # after the analyses, which store materials through it
+    model_registry.unload()
 
-from app.models.material import Base
-from app.routers import materials
-from app.db.database import engine
 app = FastAPI(
     title="MatTag Server",
     description="API for material fingerprinting and analysis",
     version="0.7.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
-Base.metadata.create_all(bind=engine)  # creates all tables based on models
 app.include_router(materials.router)
+app.include_router(health.router)
 
 __all__ = ['app']
 
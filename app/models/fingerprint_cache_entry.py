@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, Float, LargeBinary
+
+from app.models.material import Base
+
+class FingerprintCacheEntry(Base):
+    __tablename__ = "fingerprint_cache"
+
+    key = Column(String, primary_key=True) # hash of both decoded images and the model version
+    ratings = Column(LargeBinary, nullable=False) # 16 float32 values
+    last_used_at = Column(Float, nullable=False, index=True) # unix timestamp, least recently used entries are evicted first
@@ -1,5 +1,5 @@
 import sqlalchemy
-from sqlalchemy import Column, String, Enum, Float, Integer, Boolean
+from sqlalchemy import Column, String, Enum, Float, Integer, Boolean, Index, func
 from sqlalchemy.orm import declarative_base
 from app.schemas.material import MaterialCategory
 
@@ -29,4 +29,27 @@ class Material(Base):
     characteristics_surface_roughness = Column(Float, nullable=False)
     characteristics_thickness = Column(Float, nullable=False)
     characteristics_value = Column(Float, nullable=False)
-    characteristics_warmth = Column(Float, nullable=False)
\ No newline at end of file
+    characteristics_warmth = Column(Float, nullable=False)
+
+# materials are listed in (lower(name), id) order, the index serves both the sort and keyset pagination
+MATERIAL_NAME_ORDER_INDEX = Index("ix_materials_lower_name_id", func.lower(Material.name), Material.id)
+
+# order of characteristics in material vectors used for similarity (same order as fields of MaterialCharacteristics)
+CHARACTERISTICS_COLUMNS = [
+    Material.characteristics_brightness,
+    Material.characteristics_color_vibrancy,
+    Material.characteristics_hardness,
+    Material.characteristics_checkered_pattern,
+    Material.characteristics_movement_effect,
+    Material.characteristics_multicolored,
+    Material.characteristics_naturalness,
+    Material.characteristics_pattern_complexity,
+    Material.characteristics_scale_of_pattern,
+    Material.characteristics_shininess,
+    Material.characteristics_sparkle,
+    Material.characteristics_striped_pattern,
+    Material.characteristics_surface_roughness,
+    Material.characteristics_thickness,
+    Material.characteristics_value,
+    Material.characteristics_warmth
+]
@@ -0,0 +1,35 @@
+from sqlalchemy import DDL, event, inspect, text
+
+from app.models.material import Material
+
+# FTS5 index of material names (trigram tokenizer - substring search in the index, case-insensitive), external content
+# table over materials, so names are not stored twice, triggers keep it in sync with the materials table
+MATERIAL_NAME_SEARCH_TABLE = "material_name_search"
+
+CREATE_STATEMENTS = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {MATERIAL_NAME_SEARCH_TABLE}
+        USING fts5(name, content='materials', content_rowid='id', tokenize='trigram')""",
+    f"""CREATE TRIGGER IF NOT EXISTS materials_name_search_insert AFTER INSERT ON materials BEGIN
+        INSERT INTO {MATERIAL_NAME_SEARCH_TABLE}(rowid, name) VALUES (new.id, new.name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS materials_name_search_delete AFTER DELETE ON materials BEGIN
+        INSERT INTO {MATERIAL_NAME_SEARCH_TABLE}({MATERIAL_NAME_SEARCH_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS materials_name_search_update AFTER UPDATE OF name ON materials BEGIN
+        INSERT INTO {MATERIAL_NAME_SEARCH_TABLE}({MATERIAL_NAME_SEARCH_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO {MATERIAL_NAME_SEARCH_TABLE}(rowid, name) VALUES (new.id, new.name);
+    END""",
+]
+
+def create_material_name_search(connection):
+    # creates the index for DBs created before it existed and fills it with names of the stored materials
+    exists = inspect(connection).has_table(MATERIAL_NAME_SEARCH_TABLE)
+    for statement in CREATE_STATEMENTS:
+        connection.execute(text(statement))
+    if not exists:
+        connection.execute(text(f"INSERT INTO {MATERIAL_NAME_SEARCH_TABLE}({MATERIAL_NAME_SEARCH_TABLE}) VALUES ('rebuild')"))
+
+# created and dropped together with the materials table (create_all and drop_all)
+for statement in CREATE_STATEMENTS:
+    event.listen(Material.__table__, "after_create", DDL(statement))
+event.listen(Material.__table__, "before_drop", DDL(f"DROP TABLE IF EXISTS {MATERIAL_NAME_SEARCH_TABLE}"))
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, ForeignKey, LargeBinary, Float
+
+from app.models.material import Base
+
+class MaterialNeighbours(Base):
+    __tablename__ = "material_neighbours"
+
+    material_id = Column(Integer, ForeignKey("materials.id"), primary_key=True)
+    neighbour_ids = Column(LargeBinary, nullable=False) # int64 IDs of the most similar materials, the most similar first
+    similarities = Column(LargeBinary, nullable=False) # float64 similarities of the neighbours
+    threshold = Column(Float) # similarity of the last neighbour, materials with higher similarity enter the list, null when it is not full
+
+class MaterialNeighboursState(Base):
+    __tablename__ = "material_neighbours_state"
+
+    id = Column(Integer, primary_key=True) # single row
+    size = Column(Integer, nullable=False) # number of neighbours in the lists
+    max_material_id = Column(Integer, nullable=False) # lists include all materials up to this ID
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, Integer, ForeignKey, LargeBinary
+
+from app.models.material import Base
+
+class MaterialStatistics(Base):
+    __tablename__ = "material_statistics"
+
+    material_id = Column(Integer, ForeignKey("materials.id"), primary_key=True)
+    statistics = Column(LargeBinary, nullable=False) # 2 x 14 float64 values - not normalized statistics of non specular and specular image
@@ -0,0 +1,108 @@
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Response, Depends
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from starlette import status
+
+import app.core.config as config
+from app.db.database import get_db, get_pool_status, engine, read_engine
+from app.db.database_writer import database_writer
+from app.db.repository.repository_factory import get_material_repository
+from app.domain.repository.material_repository import MaterialRepository
+from app.schemas.health import ModelStatusResponse, SimilarityIndexStatusResponse, AnalysisQueueStatusResponse, \
+    FingerprintCacheStatusResponse, DatabaseStatusResponse, DatabasePoolStatusResponse
+from app.services.analysis_executor import analysis_executor
+from app.services.fingerprint_cache import fingerprint_cache
+from app.services.inference_batcher import inference_batcher
+from app.services.model_registry import model_registry
+
+router = APIRouter(
+    prefix="/health",
+    tags=["Health"]
+)
+
+@router.get(
+    "/ready",
+    response_model=ModelStatusResponse,
+    responses={
+        503: {
+            "model": ModelStatusResponse,
+            "description": "Fingerprinting models are not loaded yet (only when they are loaded at startup)"
+        }
+    }
+)
+def get_readiness(response: Response):
+    if config.PRELOAD_MODELS and not model_registry.is_ready():
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+
+    loaded_at = None
+    if model_registry.loaded_at is not None:
+        loaded_at = datetime.fromtimestamp(model_registry.loaded_at, tz=timezone.utc)
+
+    average_inference_time = None
+    if model_registry.inference_count > 0:
+        average_inference_time = model_registry.inference_time_seconds / model_registry.inference_count
+
+    return ModelStatusResponse(
+        ready=model_registry.is_ready(),
+        preload=config.PRELOAD_MODELS,
+        device=model_registry.get_device(),
+        loaded_at=loaded_at,
+        load_time_seconds=model_registry.load_time_seconds,
+        component_load_times=model_registry.get_component_load_times(),
+        inference_count=model_registry.inference_count,
+        average_inference_time_seconds=average_inference_time,
+        batch_size_distribution=inference_batcher.get_batch_size_distribution()
+    )
+
+@router.get("/analysis-queue", response_model=AnalysisQueueStatusResponse)
+async def get_analysis_queue_status(): # async, counters of the executor are only modified from the event loop
+    return AnalysisQueueStatusResponse(
+        workers=analysis_executor.workers,
+        queue_size=analysis_executor.queue_size,
+        in_flight=analysis_executor.in_flight,
+        completed=analysis_executor.completed,
+        rejected=analysis_executor.rejected
+    )
+
+@router.get("/fingerprint-cache", response_model=FingerprintCacheStatusResponse)
+def get_fingerprint_cache_status():
+    return FingerprintCacheStatusResponse(
+        entries=len(fingerprint_cache),
+        max_entries=fingerprint_cache.max_entries,
+        persistent=fingerprint_cache.repository is not None,
+        memory_hits=fingerprint_cache.memory_hits,
+        persistent_hits=fingerprint_cache.repository_hits,
+        misses=fingerprint_cache.misses
+    )
+
+@router.get("/database", response_model=DatabaseStatusResponse)
+def get_database_status(db: Session = Depends(get_db)):
+    writer_status = database_writer.get_status()
+    return DatabaseStatusResponse(
+        journal_mode=db.execute(text("PRAGMA journal_mode")).scalar(),
+        read_pool=DatabasePoolStatusResponse(**get_pool_status(read_engine)),
+        write_pool=DatabasePoolStatusResponse(**get_pool_status(engine)),
+        writes=writer_status["writes"],
+        failed_writes=writer_status["failed_writes"],
+        pending_writes=writer_status["pending_writes"],
+        average_write_wait_seconds=writer_status["average_wait_seconds"],
+        max_write_wait_seconds=writer_status["max_wait_seconds"],
+        average_write_seconds=writer_status["average_write_seconds"]
+    )
+
+@router.get("/similarity-index", response_model=SimilarityIndexStatusResponse)
+def get_similarity_index_status(repository: MaterialRepository = Depends(get_material_repository)):
+    # only reports the index, it is built in the background (recall of the index is measured by the similarity benchmark)
+    engine = repository.get_similarity_engine()
+    index = engine.index
+
+    return SimilarityIndexStatusResponse(
+        materials_count=len(engine),
+        index_built=index is not None,
+        index_building=engine.is_index_building(),
+        lists_count=len(index.centroids) if index is not None else None,
+        probed_lists_count=index.n_probe if index is not None else None,
+        trained_size=index.trained_size if index is not None else None
+    )
@@ -1,50 +1,107 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, Query, HTTPException, UploadFile, Form, File
+from fastapi import APIRouter, Depends, Query, HTTPException, UploadFile, Form, File, Header
 from fastapi import Response
+from fastapi.responses import ORJSONResponse
 from starlette import status
-from starlette.responses import FileResponse
+from starlette.responses import FileResponse, JSONResponse, StreamingResponse
 
 import app.core.config
-from app.db.repository.repository_factory import get_material_repository
+from app.db.repository.repository_factory import get_material_repository, get_material_statistics_repository, \
+    get_material_neighbours_repository
+from app.domain.repository.material_neighbours_repository import MaterialNeighboursRepository
 from app.domain.repository.material_repository import MaterialRepository
-from app.schemas.material import MaterialRequest, MaterialResponse, MaterialCategory, SimilarMaterialsRequest
-from app.services.image_service import get_material_response, image_validation, load_image
+from app.domain.repository.material_statistics_repository import MaterialStatisticsRepository
+from app.schemas.material import MaterialRequest, MaterialResponse, MaterialCategory, SimilarMaterialsRequest, \
+    SimilarMaterialResponse, AnalysedMaterialResponse, MaterialSearchResponse
+from app.schemas.material_statistics import MaterialStatisticsResponse
+from app.schemas.plot_format import PlotFormat
+from app.schemas.name_match import NameMatch
+from app.schemas.plot_kind import PlotKind
+from app.schemas.similarity_mode import SimilarityMode
+from app.services.analysis_executor import AnalysisQueueFullError
+from app.services.image_service import get_material_rows_content, get_similar_material_rows_content, image_validation, load_image, \
+    InvalidImageError, get_analysed_material_response, get_material_statistics_response, get_material_rows_ndjson, \
+    get_material_search_rows_content
 from app.services.material_service import calculate_similarity_using_id, calculate_similarity_using_characteristics, \
-    filter_materials, calculate_material_characteristics_and_process_all, material_name_validation
+    calculate_material_characteristics_and_process_all, material_name_validation, get_material_statistics, \
+    get_material_rows_page, iterate_material_rows, InvalidCursorError
+from app.services.plot_service import get_plot_key, get_plot_path, etag_matches, InvalidPlotStyleError, get_plot_svg, \
+    get_plot_geometry
 
 router = APIRouter(
     prefix="/materials",
     tags=["Materials"]
 )
 
-@router.get("", response_model=List[MaterialResponse])
+@router.get(
+    "",
+    response_model=List[MaterialResponse],
+    responses={
+        200: {
+            "description": "Materials ordered by name (case insensitive) and ID. With limit, the X-Next-Cursor header contains "
+                           "cursor of the next page (missing on the last page). With stream=true, materials are streamed "
+                           "as newline delimited JSON, one material per line",
+            "content": {"application/x-ndjson": {}}
+        },
+        400: {
+            "description": "Bad request - invalid cursor"
+        }
+    }
+)
 def get_materials(
     name: Optional[str] = None,
     categories: Optional[List[MaterialCategory]] = Query(None), # complex parameter, therefore must be Query(None) instead of just None
+    name_match: NameMatch = NameMatch.SUBSTRING,
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of returned materials (page size), all materials when not set"),
+    cursor: Optional[str] = Query(None, description="Cursor of the page from X-Next-Cursor header of the previous page"),
+    stream: bool = Query(False, description="Stream all materials after the cursor as newline delimited JSON (limit is ignored)"),
+    repository: MaterialRepository = Depends(get_material_repository)
+):
+    # materials are read as rows and returned without validation by response_model (documents the response only),
+    # orjson serializes large lists of materials an order of magnitude faster than json
+    try:
+        if stream:
+            rows = iterate_material_rows(repository, name, categories, cursor, name_match)
+            return StreamingResponse(get_material_rows_ndjson(rows), media_type="application/x-ndjson")
+        rows, next_cursor = get_material_rows_page(repository, name, categories, limit, cursor, name_match)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+    return ORJSONResponse(get_material_rows_content(rows), headers=headers)
+
+@router.get("/search", response_model=List[MaterialSearchResponse])
+def search_materials(
+    name: str = Query(..., min_length=3, description="Searched name, materials with similar names are returned even with typos"),
+    categories: Optional[List[MaterialCategory]] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
     repository: MaterialRepository = Depends(get_material_repository)
 ):
-    materials = repository.get_materials(name, categories)
-    return [get_material_response(material) for material in materials]
+    # materials ordered by score (the best matches first)
+    return ORJSONResponse(get_material_search_rows_content(repository.search_material_rows(name, categories, limit)))
 
 @router.post(
     "",
-    response_model=MaterialResponse,
+    response_model=AnalysedMaterialResponse,
     status_code=status.HTTP_201_CREATED,
     responses={
         200: {
-            "model": MaterialResponse,
+            "model": AnalysedMaterialResponse,
             "description": "Material analysis successful, data NOT stored in database (store_in_db=False)"
         },
         201: {
-            "model": MaterialResponse,
+            "model": AnalysedMaterialResponse,
             "description": "Material analysis successful, data stored in database (store_in_db=True)"
         },
         400: {
             "description": "Bad request - invalid material name or image format"
+        },
+        503: {
+            "description": "Server is busy with other analyses, retry later"
         }
     }
 )
-def analyse_material(
+async def analyse_material(
     response: Response,
     specular_image: UploadFile = File(
         ...,
@@ -57,7 +114,10 @@ def analyse_material(
     name: str = Form(), # Form() specifies that name is expected to be in the body of the request
     category: MaterialCategory = Form(),
     store_in_db: bool = Form(),
-    repository: MaterialRepository = Depends(get_material_repository)
+    include_statistics: bool = Form(False, description="Include physical statistics of the images in the response"),
+    repository: MaterialRepository = Depends(get_material_repository),
+    statistics_repository: MaterialStatisticsRepository = Depends(get_material_statistics_repository),
+    neighbours_repository: MaterialNeighboursRepository = Depends(get_material_neighbours_repository)
 ):
     name_validation_result = material_name_validation(name)
     if not name_validation_result[0]:
@@ -69,13 +129,46 @@ def analyse_material(
     if not image_validation(image=non_specular_image):
         raise HTTPException(status_code=400, detail="Non specular image is not a valid image.")
 
-    material_data = MaterialRequest(name=name, category=category, store_in_db=store_in_db)
-    material = calculate_material_characteristics_and_process_all(material_data, specular_image, non_specular_image, repository)
+    material_data = MaterialRequest(name=name, category=category, store_in_db=store_in_db, include_statistics=include_statistics)
+    try:
+        material, statistics = await calculate_material_characteristics_and_process_all(material_data, specular_image, non_specular_image, repository, statistics_repository, neighbours_repository)
+    except InvalidImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AnalysisQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
 
     if not store_in_db:
         response.status_code = status.HTTP_200_OK
 
-    return get_material_response(material)
+    return get_analysed_material_response(material, statistics)
+
+@router.get(
+    "/{material_id}/statistics",
+    response_model=MaterialStatisticsResponse,
+    responses={
+        404: {
+            "description": "Material with specified ID or its images not found"
+        },
+        503: {
+            "description": "Statistics were not computed yet and server is busy with other analyses, retry later"
+        }
+    }
+)
+async def get_statistics_of_material(
+    material_id: int,
+    repository: MaterialRepository = Depends(get_material_repository),
+    statistics_repository: MaterialStatisticsRepository = Depends(get_material_statistics_repository)
+):
+    # statistics are computed only once per material (at ingest or on the first request for older materials)
+    try:
+        statistics = await get_material_statistics(material_id, repository, statistics_repository)
+    except AnalysisQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+    if statistics is None:
+        raise HTTPException(status_code=404, detail=f"Material with ID {material_id} or its images not found")
+
+    return get_material_statistics_response(material_id, statistics)
 
 @router.get(
     "/{material_id}/image/specular",
@@ -90,7 +183,7 @@ def analyse_material(
         }
     }
 )
-def get_material_specular_image(
+async def get_material_specular_image(
         material_id: int
 ):
     image_name = app.core.config.get_specular_image_name(material_id)
@@ -101,9 +194,56 @@ def get_material_specular_image(
 
     return FileResponse(file_path, media_type="image/jpeg")
 
+@router.get(
+    "/{material_id}/plot/{kind}",
+    response_class=FileResponse,
+    responses={
+        200: {
+            "content": {"image/png": {}, "image/svg+xml": {}, "application/json": {}},
+            "description": "Returns the plot of ratings of the material as PNG, SVG or JSON geometry of the chart"
+        },
+        304: {
+            "description": "Plot not modified (If-None-Match contains its ETag)"
+        },
+        400: {
+            "description": "Invalid plot style"
+        },
+        404: {
+            "description": "Material with specified ID not found"
+        }
+    }
+)
+def get_material_plot(
+    material_id: int,
+    kind: PlotKind,
+    color: str = Query("blue", description="Color of the line, CSS color name or hex code (e.g. red or #ff0000)"),
+    plot_format: PlotFormat = Query(PlotFormat.PNG, alias="format"),
+    if_none_match: Optional[str] = Header(None),
+    repository: MaterialRepository = Depends(get_material_repository)
+):
+    # PNG plot is rendered once per material and style and then served from disk, SVG and JSON are generated on request
+    material = repository.get_material_by_id(material_id)
+    if material is None:
+        raise HTTPException(status_code=404, detail=f"Material with ID {material_id} not found")
+
+    try:
+        key = get_plot_key(material, kind, color, plot_format)
+    except InvalidPlotStyleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {"ETag": f'"{key}"'}
+    if if_none_match is not None and etag_matches(if_none_match, key):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if plot_format == PlotFormat.SVG:
+        return Response(get_plot_svg(material, kind, color), media_type="image/svg+xml", headers=headers)
+    if plot_format == PlotFormat.JSON:
+        return JSONResponse(get_plot_geometry(material, kind), headers=headers)
+    return FileResponse(get_plot_path(material, kind, color, key), media_type="image/png", headers=headers)
+
 @router.get(
     "/{material_id}/similar",
-    response_model=List[MaterialResponse],
+    response_model=List[SimilarMaterialResponse],
     responses={
         404: {
             "description": "Material with specified ID not found"
@@ -114,20 +254,45 @@ def get_similar_materials(
     material_id: int,
     name: Optional[str] = None,
     categories: Optional[List[MaterialCategory]] = Query(None),
-    repository: MaterialRepository = Depends(get_material_repository)
+    name_match: NameMatch = NameMatch.SUBSTRING,
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of returned materials, all materials when not set"),
+    offset: int = Query(0, ge=0),
+    min_similarity: Optional[float] = Query(None, ge=-1, le=1),
+    mode: SimilarityMode = SimilarityMode.EXACT,
+    repository: MaterialRepository = Depends(get_material_repository),
+    neighbours_repository: MaterialNeighboursRepository = Depends(get_material_neighbours_repository)
 ):
-    materials = calculate_similarity_using_id(material_id, repository)
-    if not materials:
+    materials = calculate_similarity_using_id(
+        material_id,
+        repository,
+        neighbours_repository,
+        name=name,
+        categories=categories,
+        limit=limit,
+        offset=offset,
+        min_similarity=min_similarity,
+        mode=mode,
+        name_match=name_match
+    )
+    if materials is None:
         raise HTTPException(status_code=404, detail=f"Material with ID {material_id} not found")
 
-    materials = filter_materials(materials, name, categories)
-    return [get_material_response(material) for material in materials]
+    return ORJSONResponse(get_similar_material_rows_content(materials))
 
-@router.post("/similar", response_model=List[MaterialResponse])
+@router.post("/similar", response_model=List[SimilarMaterialResponse])
 def get_similar_materials_by_characteristics(
     request: SimilarMaterialsRequest,
     repository: MaterialRepository = Depends(get_material_repository)
 ):
-    materials = calculate_similarity_using_characteristics(request.characteristics, repository)
-    materials = filter_materials(materials, request.name, request.categories)
-    return [get_material_response(material) for material in materials]
\ No newline at end of file
+    materials = calculate_similarity_using_characteristics(
+        request.characteristics,
+        repository,
+        name=request.name,
+        categories=request.categories,
+        limit=request.limit,
+        offset=request.offset,
+        min_similarity=request.min_similarity,
+        mode=request.mode,
+        name_match=request.name_match
+    )
+    return ORJSONResponse(get_similar_material_rows_content(materials))
\ No newline at end of file
@@ -0,0 +1,54 @@
+from typing import Optional, Dict
+from datetime import datetime
+
+from pydantic import BaseModel
+
+class ModelStatusResponse(BaseModel):
+    ready: bool # true when fingerprinting models are loaded and requests for analysis can be served
+    preload: bool = True # false when the models are loaded by the first analysis instead of at startup
+    device: Optional[str] = None
+    loaded_at: Optional[datetime] = None
+    load_time_seconds: Optional[float] = None
+    component_load_times: Dict[str, float] = {} # load time of each model component in seconds
+    inference_count: int
+    average_inference_time_seconds: Optional[float] = None # per material
+    batch_size_distribution: Dict[int, int] = {} # number of materials in one inference batch -> number of such batches
+
+class AnalysisQueueStatusResponse(BaseModel):
+    workers: int
+    queue_size: int # maximum number of analyses running or waiting at once
+    in_flight: int # analyses running or waiting right now
+    completed: int
+    rejected: int # analyses rejected because the queue was full
+
+class SimilarityIndexStatusResponse(BaseModel):
+    materials_count: int
+    index_built: bool # false when the catalogue is too small for approximate index or it is not built yet (approximate queries are exact)
+    index_building: bool # index is being built or rebuilt in the background
+    lists_count: Optional[int] = None
+    probed_lists_count: Optional[int] = None
+    trained_size: Optional[int] = None # number of materials the index was trained on
+
+class FingerprintCacheStatusResponse(BaseModel):
+    entries: int # entries in the in-process cache of this worker
+    max_entries: int
+    persistent: bool # true when the cache is also stored in the DB (shared by all workers)
+    memory_hits: int
+    persistent_hits: int
+    misses: int
+
+class DatabasePoolStatusResponse(BaseModel):
+    size: int
+    checked_out: int # connections in use
+    overflow: int # connections open over the size of the pool
+
+class DatabaseStatusResponse(BaseModel):
+    journal_mode: str # wal unless the DB does not support it (e.g. in-memory DB)
+    read_pool: DatabasePoolStatusResponse
+    write_pool: DatabasePoolStatusResponse
+    writes: int # writes executed by the database writer of this worker
+    failed_writes: int
+    pending_writes: int # writes waiting for the writer right now
+    average_write_wait_seconds: Optional[float] = None # time writes waited for the writer (for the write lock of this worker)
+    max_write_wait_seconds: float
+    average_write_seconds: Optional[float] = None
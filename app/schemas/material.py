@@ -1,13 +1,17 @@
 from typing import Optional, List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from app.schemas.material_category import MaterialCategory
 from app.schemas.material_characteristics import MaterialCharacteristics
+from app.schemas.material_statistics import MaterialStatisticsResponse
+from app.schemas.name_match import NameMatch
+from app.schemas.similarity_mode import SimilarityMode
 
 class MaterialRequest(BaseModel):
     name: str
     category: MaterialCategory
     store_in_db: bool # true when user wants to store images and analysed data in server DB
+    include_statistics: bool = False # true when user wants physical statistics of the images in the response
 
 class MaterialResponse(BaseModel):
     id: int
@@ -19,7 +23,21 @@ class MaterialResponse(BaseModel):
     class Config:
         orm_mode = True
 
+class AnalysedMaterialResponse(MaterialResponse):
+    statistics: Optional[MaterialStatisticsResponse] = None # only when requested by include_statistics
+
+class SimilarMaterialResponse(MaterialResponse):
+    similarity: Optional[float] = None # -1 <= similarity <= 1, null when similarity is undefined (constant characteristics)
+
+class MaterialSearchResponse(MaterialResponse):
+    score: float # 0 < score <= 1, share of trigrams of the searched name found in the material name
+
 class SimilarMaterialsRequest(BaseModel):
     characteristics: MaterialCharacteristics
     name: Optional[str] = None
+    name_match: NameMatch = NameMatch.SUBSTRING
     categories: Optional[List[MaterialCategory]] = None
+    limit: Optional[int] = Field(None, ge=1) # maximum number of returned materials, all materials when null
+    offset: int = Field(0, ge=0)
+    min_similarity: Optional[float] = Field(None, ge=-1, le=1)
+    mode: SimilarityMode = SimilarityMode.EXACT
@@ -0,0 +1,30 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+class ImageStatistics(BaseModel):
+    # physical statistics of one image (statistical features), fields are in the order of the features
+    # null when the value is undefined (e.g. normalized value of a statistic with zero std)
+    luminance_percentile_99: Optional[float] = None
+    luminance_percentile_1: Optional[float] = None
+    luminance_mean: Optional[float] = None
+    luminance_variance: Optional[float] = None
+    luminance_skewness: Optional[float] = None
+    luminance_kurtosis: Optional[float] = None
+    directionality: Optional[float] = None
+    low_frequencies: Optional[float] = None # mean power spectral density of low, middle and high spatial frequencies
+    middle_frequencies: Optional[float] = None
+    high_frequencies: Optional[float] = None
+    mean_chroma: Optional[float] = None
+    pattern_strength: Optional[float] = None
+    pattern_count: Optional[float] = None
+    multicolored: Optional[float] = None
+
+class ImageStatisticsResponse(BaseModel):
+    statistics: ImageStatistics
+    normalized_statistics: ImageStatistics # standardized by means and stds of the statistics of the training set
+
+class MaterialStatisticsResponse(BaseModel):
+    material_id: int
+    non_specular: ImageStatisticsResponse
+    specular: ImageStatisticsResponse
@@ -0,0 +1,6 @@
+from enum import Enum
+
+class NameMatch(str, Enum):
+    SUBSTRING = "SUBSTRING" # name contains the filter (case-insensitive)
+    PREFIX = "PREFIX" # name starts with the filter (case-insensitive)
+    FUZZY = "FUZZY" # name shares enough trigrams with the filter (typos, missing or extra letters)
@@ -0,0 +1,6 @@
+from enum import Enum
+
+class PlotFormat(str, Enum):
+    PNG = "png" # raster plot rendered by matplotlib (cached on disk)
+    SVG = "svg" # vector chart, a few KB
+    JSON = "json" # chart geometry (points of the chart) for rendering by the client
@@ -0,0 +1,5 @@
+from enum import Enum
+
+class PlotKind(str, Enum):
+    LINE = "line" # ratings as a line over rating categories
+    POLAR = "polar" # ratings around a circle (categories in the order of the polar plot of the original app)
@@ -0,0 +1,5 @@
+from enum import Enum
+
+class SimilarityMode(str, Enum):
+    EXACT = "EXACT" # all (filtered) materials are scored
+    APPROXIMATE = "APPROXIMATE" # only candidates from approximate nearest neighbour index are scored, faster for large catalogues
\ No newline at end of file
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Optional, Callable, Any
+
+import app.core.config as config
+
+logger = logging.getLogger(__name__)
+
+class AnalysisQueueFullError(Exception):
+    pass
+
+class AnalysisExecutor:
+    # dedicated bounded pool for CPU heavy analysis work (image decoding and preprocessing)
+    # analyses do not occupy the default threadpool used by other (light) endpoints, so a burst of analyses
+    # cannot starve catalogue browsing; threads are enough because torch and PIL release the GIL during heavy work
+    # admission is limited - when queue_size analyses are already running or waiting, new ones are rejected
+
+    def __init__(self, workers: Optional[int] = None, queue_size: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size or 4 * self.workers # running + waiting analyses
+
+        self.in_flight = 0 # only modified from the event loop, so no lock is needed
+        self.completed = 0
+        self.rejected = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    @asynccontextmanager
+    async def admission(self):
+        # whole analysis of one request (all its steps) runs inside admission
+        if self.in_flight >= self.queue_size:
+            self.rejected += 1
+            raise AnalysisQueueFullError(f"Analysis queue is full ({self.queue_size} analyses in progress)")
+
+        self.in_flight += 1
+        try:
+            yield
+            self.completed += 1
+        finally:
+            self.in_flight -= 1
+
+    async def run(self, function: Callable[..., Any], *args) -> Any:
+        self.start() # executor is normally started in app lifespan
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(function, *args))
+
+# one executor per worker process
+analysis_executor = AnalysisExecutor(workers=config.ANALYSIS_WORKERS, queue_size=config.ANALYSIS_QUEUE_SIZE)
\ No newline at end of file
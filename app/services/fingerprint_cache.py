@@ -0,0 +1,92 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+import app.core.config as config
+from app.domain.repository.fingerprint_cache_repository import FingerprintCacheRepository
+
+logger = logging.getLogger(__name__)
+
+def get_fingerprint_cache_key(non_specular_image: np.ndarray, specular_image: np.ndarray, model_version: str) -> str:
+    # key is computed from decoded pixels (not uploaded bytes), so the same images saved with different metadata or
+    # by a different encoder hit the cache as long as they decode to the same pixels
+    digest = hashlib.blake2b(digest_size=32)
+    for image in (non_specular_image, specular_image):
+        image = np.ascontiguousarray(image)
+        digest.update(str(image.shape).encode())
+        digest.update(image.data)
+    digest.update(model_version.encode())
+    return digest.hexdigest()
+
+class FingerprintCache:
+    # ratings of already analysed image pairs, re-uploaded pairs skip CLIP + MLP inference
+    # first tier is in-process LRU, optional second tier is persistent and shared by all worker processes
+
+    def __init__(self, max_entries: int = 1024, repository: Optional[FingerprintCacheRepository] = None):
+        self.max_entries = max_entries
+        self.repository = repository
+
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.repository_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            ratings = self._entries.get(key)
+            if ratings is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return ratings.copy()
+
+        if self.repository is not None:
+            try:
+                ratings = self.repository.get_ratings(key)
+            except Exception: # cache failure must not fail the analysis
+                logger.exception("Fingerprint cache lookup failed")
+                ratings = None
+
+            if ratings is not None:
+                self._put_memory(key, ratings)
+                with self._lock:
+                    self.repository_hits += 1
+                return ratings
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, ratings: np.ndarray):
+        ratings = np.array(ratings, dtype=np.float32)
+        self._put_memory(key, ratings)
+
+        if self.repository is not None:
+            try:
+                self.repository.add_ratings(key, ratings)
+            except Exception:
+                logger.exception("Fingerprint cache store failed")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _put_memory(self, key: str, ratings: np.ndarray):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = ratings
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+# one in-process tier per worker process, persistent tier is set in app lifespan when enabled
+fingerprint_cache = FingerprintCache(max_entries=config.FINGERPRINT_CACHE_SIZE)
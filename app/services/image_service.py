@@ -1,36 +1,53 @@
+import io
 import os
 from PIL import Image
 import numpy as np
+from typing import Optional, Tuple, List, Iterable, Iterator
+
+import orjson
 from fastapi import UploadFile
 
 from app.core.config import get_image_path
+from app.domain.fingerprinting.fingeprint_analyzer import ImageStats
 from app.models.material import Material
-from app.schemas.material import MaterialResponse
+from app.schemas.material import MaterialResponse, AnalysedMaterialResponse
 from app.schemas.material_characteristics import MaterialCharacteristics
+from app.schemas.material_statistics import ImageStatistics, ImageStatisticsResponse, MaterialStatisticsResponse
 
 
-def process_image_upload(image_file: UploadFile) -> np.array:
-    image = Image.open(image_file.file)
-    image = image.convert("RGB") # remove alpha channel that comes with Java Bitmap from Android app
-    image = image.resize((500, 500))
-    return np.array(image)
+STORED_IMAGE_SIZE = (500, 500)
 
-def image_validation(image: UploadFile) -> bool:
-    if not image.content_type.startswith("image/"):
-        return False
+class InvalidImageError(Exception):
+    pass
+
+class IngestedImage:
+
+    def __init__(self, image: Image.Image):
+        self.image = image # RGB, STORED_IMAGE_SIZE, kept for saving without converting the array back
+        self.array = np.array(image) # used for analysis
 
+def ingest_image(image_data: bytes) -> Optional[IngestedImage]:
+    # the only decode of an uploaded image - validates it (returns None when it cannot be decoded) and produces
+    # the resized image used for both analysis and storing
     try:
-        Image.open(image.file)
+        image = Image.open(io.BytesIO(image_data))
+        # JPEG can be downscaled already while decoding (by 1/2, 1/4 or 1/8, never below the requested size),
+        # photos from phones are much larger than 500x500 so most of the decoding work is skipped
+        image.draft("RGB", STORED_IMAGE_SIZE)
+        image.load() # decoding errors (truncated or corrupted data) are raised here
     except Exception:
-        return False
+        return None
 
-    image.file.seek(0)  # reset file pointer after checking because UploadFile is passed as reference
-    return True
+    image = image.convert("RGB") # remove alpha channel that comes with Java Bitmap from Android app
+    image = image.resize(STORED_IMAGE_SIZE)
+    return IngestedImage(image)
 
+def image_validation(image: UploadFile) -> bool:
+    # only the declared type is checked here, image data are validated when they are decoded (see ingest_image)
+    return image.content_type is not None and image.content_type.startswith("image/")
 
-def save_image(image: np.array, filename: str):
-    img = Image.fromarray(image)
 
+def save_image(img: Image.Image, filename: str):
     full_path = get_image_path(os.path.basename(filename))
     os.makedirs(os.path.dirname(full_path), exist_ok=True)
 
@@ -65,4 +82,63 @@ def get_material_response(material: Material) -> MaterialResponse:
             value=material.characteristics_value,
             warmth=material.characteristics_warmth
         )
-    )
\ No newline at end of file
+    )
+
+CHARACTERISTICS_FIELDS = list(MaterialCharacteristics.model_fields) # same order as characteristics in material rows
+
+def get_material_row_content(row: tuple) -> dict:
+    # same content as MaterialResponse of the material, built from its row without pydantic validation
+    # (validation of thousands of listed materials costs more than the query)
+    return {
+        "id": row[0],
+        "name": row[1],
+        "category": row[2],
+        "characteristics": dict(zip(CHARACTERISTICS_FIELDS, row[3:]))
+    }
+
+def get_material_rows_content(rows: List[tuple]) -> List[dict]:
+    return [get_material_row_content(row) for row in rows]
+
+def get_material_rows_ndjson(rows: Iterable[tuple]) -> Iterator[bytes]:
+    # one material per line (newline delimited JSON), rows are serialized as they are read
+    for row in rows:
+        yield orjson.dumps(get_material_row_content(row)) + b"\n"
+
+def get_similar_material_rows_content(rows_with_similarity: List[Tuple[tuple, float]]) -> List[dict]:
+    # content of SimilarMaterialResponse list
+    content = []
+    for row, similarity in rows_with_similarity:
+        item = get_material_row_content(row)
+        item["similarity"] = similarity if similarity == similarity else None # nan (undefined similarity) cannot be represented in JSON
+        content.append(item)
+    return content
+
+def get_material_search_rows_content(rows_with_score: List[Tuple[tuple, float]]) -> List[dict]:
+    # content of MaterialSearchResponse list
+    content = []
+    for row, score in rows_with_score:
+        item = get_material_row_content(row)
+        item["score"] = score
+        content.append(item)
+    return content
+
+def get_image_statistics(values: np.ndarray) -> ImageStatistics:
+    # nan and inf (undefined values) cannot be represented in JSON
+    values = [float(value) if np.isfinite(value) else None for value in values]
+    return ImageStatistics(**dict(zip(ImageStatistics.model_fields, values)))
+
+def get_material_statistics_response(material_id: int, statistics: Tuple[ImageStats, ImageStats]) -> MaterialStatisticsResponse:
+    non_specular, specular = [
+        ImageStatisticsResponse(
+            statistics=get_image_statistics(image_stats.statistics),
+            normalized_statistics=get_image_statistics(image_stats.normalized_statistics)
+        )
+        for image_stats in statistics
+    ]
+    return MaterialStatisticsResponse(material_id=material_id, non_specular=non_specular, specular=specular)
+
+def get_analysed_material_response(material: Material, statistics: Optional[Tuple[ImageStats, ImageStats]]) -> AnalysedMaterialResponse:
+    return AnalysedMaterialResponse(
+        **get_material_response(material).model_dump(),
+        statistics=get_material_statistics_response(material.id, statistics) if statistics is not None else None
+    )
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Optional, List, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+import app.core.config as config
+from app.services.model_registry import model_registry
+
+if TYPE_CHECKING: # torch is imported with the models (see FingerPrintAnalyzer)
+    import torch
+
+logger = logging.getLogger(__name__)
+
+class InferenceBatcher:
+    # dynamic micro-batching of CLIP + MLP inference
+    # requests arriving within max_wait_ms of the first waiting request are stacked into one batch (up to max_batch_size
+    # materials), the models run once for the whole batch and ratings are scattered back to the waiting requests
+    # inference runs on one background thread, which also keeps concurrent analyses from competing for CPU cores
+
+    def __init__(self, max_batch_size: int = 8, max_wait_ms: float = 5.0):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._queue: "queue.Queue[Optional[Tuple[torch.Tensor, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter() # batch size -> number of batches of that size
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+                self._thread.start()
+
+    def shutdown(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None) # requests already in the queue are processed before the thread stops
+            thread.join()
+
+    def submit(self, images: "torch.Tensor") -> Future:
+        # images: preprocessed pair (2 x 3 x 224 x 224) of one material, future resolves to its ratings (16)
+        self.start() # batcher is normally started in app lifespan
+        future = Future()
+        self._queue.put((images, future))
+        return future
+
+    async def infer(self, images: "torch.Tensor") -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(images))
+
+    def get_batch_size_distribution(self) -> dict[int, int]:
+        with self._lock:
+            return dict(self._batch_sizes)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._process(batch)
+
+    def _process(self, batch: List[Tuple["torch.Tensor", Future]]):
+        import torch
+
+        batch = [(images, future) for images, future in batch if future.set_running_or_notify_cancel()] # skips cancelled requests
+        if not batch:
+            return
+        futures = [future for _, future in batch]
+
+        try:
+            analyzer = model_registry.get_analyzer()
+            start = time.perf_counter()
+            ratings = analyzer.get_ratings_batch(torch.cat([images for images, _ in batch]))
+            model_registry.record_inference(time.perf_counter() - start, count=len(futures))
+        except Exception as e: # every waiting request gets the error
+            logger.exception("Batched inference failed")
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self._batch_sizes[len(futures)] += 1
+
+        for future, material_ratings in zip(futures, ratings):
+            future.set_result(material_ratings)
+
+# one batcher per worker process
+inference_batcher = InferenceBatcher(max_batch_size=config.INFERENCE_MAX_BATCH_SIZE, max_wait_ms=config.INFERENCE_MAX_WAIT_MS)
@@ -1,16 +1,85 @@
-from typing import Optional, List
+import asyncio
+import base64
+import json
+import logging
+import os
+from typing import Optional, List, Tuple, Iterator, TYPE_CHECKING
 from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
 
 import app.core.config
-from app.domain.fingerprinting.fingeprint_analyzer import FingerPrintAnalyzer
+from app.db.database_writer import database_writer
+from app.domain.fingerprinting.fingeprint_analyzer import MaterialRatings, ImageStats, normalize_image_statistics, get_image_statistics
 from app.domain.repository.material_repository import MaterialRepository
+from app.domain.repository.material_neighbours_repository import MaterialNeighboursRepository
+from app.domain.repository.material_statistics_repository import MaterialStatisticsRepository
+from app.domain.similarity.similarity_engine import select_top_k
 from app.models.material import Material
 import numpy as np
-from app.domain.similarity.material_similarity import calculate_similarity
 from app.schemas.material import MaterialRequest
 from app.schemas.material_category import MaterialCategory
 from app.schemas.material_characteristics import MaterialCharacteristics
-from app.services.image_service import save_image, process_image_upload
+from app.schemas.name_match import NameMatch
+from app.schemas.similarity_mode import SimilarityMode
+from app.services.image_service import save_image, load_image, ingest_image, IngestedImage, InvalidImageError
+from app.services.analysis_executor import analysis_executor
+from app.services.fingerprint_cache import fingerprint_cache, get_fingerprint_cache_key
+from app.services.inference_batcher import inference_batcher
+from app.services.model_registry import model_registry
+from app.services.neighbour_service import get_similar_materials_from_neighbour_lists, update_neighbour_lists
+
+if TYPE_CHECKING: # torch is imported with the models (see FingerPrintAnalyzer)
+    import torch
+
+logger = logging.getLogger(__name__)
+
+MATERIALS_STREAM_PAGE_SIZE = 1000 # materials read from DB at once when the listing is streamed
+
+class InvalidCursorError(Exception):
+    pass
+
+def encode_cursor(key: Tuple[str, int]) -> str:
+    # opaque cursor of the listing - key (lower name, id) of the last returned material
+    return base64.urlsafe_b64encode(json.dumps(key, ensure_ascii=False).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        name, material_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(name, str) or not isinstance(material_id, int):
+            raise ValueError()
+    except (ValueError, TypeError):
+        raise InvalidCursorError(f"Invalid cursor {cursor}")
+    return name, material_id
+
+def get_material_rows_page(
+        repository: MaterialRepository,
+        name: Optional[str] = None,
+        categories: Optional[List[MaterialCategory]] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        name_match: NameMatch = NameMatch.SUBSTRING
+) -> Tuple[List[tuple], Optional[str]]:
+    # returns rows of the page and cursor of the next page (None on the last page), all materials when limit is None
+    after = decode_cursor(cursor) if cursor is not None else None
+    rows = repository.get_material_rows(name, categories, after=after, limit=limit + 1 if limit is not None else None,
+                                        name_match=name_match)
+
+    if limit is None or len(rows) <= limit: # one more row than the limit tells if there is a next page
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(repository.get_material_row_key(rows[-1]))
+
+def iterate_material_rows(
+        repository: MaterialRepository,
+        name: Optional[str] = None,
+        categories: Optional[List[MaterialCategory]] = None,
+        cursor: Optional[str] = None,
+        name_match: NameMatch = NameMatch.SUBSTRING
+) -> Iterator[tuple]:
+    # invalid cursor is raised here, before a response is streamed
+    after = decode_cursor(cursor) if cursor is not None else None
+    return repository.iterate_material_rows(name, categories, after=after, page_size=MATERIALS_STREAM_PAGE_SIZE,
+                                            name_match=name_match)
 
 def get_material_vector_from_material(material: Material) -> np.array:
     return np.array([
@@ -32,6 +101,27 @@ def get_material_vector_from_material(material: Material) -> np.array:
         material.characteristics_warmth
     ])
 
+def get_ratings_from_material(material: Material) -> np.ndarray:
+    # ratings in the order of the outputs of the fingerprinting model (inverse of the mapping in calculate_material_characteristics_and_process_all)
+    return np.array([
+        material.characteristics_color_vibrancy,
+        material.characteristics_surface_roughness,
+        material.characteristics_pattern_complexity,
+        material.characteristics_striped_pattern,
+        material.characteristics_checkered_pattern,
+        material.characteristics_brightness,
+        material.characteristics_shininess,
+        material.characteristics_sparkle,
+        material.characteristics_hardness,
+        material.characteristics_movement_effect,
+        material.characteristics_scale_of_pattern,
+        material.characteristics_naturalness,
+        material.characteristics_thickness,
+        material.characteristics_multicolored,
+        material.characteristics_value,
+        material.characteristics_warmth
+    ])
+
 def get_material_vector_from_characteristics(material_characteristics: MaterialCharacteristics) -> np.array:
     return np.array([
         material_characteristics.brightness,
@@ -52,51 +142,92 @@ def get_material_vector_from_characteristics(material_characteristics: MaterialC
         material_characteristics.warmth
     ])
 
-def calculate_similarity_for_vector(target_vector: np.array, repository: MaterialRepository):
-    similarities = []
-    for material in repository.get_materials():
-        vector = get_material_vector_from_material(material)
-        similarity = calculate_similarity(target_vector, vector)
-        similarities.append((material, similarity))
+def calculate_similarity_for_vector(
+        target_vector: np.array,
+        repository: MaterialRepository,
+        name: Optional[str] = None,
+        categories: Optional[List[MaterialCategory]] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        min_similarity: Optional[float] = None,
+        mode: SimilarityMode = SimilarityMode.EXACT,
+        name_match: NameMatch = NameMatch.SUBSTRING
+) -> List[Tuple[tuple, float]]:
+    # returns (material row, similarity) pairs, rows as in MaterialRepository.get_material_rows
+    # name and category filters select candidates first, then only the candidates are scored in one batched pass
+    # over the cached characteristics matrix, names are searched in the name index of the repository
+    ids, similarities = repository.get_similarity_engine().score(
+        target_vector,
+        categories=categories,
+        approximate=mode == SimilarityMode.APPROXIMATE,
+        material_ids=repository.search_material_ids(name, name_match) if name else None
+    )
+
+    # only the requested page is selected and loaded from DB
+    positions = select_top_k(similarities, limit, offset, min_similarity)
+    similarity_by_id = dict(zip(ids[positions].tolist(), similarities[positions].tolist()))
 
-    # sort by similarity (descending)
-    similarities.sort(key=lambda x: x[1], reverse=True)
+    rows = repository.get_material_rows_by_ids(list(similarity_by_id))
+    return [(row, similarity_by_id[row[0]]) for row in rows]
 
-    return [material for material, _ in similarities]
+def calculate_similarity_using_id(
+        material_id: int, # in Python int can handle large numbers like Long in Java
+        repository: MaterialRepository,
+        neighbours_repository: Optional[MaterialNeighboursRepository] = None,
+        **kwargs
+) -> Optional[List[Tuple[tuple, float]]]:
+    if neighbours_repository is not None and not kwargs.get("name") and not kwargs.get("categories"):
+        # unfiltered ranking of a stored material is read from its materialized neighbour list, when the page is in it
+        materials = get_similar_materials_from_neighbour_lists(
+            material_id,
+            repository,
+            neighbours_repository,
+            limit=kwargs.get("limit"),
+            offset=kwargs.get("offset", 0),
+            min_similarity=kwargs.get("min_similarity")
+        )
+        if materials is not None:
+            return materials
 
-def calculate_similarity_using_id(material_id: int, repository: MaterialRepository): # in Python int can handle large numbers like Long in Java
     target_material = repository.get_material_by_id(material_id)
     if not target_material:
-        return []
+        return None
 
     target_vector = get_material_vector_from_material(target_material)
-    return calculate_similarity_for_vector(target_vector, repository)
+    return calculate_similarity_for_vector(target_vector, repository, **kwargs)
 
-def calculate_similarity_using_characteristics(characteristics: MaterialCharacteristics, repository: MaterialRepository):
+def calculate_similarity_using_characteristics(characteristics: MaterialCharacteristics, repository: MaterialRepository, **kwargs) -> List[Tuple[tuple, float]]:
     target_vector = get_material_vector_from_characteristics(characteristics)
-    return calculate_similarity_for_vector(target_vector, repository)
-
-def filter_materials(materials: List[Material], name: Optional[str], categories: Optional[List[MaterialCategory]]):
-    if name:
-        materials = [material for material in materials if name.lower() in material.name.lower()]
+    return calculate_similarity_for_vector(target_vector, repository, **kwargs)
 
-    if categories:
-        materials = [material for material in materials if material.category in categories]
-
-    return materials
-
-def calculate_material_characteristics_and_process_all(
+async def calculate_material_characteristics_and_process_all(
         material_data: MaterialRequest,
         specular_image_file: UploadFile,
         non_specular_image_file: UploadFile,
-        repository: MaterialRepository
-) -> (Material, str):
-
-    specular_image = process_image_upload(specular_image_file)
-    non_specular_image = process_image_upload(non_specular_image_file)
+        repository: MaterialRepository,
+        statistics_repository: MaterialStatisticsRepository,
+        neighbours_repository: Optional[MaterialNeighboursRepository] = None
+) -> Tuple[Material, Optional[Tuple[ImageStats, ImageStats]]]:
+    # upload is read asynchronously, decoding and preprocessing run on dedicated analysis executor, inference is batched
+    # with other concurrent analyses and storing (DB commit + JPEG encoding) runs on the default threadpool,
+    # so the event loop is never blocked
+    # returns the material and statistics of its images when they were requested
+    statistics = None
+    async with analysis_executor.admission():
+        specular_data = await specular_image_file.read()
+        non_specular_data = await non_specular_image_file.read()
 
-    analyzer = FingerPrintAnalyzer()
-    ratings = analyzer.get_material_ratings(non_specular_image, specular_image)
+        specular_image, non_specular_image, cache_key, ratings = await analysis_executor.run(ingest_images, specular_data, non_specular_data)
+        if material_data.store_in_db or material_data.include_statistics:
+            # statistics of stored materials are computed right away (and stored), so they are never computed from
+            # the stored JPEGs later, they are computed while the inference runs
+            ratings, statistics = await asyncio.gather(
+                get_ratings(specular_image, non_specular_image, cache_key, ratings),
+                analysis_executor.run(compute_image_statistics, specular_image.array, non_specular_image.array)
+            )
+        else:
+            ratings = await get_ratings(specular_image, non_specular_image, cache_key, ratings)
+        ratings = MaterialRatings(ratings)
 
     material = Material(
         name = material_data.name,
@@ -121,19 +252,132 @@ def calculate_material_characteristics_and_process_all(
     )
 
     if material_data.store_in_db:
-        material = repository.add_material(material)
+        material = await run_in_threadpool(
+            store_material, material, specular_image, non_specular_image, repository,
+            statistics, statistics_repository, neighbours_repository
+        )
+    else:
+        material.id = -1
 
-        specular_filename = app.core.config.get_specular_image_name(material.id)
-        non_specular_filename = app.core.config.get_non_specular_image_name(material.id)
+    if not material_data.include_statistics:
+        return material, None
+    return material, normalize_image_statistics(*statistics)
 
-        save_image(specular_image, specular_filename)
-        save_image(non_specular_image, non_specular_filename)
+async def get_ratings(specular_image: IngestedImage, non_specular_image: IngestedImage, cache_key: str, cached_ratings: Optional[np.ndarray]) -> np.ndarray:
+    if cached_ratings is not None:
+        return cached_ratings
 
-    else:
-        material.id = -1
+    # images that were not analysed before
+    images = await analysis_executor.run(preprocess_images, specular_image, non_specular_image)
+    ratings = await inference_batcher.infer(images)
+    await analysis_executor.run(fingerprint_cache.put, cache_key, ratings)
+    return ratings
+
+def compute_image_statistics(specular_image: np.ndarray, non_specular_image: np.ndarray) -> np.ndarray:
+    # not normalized statistics of both images (2 x 14, non specular first) - the form in which they are stored
+    statistical_features = model_registry.get_statistical_features()
+    non_specular_stats, specular_stats = get_image_statistics(statistical_features, non_specular_image, specular_image)
+    return np.stack((non_specular_stats.statistics, specular_stats.statistics))
+
+async def get_material_statistics(
+        material_id: int,
+        repository: MaterialRepository,
+        statistics_repository: MaterialStatisticsRepository
+) -> Optional[Tuple[ImageStats, ImageStats]]:
+    # statistics of a stored material, materials stored before statistics were stored at ingest get them computed from
+    # their stored images on the first request, returns None when the material or its images do not exist
+    material = await run_in_threadpool(repository.get_material_by_id, material_id)
+    if material is None:
+        return None
+
+    statistics = await run_in_threadpool(statistics_repository.get_statistics, material_id)
+    if statistics is None:
+        async with analysis_executor.admission():
+            statistics = await analysis_executor.run(compute_stored_image_statistics, material_id)
+        if statistics is None:
+            return None
+        await run_in_threadpool(statistics_repository.add_statistics, material_id, statistics)
+
+    return normalize_image_statistics(*statistics)
+
+def compute_stored_image_statistics(material_id: int) -> Optional[np.ndarray]:
+    images = []
+    for filename in (app.core.config.get_specular_image_name(material_id), app.core.config.get_non_specular_image_name(material_id)):
+        path = load_image(filename)
+        if path is None:
+            return None
+        with open(path, "rb") as file:
+            image = ingest_image(file.read())
+        if image is None:
+            return None
+        images.append(image.array)
+
+    return compute_image_statistics(*images)
+
+def ingest_images(specular_data: bytes, non_specular_data: bytes) -> Tuple[IngestedImage, IngestedImage, str, Optional[np.ndarray]]:
+    # each image is decoded only once, returns both decoded images, their cache key and cached ratings (None when not cached)
+    specular_image = ingest_image(specular_data)
+    if specular_image is None:
+        raise InvalidImageError("Specular image is not a valid image.")
+
+    non_specular_image = ingest_image(non_specular_data)
+    if non_specular_image is None:
+        raise InvalidImageError("Non specular image is not a valid image.")
+
+    cache_key = get_fingerprint_cache_key(non_specular_image.array, specular_image.array, model_registry.get_model_version())
+    return specular_image, non_specular_image, cache_key, fingerprint_cache.get(cache_key)
+
+def preprocess_images(specular_image: IngestedImage, non_specular_image: IngestedImage) -> "torch.Tensor":
+    # pair of images preprocessed for inference
+    analyzer = model_registry.get_analyzer() # models are loaded once at startup, not per request
+    return analyzer.preprocess_images(non_specular_image.array, specular_image.array)
+
+def store_material(
+        material: Material,
+        specular_image: IngestedImage,
+        non_specular_image: IngestedImage,
+        repository: MaterialRepository,
+        statistics: Optional[np.ndarray] = None,
+        statistics_repository: Optional[MaterialStatisticsRepository] = None,
+        neighbours_repository: Optional[MaterialNeighboursRepository] = None
+) -> Material:
+    # material, its statistics and the neighbour lists are written in one unit of the database writer (no other write
+    # runs between them, one wait in its queue), each in its own transaction - statistics and lists are derived from the
+    # material, when writing them fails the material stays stored: its statistics are computed from its stored images
+    # by the first request for them and the next update of the lists (or the startup) adds it to the lists
+    def write() -> Material:
+        stored_material = repository.add_material(material)
+        if statistics is not None and statistics_repository is not None:
+            try:
+                statistics_repository.add_statistics(stored_material.id, statistics)
+            except Exception:
+                logger.exception(f"Statistics of material {stored_material.id} were not stored")
+        if neighbours_repository is not None:
+            try:
+                update_neighbour_lists(repository, neighbours_repository)
+            except Exception:
+                logger.exception(f"Material {stored_material.id} was not added to neighbour lists")
+        return stored_material
+
+    material = database_writer.run(write)
+
+    specular_filename = app.core.config.get_specular_image_name(material.id)
+    non_specular_filename = app.core.config.get_non_specular_image_name(material.id)
+
+    save_image(specular_image.image, specular_filename)
+    save_image(non_specular_image.image, non_specular_filename)
 
     return material
 
+def load_similarity_index(repository: MaterialRepository, path: str):
+    engine = repository.get_similarity_engine()
+    if os.path.exists(path) and engine.load_index(path):
+        return
+    engine.get_index() # saved index is missing or outdated, new one is built in the background (if the catalogue is large enough)
+
+def save_similarity_index(repository: MaterialRepository, path: str):
+    repository.get_similarity_engine().save_index(path)
+
 def material_name_validation(name: str) -> tuple[bool, str]:
     if not name:
         return False, "Name cannot be empty"
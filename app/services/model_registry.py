@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+from typing import Optional, TYPE_CHECKING
+
+from app.domain.fingerprinting.fingeprint_analyzer import FingerPrintAnalyzer
+from app.domain.fingerprinting.settings import fingerprinting_settings
+
+if TYPE_CHECKING:
+    from app.domain.fingerprinting.veronika_features import StatisticalFeatures
+
+logger = logging.getLogger(__name__)
+
+class ModelRegistry:
+    # holds the fingerprinting models (CLIP encoder + MLP) so they are loaded only once per worker process
+    # the loaded analyzer is shared read-only by all requests (models are in eval mode and inference runs under no_grad)
+
+    def __init__(self):
+        self._analyzer: Optional[FingerPrintAnalyzer] = None
+        self._statistical_features: Optional["StatisticalFeatures"] = None # used until the analyzer is loaded
+        self._lock = threading.Lock()
+
+        self.loaded_at: Optional[float] = None # unix timestamp
+        self.load_time_seconds: Optional[float] = None
+        self.inference_count = 0
+        self.inference_time_seconds = 0.0
+
+    def load(self) -> FingerPrintAnalyzer:
+        # lock prevents loading the models twice when first request arrives while startup is still loading them
+        with self._lock:
+            if self._analyzer is None:
+                logger.info("Loading fingerprinting models")
+                start = time.perf_counter()
+                self._analyzer = FingerPrintAnalyzer()
+                self.load_time_seconds = time.perf_counter() - start
+                self.loaded_at = time.time()
+                logger.info(f"Fingerprinting models loaded in {self.load_time_seconds:.2f} s")
+
+            return self._analyzer
+
+    def unload(self):
+        with self._lock:
+            self._analyzer = None
+            self._statistical_features = None
+            self.loaded_at = None
+            self.load_time_seconds = None
+
+    def is_ready(self) -> bool:
+        return self._analyzer is not None
+
+    def get_analyzer(self) -> FingerPrintAnalyzer:
+        analyzer = self._analyzer
+        if analyzer is None: # models are normally loaded in app lifespan, this is only a fallback (e.g. when app is used without lifespan)
+            analyzer = self.load()
+        return analyzer
+
+    def get_statistical_features(self) -> "StatisticalFeatures":
+        # statistics of images do not need CLIP and the MLP, so they do not load them
+        analyzer = self._analyzer
+        if analyzer is not None:
+            return analyzer.sf
+
+        with self._lock:
+            if self._statistical_features is None:
+                from app.domain.fingerprinting.veronika_features import StatisticalFeatures
+                self._statistical_features = StatisticalFeatures()
+            return self._statistical_features
+
+    def record_inference(self, duration_seconds: float, count: int = 1): # count - number of materials in the batch
+        with self._lock:
+            self.inference_count += count
+            self.inference_time_seconds += duration_seconds
+
+    def get_component_load_times(self) -> dict[str, float]:
+        analyzer = self._analyzer
+        if analyzer is None:
+            return {}
+        return dict(analyzer.load_times)
+
+    def get_model_version(self) -> str:
+        analyzer = self._analyzer
+        if analyzer is None: # version is known from the settings, models are not loaded just for it
+            return fingerprinting_settings.model_version
+        return analyzer.model_version
+
+    def get_device(self) -> Optional[str]:
+        analyzer = self._analyzer
+        if analyzer is None:
+            return None
+        return str(analyzer.device)
+
+# one registry per worker process
+model_registry = ModelRegistry()
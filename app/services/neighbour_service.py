@@ -0,0 +1,80 @@
+import logging
+from typing import Optional, List, Tuple
+
+import numpy as np
+
+import app.core.config as config
+from app.db.database import SessionLocal
+from app.db.repository.sqlite_material_neighbours_repository import SQLiteMaterialNeighboursRepository
+from app.db.repository.sqlite_material_repository import SQLiteMaterialRepository
+from app.domain.repository.material_neighbours_repository import MaterialNeighboursRepository
+from app.domain.repository.material_repository import MaterialRepository
+from app.domain.similarity.neighbour_lists import compute_neighbour_lists
+
+logger = logging.getLogger(__name__)
+
+def build_neighbour_lists(repository: MaterialRepository, neighbours_repository: MaterialNeighboursRepository, size: Optional[int] = None):
+    # bulk build - lists of all materials computed from the characteristics matrix of the similarity engine block by block
+    size = size or config.NEIGHBOUR_LIST_SIZE
+    ids, vectors = repository.get_similarity_engine().get_snapshot()
+    positions, similarities = compute_neighbour_lists(vectors, size)
+    neighbours_repository.replace_neighbours(ids, vectors, positions, similarities, size)
+
+def update_neighbour_lists(repository: MaterialRepository, neighbours_repository: MaterialNeighboursRepository) -> int:
+    # newly stored materials are added to the lists (nothing is done when the lists were not built)
+    if config.NEIGHBOUR_LIST_SIZE <= 0:
+        return 0
+    ids, vectors = repository.get_similarity_engine().get_snapshot()
+    return neighbours_repository.update_neighbours(ids, vectors, config.NEIGHBOUR_LIST_SIZE)
+
+def prepare_neighbour_lists(repository: MaterialRepository, neighbours_repository: MaterialNeighboursRepository):
+    # lists are updated, or built again when they cannot be (not built yet, other size, too many new materials)
+    update_neighbour_lists(repository, neighbours_repository)
+    if not neighbours_repository.is_up_to_date(config.NEIGHBOUR_LIST_SIZE):
+        build_neighbour_lists(repository, neighbours_repository)
+
+def prepare_stored_neighbour_lists():
+    # lists of the app DB, at startup (in background) or on a schedule
+    try:
+        with SessionLocal() as db:
+            prepare_neighbour_lists(SQLiteMaterialRepository(db), SQLiteMaterialNeighboursRepository(db))
+    except Exception:
+        logger.exception("Neighbour lists were not prepared")
+
+def get_similar_materials_from_neighbour_lists(
+        material_id: int,
+        repository: MaterialRepository,
+        neighbours_repository: MaterialNeighboursRepository,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        min_similarity: Optional[float] = None
+) -> Optional[List[Tuple[tuple, float]]]:
+    # (material row, similarity) pairs of the requested page of the similarity ranking of a stored material, None when
+    # the material has no valid list or the page does not fit in it
+    if config.NEIGHBOUR_LIST_SIZE <= 0:
+        return None
+    neighbours = neighbours_repository.get_neighbours(material_id, config.NEIGHBOUR_LIST_SIZE)
+    if neighbours is None:
+        return None
+
+    neighbour_ids, similarities = neighbours
+    complete = len(neighbour_ids) < config.NEIGHBOUR_LIST_SIZE # list of a smaller catalogue has all the materials
+    if min_similarity is not None:
+        count = int(np.count_nonzero(similarities >= min_similarity)) # the list is ordered, so they are the first ones
+        complete = complete or count < len(neighbour_ids) # the rest of the ranking is below min_similarity as well
+        neighbour_ids, similarities = neighbour_ids[:count], similarities[:count]
+
+    end = len(neighbour_ids) if limit is None else offset + limit
+    if not complete and (limit is None or end > len(neighbour_ids)):
+        return None # page continues after the list
+
+    similarity_by_id = dict(zip(neighbour_ids[offset:end].tolist(), similarities[offset:end].tolist()))
+    rows = repository.get_material_rows_by_ids(list(similarity_by_id))
+    return [(row, similarity_by_id[row[0]]) for row in rows]
+
+if __name__ == "__main__":
+    if config.NEIGHBOUR_LIST_SIZE <= 0:
+        print("Neighbour lists are disabled, set NEIGHBOUR_LIST_SIZE.")
+    else:
+        prepare_stored_neighbour_lists()
+        print("Neighbour lists prepared.")
@@ -0,0 +1,61 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+from PIL import ImageColor
+
+import app.core.config
+from app.domain.fingerprinting.vector_charts import get_chart_geometry, render_svg
+from app.models.material import Material
+from app.schemas.plot_format import PlotFormat
+from app.schemas.plot_kind import PlotKind
+from app.services.material_service import get_ratings_from_material
+
+PLOT_VERSION = 1 # increase when the plots change, cached plots of the previous version are then not used
+
+class InvalidPlotStyleError(Exception):
+    pass
+
+def get_plot_color(color: str) -> str:
+    # color name (CSS) or hex code as #rrggbb
+    try:
+        return "#{:02x}{:02x}{:02x}".format(*ImageColor.getrgb(color)[:3])
+    except ValueError:
+        raise InvalidPlotStyleError(f"Invalid color {color}")
+
+def get_plot_key(material: Material, kind: PlotKind, color: str, plot_format: PlotFormat = PlotFormat.PNG) -> str:
+    # identifies the plot - ratings of stored materials never change, so the key (and the cached file) is valid
+    # as long as the plots do not change, it is also used as ETag of the plot
+    key = hashlib.blake2b(digest_size=16)
+    key.update(f"{PLOT_VERSION}:{kind.value}:{get_plot_color(color)}:{plot_format.value}:".encode())
+    key.update(get_ratings_from_material(material).astype(np.float64).tobytes())
+    return key.hexdigest()
+
+def get_plot_path(material: Material, kind: PlotKind, color: str, key: str) -> str:
+    # path of the PNG of the plot, the plot is rendered only when it is not cached yet
+    path = app.core.config.get_image_path(app.core.config.get_plot_image_name(material.id, kind.value, key))
+    if os.path.exists(path):
+        return path
+
+    # matplotlib is imported only when the first PNG is rendered
+    from app.domain.fingerprinting.fingerprint_plots import plot_renderer
+    png = plot_renderer.render_png(kind.value, get_ratings_from_material(material), get_plot_color(color))
+
+    # written under a temporary name, so a concurrent request never serves a partially written file
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(png)
+    os.replace(temporary_path, path)
+    return path
+
+def get_plot_svg(material: Material, kind: PlotKind, color: str) -> str:
+    return render_svg(kind.value, get_ratings_from_material(material), get_plot_color(color))
+
+def get_plot_geometry(material: Material, kind: PlotKind) -> dict:
+    return get_chart_geometry(kind.value, get_ratings_from_material(material))
+
+def etag_matches(if_none_match: str, key: str) -> bool:
+    # If-None-Match header is a list of (possibly weak) ETags or *
+    tags = [tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")]
+    return "*" in tags or key in tags
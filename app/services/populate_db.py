@@ -3,8 +3,8 @@ from sqlalchemy.orm import Session
 from app.db.database import engine
 from app.models.material import Material, MaterialCategory
 
-def populate_data(material_count = 1):
-    session = Session(bind=engine)
+def populate_data(material_count = 1, bind = None, chunk_size = 10000): # bind - engine of other DB than the app one (e.g. for benchmarks)
+    session = Session(bind=bind if bind is not None else engine)
 
     # some random words for random names generator
     adjectives = ["Bright", "Dull", "Smooth", "Rough", "Shiny", "Matte", "Light", "Heavy"]
@@ -34,18 +34,22 @@ def populate_data(material_count = 1):
             "characteristics_warmth": uniform(-2.75, 2.75),
         }
 
-    default_materials = [
-        Material(
-            name = random_name(),
-            category = choice(list(MaterialCategory)),
-            is_original = False,
-            **random_characteristics() # operator "**" unpacks the dictionary returned by random_characteristics() function so key-value pairs are passed as named arguments
-        )
-        for _ in range(material_count)
-    ]
-
-    session.add_all(default_materials)
-    session.commit()
+    # large counts are committed in chunks so all the materials do not have to be in memory at once
+    for start in range(0, material_count, chunk_size):
+        default_materials = [
+            Material(
+                name = random_name(),
+                category = choice(list(MaterialCategory)),
+                is_original = False,
+                **random_characteristics() # operator "**" unpacks the dictionary returned by random_characteristics() function so key-value pairs are passed as named arguments
+            )
+            for _ in range(min(chunk_size, material_count - start))
+        ]
+
+        session.add_all(default_materials)
+        session.commit()
+        session.expunge_all()
+
     session.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,55 @@
+import json
+import subprocess
+import sys
+
+import torch
+
+from benchmarks.common import measure, summarize, load_image_pairs
+
+# cold start runs in a fresh interpreter, so imports of torch, clip etc. are measured too
+COLD_START_SCRIPT = """
+import json, time
+start = time.perf_counter()
+from app.domain.fingerprinting.fingeprint_analyzer import FingerPrintAnalyzer
+imported = time.perf_counter()
+analyzer = FingerPrintAnalyzer()
+end = time.perf_counter()
+print(json.dumps({"import": imported - start, "init": end - imported, "total": end - start, "components": analyzer.load_times}))
+"""
+
+BATCH_SIZES = (1, 2, 4, 8, 16)
+
+def measure_cold_start(repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT], capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    result = {stage: summarize([run[stage] for run in runs]) for stage in ("import", "init", "total")}
+    result["components"] = {component: summarize([run["components"][component] for run in runs]) for component in runs[0]["components"]}
+    return result
+
+def run(quick: bool = False) -> dict:
+    from app.domain.fingerprinting.fingeprint_analyzer import FingerPrintAnalyzer
+
+    repeat = 3 if quick else 10
+    results = {"cold_start": measure_cold_start(1 if quick else 3)}
+
+    analyzer = FingerPrintAnalyzer()
+    pairs = load_image_pairs(max(BATCH_SIZES))
+    non_specular, specular = pairs[0]
+
+    # one material end to end (preprocessing + CLIP + MLP), as the analysis endpoint used to run it
+    results["material_ratings"] = measure(lambda: analyzer.get_material_ratings(non_specular, specular), repeat=repeat)
+    results["preprocess_pair"] = measure(lambda: analyzer.preprocess_images(non_specular, specular), repeat=repeat)
+
+    # inference only, preprocessed pairs of batch_size materials stacked to one batch
+    preprocessed = [analyzer.preprocess_images(*pair) for pair in pairs]
+    results["ratings_batch"] = {}
+    for batch_size in BATCH_SIZES:
+        batch = torch.cat(preprocessed[:batch_size])
+        stats = measure(lambda: analyzer.get_ratings_batch(batch), repeat=repeat)
+        stats["per_material_median"] = stats["median"] / batch_size
+        results["ratings_batch"][str(batch_size)] = stats
+
+    return results
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import app.core.config as config
+from app.models.material import Base
+from app.services.populate_db import populate_data
+from benchmarks.common import summarize, read_image_pair
+
+CATALOGUE_SIZE = 10_000
+CONCURRENCY = 8
+
+def measure_throughput(send: Callable, requests: int, concurrency: int = 1) -> dict:
+    # send() performs one request and returns the response
+    def timed_send(_):
+        start = time.perf_counter()
+        response = send()
+        assert response.status_code < 300, response.text
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        latencies = list(executor.map(timed_send, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    result = summarize(latencies)
+    result["concurrency"] = concurrency
+    result["requests_per_second"] = requests / elapsed
+    return result
+
+def run(quick: bool = False) -> dict:
+    from app.db.database import get_db
+    from app.main import app
+    from app.services.fingerprint_cache import fingerprint_cache
+
+    requests = 10 if quick else 50
+    analysis_requests = 4 if quick else 16
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'materials.db')}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        populate_data(CATALOGUE_SIZE, bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        def override_get_db():
+            db = session_factory()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        images_dir, config.IMAGES_DIR = config.IMAGES_DIR, directory
+        cache_size, fingerprint_cache.max_entries = fingerprint_cache.max_entries, 0 # the same images are uploaded repeatedly, inference is measured
+        app.dependency_overrides[get_db] = override_get_db
+        try:
+            with TestClient(app) as client:
+                non_specular, specular = read_image_pair()
+
+                def analyse():
+                    return client.post(
+                        "/materials",
+                        files={
+                            "specular_image": ("specular.jpg", specular, "image/jpeg"),
+                            "non_specular_image": ("non_specular.jpg", non_specular, "image/jpeg"),
+                        },
+                        data={"name": "Benchmark", "category": "METAL", "store_in_db": "false"},
+                    )
+
+                characteristics = {name: 0.5 for name in client.get("/materials/1/similar", params={"limit": 1}).json()[0]["characteristics"]}
+
+                results = {
+                    "catalogue_size": CATALOGUE_SIZE,
+                    "list_materials_name_filter": measure_throughput(lambda: client.get("/materials", params={"name": "gem"}), requests),
+                    "similar_by_id_top20": measure_throughput(lambda: client.get("/materials/1/similar", params={"limit": 20}), requests),
+                    "similar_by_characteristics_top20": measure_throughput(lambda: client.post("/materials/similar", json={"characteristics": characteristics, "limit": 20}), requests),
+                    "analyse": measure_throughput(analyse, analysis_requests),
+                    "analyse_concurrent": measure_throughput(analyse, analysis_requests, concurrency=CONCURRENCY),
+                }
+        finally:
+            app.dependency_overrides.pop(get_db, None)
+            config.IMAGES_DIR = images_dir
+            fingerprint_cache.max_entries = cache_size
+            fingerprint_cache.clear()
+            engine.dispose()
+
+    return results
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.db.repository.sqlite_material_repository import SQLiteMaterialRepository
+from app.domain.similarity.ann_index import recall_at_k
+from app.models.material import Base
+from app.schemas.material_category import MaterialCategory
+from app.schemas.name_match import NameMatch
+from app.schemas.similarity_mode import SimilarityMode
+from app.services.material_service import calculate_similarity_for_vector
+from app.services.populate_db import populate_data
+from benchmarks.common import measure
+
+RECALL_K = 20
+RECALL_QUERIES = 100 # stored materials used as queries for recall of the approximate index
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+QUICK_RECALL_K = 20
+RECALL_QUERIES = 100 # stored materials used as queries for recall of the approximate index
+
+SIZES = (1_000, 10_000)
+
+def run_size(material_count: int, repeat: int) -> dict:
+    result = {}
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'materials.db')}")
+        Base.metadata.create_all(bind=engine)
+
+        start = time.perf_counter()
+        populate_data(material_count, bind=engine)
+        result["populate_seconds"] = time.perf_counter() - start
+
+        rng = np.random.default_rng(0)
+        targets = rng.uniform(-2.75, 2.75, size=(repeat + 1, 16))
+        queries = iter(np.tile(targets, (10, 1))) # every call gets a different target, the same targets for every size
+
+        with Session(bind=engine) as db:
+            repository = SQLiteMaterialRepository(db)
+
+            # first query loads characteristics of all the materials from the DB
+            start = time.perf_counter()
+            calculate_similarity_for_vector(next(queries), repository, limit=20)
+            result["first_query_seconds"] = time.perf_counter() - start
+
+            def query(**kwargs):
+                return lambda: calculate_similarity_for_vector(next(queries), repository, **kwargs)
+
+            if material_count <= 100_000: # whole catalogue as response, too slow to repeat for larger catalogues
+                result["exact_all"] = measure(query(), repeat=repeat)
+            result["exact_top20"] = measure(query(limit=20), repeat=repeat)
+            result["exact_top20_name_filter"] = measure(query(limit=20, name="gem"), repeat=repeat)
+            result["exact_top20_fuzzy_name_filter"] = measure(query(limit=20, name="shinny", name_match=NameMatch.FUZZY), repeat=repeat)
+            result["exact_top20_category_filter"] = measure(query(limit=20, categories=[MaterialCategory.METAL]), repeat=repeat)
+
+            similarity_engine = repository.get_similarity_engine()
+            start = time.perf_counter()
+            index = similarity_engine.build_index() # queries do not wait for the build, it runs in the background
+            result["index_build_seconds"] = time.perf_counter() - start
+            if index is not None:
+                _, vectors = similarity_engine.get_snapshot()
+                query_vectors = vectors[rng.choice(len(vectors), min(RECALL_QUERIES, len(vectors)), replace=False)]
+                result[f"recall_at_{RECALL_K}"] = recall_at_k(index, vectors, query_vectors, RECALL_K)
+            result["approximate_top20"] = measure(query(limit=20, mode=SimilarityMode.APPROXIMATE), repeat=repeat)
+
+        engine.dispose()
+    return result
+
+def run(quick: bool = False) -> dict:
+    repeat = 3 if quick else 10
+    return {str(size): run_size(size, repeat) for size in (QUICK_SIZES if quick else SIZES)}
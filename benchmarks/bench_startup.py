@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+
+from benchmarks.common import summarize
+
+# cold start of a worker - import of the app and its startup (lifespan), each run in a fresh interpreter started outside
+# of the repository, with and without loading the models at startup (PRELOAD_MODELS)
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client: # runs the lifespan
+    started = time.perf_counter()
+    client.get("/materials")
+    first_request = time.perf_counter()
+heavy = [module for module in ("torch", "clip", "matplotlib", "cv2", "scipy", "skimage") if module in sys.modules]
+print(json.dumps({"import": imported - start, "startup": started - imported, "first_request": first_request - started,
+    "total": first_request - start, "heavy_modules": heavy}))
+"""
+
+TOP_PACKAGES = 15
+
+def run_python(args: list, directory: str, preload: bool) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=os.getcwd(), IMAGES_DIR=os.path.join(directory, "images"), PRELOAD_MODELS="1" if preload else "0")
+    return subprocess.run([sys.executable, *args], cwd=directory, env=env, capture_output=True, text=True, check=True)
+
+def measure_startup(directory: str, preload: bool, repeat: int) -> dict:
+    runs = [json.loads(run_python(["-c", STARTUP_SCRIPT], directory, preload).stdout.strip().splitlines()[-1]) for _ in range(repeat)]
+    result = {stage: summarize([run[stage] for run in runs]) for stage in ("import", "startup", "first_request", "total")}
+    result["heavy_modules"] = runs[-1]["heavy_modules"] # imported by the time the worker served its first request
+    return result
+
+def profile_imports(directory: str) -> dict:
+    # python -X importtime, self time of the modules summed per top level package (seconds), the slowest packages first
+    stderr = run_python(["-X", "importtime", "-c", "import app.main"], directory, preload=False).stderr
+    times = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, _, name = line[len("import time:"):].split("|")
+        times[name.strip().split(".")[0]] += int(self_time) / 1e6
+    return dict(times.most_common(TOP_PACKAGES))
+
+def run(quick: bool = False) -> dict:
+    repeat = 1 if quick else 3
+    with tempfile.TemporaryDirectory() as directory: # empty DB and images of the started workers
+        return {
+            "preload": measure_startup(directory, preload=True, repeat=repeat),
+            "lazy": measure_startup(directory, preload=False, repeat=repeat),
+            "import_time_by_package": profile_imports(directory),
+        }
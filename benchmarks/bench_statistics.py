@@ -0,0 +1,38 @@
+import numpy as np
+
+from benchmarks.common import measure, load_image_pairs
+
+CROP_SIZE = 256
+
+def power_spectrum(sf, img_lch: np.ndarray) -> np.ndarray:
+    # same steps as in StatisticalFeatures.compute
+    img_crop = img_lch[..., 0]
+    if img_crop.shape != (CROP_SIZE, CROP_SIZE):
+        img_crop = sf.center_crop(img_crop, CROP_SIZE)
+    return sf.power_spectrum(img_crop, reuse_buffers=True)
+
+def run(quick: bool = False) -> dict:
+    from app.domain.fingerprinting.veronika_features import StatisticalFeatures
+
+    # whole feature extraction takes hundreds of ms per image, so repeats are kept low
+    repeat = 1 if quick else 5
+    sf = StatisticalFeatures()
+    img = load_image_pairs(1)[0][0] # non specular image as stored by the server (500 x 500)
+
+    img_lab, img_lch = sf.rgb2other(img)
+    ft_ps = power_spectrum(sf, img_lch)
+
+    # each stage on the same intermediate results compute() uses
+    return {
+        "init": measure(StatisticalFeatures, repeat=1 if quick else 3, warmup=0),
+        "compute": measure(lambda: sf.compute(img), repeat=repeat, warmup=0),
+        "stages": {
+            "rgb2other": measure(lambda: sf.rgb2other(img), repeat=repeat),
+            "power_spectrum": measure(lambda: power_spectrum(sf, img_lch), repeat=repeat),
+            "simple_features": measure(lambda: sf.simple_features(img_lch[..., 0]), repeat=repeat),
+            "count_freq": measure(lambda: sf.count_freq(ft_ps), repeat=repeat),
+            "mean_circular_sectors_cut": measure(lambda: sf.mean_circular_sectors_cut(ft_ps), repeat=repeat),
+            "count_pattern": measure(lambda: sf.count_pattern(ft_ps), repeat=repeat),
+            "color_features": measure(lambda: sf.color_features(img_lab, img_lch), repeat=repeat, warmup=0),
+        }
+    }
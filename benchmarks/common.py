@@ -0,0 +1,79 @@
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from app.services.image_service import ingest_image
+
+ORIGINAL_IMAGES_DIR = "original_images"
+
+def measure(fn: Callable, repeat: int = 10, warmup: int = 1) -> dict:
+    # wall time of fn in seconds, warmup calls are not measured
+    for _ in range(warmup):
+        fn()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return summarize(times)
+
+def summarize(times: List[float]) -> dict:
+    times = sorted(times)
+    return {
+        "repeat": len(times),
+        "min": times[0],
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "p95": times[min(len(times) - 1, int(round(0.95 * (len(times) - 1))))],
+        "max": times[-1],
+    }
+
+def get_metadata() -> dict:
+    # results of different commits or machines are only comparable with this information
+    import torch
+
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+    }
+
+def load_image_pairs(count: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    # (non specular, specular) pairs of the original materials, decoded the same way as uploaded images
+    names = sorted(os.listdir(os.path.join(ORIGINAL_IMAGES_DIR, "specular")))[:count]
+    pairs = []
+    for name in names:
+        images = []
+        for folder in ("non-specular", "specular"):
+            with open(os.path.join(ORIGINAL_IMAGES_DIR, folder, name), "rb") as file:
+                images.append(ingest_image(file.read()).array)
+        pairs.append(tuple(images))
+    return pairs
+
+def read_image_pair(index: int = 0) -> Tuple[bytes, bytes]:
+    # encoded (non specular, specular) files as they would be uploaded
+    name = sorted(os.listdir(os.path.join(ORIGINAL_IMAGES_DIR, "specular")))[index]
+    result = []
+    for folder in ("non-specular", "specular"):
+        with open(os.path.join(ORIGINAL_IMAGES_DIR, folder, name), "rb") as file:
+            result.append(file.read())
+    return result[0], result[1]
@@ -0,0 +1,45 @@
+import argparse
+import json
+import sys
+
+# compares median times of two result files: python -m benchmarks.compare baseline.json results.json
+# exits with 1 when some measurement is slower than the baseline by more than the threshold
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    # path of measurement -> median seconds
+    medians = {}
+    for key, value in results.items():
+        if not isinstance(value, dict):
+            continue
+        path = f"{prefix}/{key}" if prefix else key
+        if "median" in value:
+            medians[path] = value["median"]
+        else:
+            medians.update(flatten(value, path))
+    return medians
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark results")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown (0.2 = 20 %%)")
+    args = parser.parse_args()
+
+    with open(args.baseline) as file:
+        baseline = flatten(json.load(file)["suites"])
+    with open(args.current) as file:
+        current = flatten(json.load(file)["suites"])
+
+    regressions = []
+    for path in sorted(baseline.keys() & current.keys()):
+        change = current[path] / baseline[path] - 1 if baseline[path] > 0 else 0.0
+        regressed = change > args.threshold
+        if regressed:
+            regressions.append(path)
+        print(f"{'REGRESSION' if regressed else '':<10} {path:<70} {baseline[path]:>12.6f} {current[path]:>12.6f} {change:>+8.1%}")
+
+    print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import importlib
+import json
+import logging
+import traceback
+
+from benchmarks.common import get_metadata
+
+# run from the repository root: python -m benchmarks.run --output results.json
+SUITES = {
+    "analyzer": "benchmarks.bench_analyzer",
+    "statistics": "benchmarks.bench_statistics",
+    "similarity": "benchmarks.bench_similarity",
+    "endpoints": "benchmarks.bench_endpoints",
+    "startup": "benchmarks.bench_startup",
+}
+
+logger = logging.getLogger("benchmarks")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of analysis and similarity hot paths")
+    parser.add_argument("--suite", action="append", choices=list(SUITES), help="suite to run (can be repeated), all suites when not set")
+    parser.add_argument("--quick", action="store_true", help="fewer repeats and smaller catalogues, for a quick check")
+    parser.add_argument("--output", help="path of the JSON results, printed when not set")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING) # every TestClient request is logged otherwise
+
+    results = {"metadata": get_metadata(), "quick": args.quick, "suites": {}}
+    for suite in args.suite or list(SUITES):
+        logger.info(f"Running {suite} benchmarks")
+        try:
+            results["suites"][suite] = importlib.import_module(SUITES[suite]).run(quick=args.quick)
+        except Exception as e: # e.g. models are not available, other suites still run
+            logger.error(f"Benchmark suite {suite} failed: {e}")
+            results["suites"][suite] = {"error": traceback.format_exc()}
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
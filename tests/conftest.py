@@ -0,0 +1,14 @@
+import os
+import shutil
+import tempfile
+
+# the app DB of the tests is a temporary copy of materials.db, the app startup (tables, indexes, WAL journal) and tests
+# storing materials then do not change the real DB - set before app.core.config is imported by test modules
+_database_dir = tempfile.TemporaryDirectory()
+_database_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "materials.db")
+os.environ["DATABASE_PATH"] = os.path.join(_database_dir.name, "materials.db")
+if os.path.exists(_database_path):
+    shutil.copyfile(_database_path, os.environ["DATABASE_PATH"])
+
+def pytest_unconfigure(config):
+    _database_dir.cleanup()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.db.database import create_sqlite_engine
+from app.db.database_writer import database_writer
+from app.db.repository.sqlite_material_repository import SQLiteMaterialRepository
+from app.models.material import Base, Material, CHARACTERISTICS_COLUMNS
+from app.schemas.material_category import MaterialCategory
+
+
+@pytest.fixture
+def database_path():
+    with tempfile.TemporaryDirectory() as directory:
+        yield os.path.join(directory, "materials.db")
+
+def create_material(name: str) -> Material:
+    return Material(name=name, category=MaterialCategory.WOOD, is_original=False, **{column.key: 0.5 for column in CHARACTERISTICS_COLUMNS})
+
+def test_engines_set_pragmas(database_path):
+    engine = create_sqlite_engine(database_path)
+    read_engine = create_sqlite_engine(database_path, read_only=True, pool_size=2)
+    Base.metadata.create_all(bind=engine)
+
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1 # NORMAL
+        assert connection.execute(text("PRAGMA cache_size")).scalar() < 0
+
+    with read_engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM materials")).scalar() == 0
+        with pytest.raises(OperationalError): # read connections are query only
+            connection.execute(text("DELETE FROM materials"))
+
+    engine.dispose()
+    read_engine.dispose()
+
+def test_concurrent_materials_are_written_by_one_writer(database_path):
+    engine = create_sqlite_engine(database_path, pool_size=4)
+    Base.metadata.create_all(bind=engine)
+    writes = database_writer.get_status()["writes"]
+
+    def add_material(i):
+        with Session(bind=engine) as db:
+            return SQLiteMaterialRepository(db).add_material(create_material(f"Material_{i}")).id
+
+    with ThreadPoolExecutor(8) as executor:
+        ids = list(executor.map(add_material, range(40)))
+
+    assert len(set(ids)) == 40
+    assert database_writer.get_status()["writes"] == writes + 40
+    with Session(bind=engine) as db:
+        assert len(SQLiteMaterialRepository(db).get_materials()) == 40
+    engine.dispose()
+
+def test_app_engines_share_similarity_engine():
+    from app.db.database import SessionLocal, ReadSessionLocal
+
+    with SessionLocal() as db, ReadSessionLocal() as read_db:
+        assert SQLiteMaterialRepository(db).get_similarity_engine() is SQLiteMaterialRepository(read_db).get_similarity_engine()
+
+def test_similarity_index_loaded_at_startup_is_used_by_requests(monkeypatch, database_path):
+    from fastapi.testclient import TestClient
+    import app.core.config as config
+    import app.main
+    from app.db.database import get_db
+
+    loaded_engines = []
+    def load_similarity_index(repository, path):
+        loaded_engines.append(repository.get_similarity_engine())
+
+    monkeypatch.setattr(config, "PRELOAD_MODELS", False)
+    monkeypatch.setattr(config, "SIMILARITY_INDEX_PATH", database_path + ".npz")
+    monkeypatch.setattr(app.main, "load_similarity_index", load_similarity_index)
+    monkeypatch.setattr(app.main, "save_similarity_index", lambda repository, path: None)
+    with TestClient(app.main.app):
+        db = next(get_db())
+        try:
+            assert loaded_engines == [SQLiteMaterialRepository(db).get_similarity_engine()]
+        finally:
+            db.close()
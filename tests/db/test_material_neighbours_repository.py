@@ -0,0 +1,62 @@
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+import app.core.config as config
+from app.db.repository.sqlite_material_neighbours_repository import SQLiteMaterialNeighboursRepository
+from app.db.repository.sqlite_material_repository import SQLiteMaterialRepository
+from app.domain.similarity.neighbour_lists import compute_neighbour_lists
+from app.models.material import Base, Material, CHARACTERISTICS_COLUMNS
+from app.models.material_neighbours import MaterialNeighbours # registers the table for create_all
+from app.services.material_service import calculate_similarity_using_id
+from app.services.neighbour_service import build_neighbour_lists, update_neighbour_lists
+from app.services.populate_db import populate_data
+
+
+def create_material(rng) -> Material:
+    characteristics = rng.uniform(-2.75, 2.75, size=len(CHARACTERISTICS_COLUMNS))
+    return Material(name="New_material", category="WOOD", is_original=False, **{column.key: float(value) for column, value in zip(CHARACTERISTICS_COLUMNS, characteristics)})
+
+def test_neighbour_lists_are_built_and_updated(monkeypatch):
+    monkeypatch.setattr(config, "NEIGHBOUR_LIST_SIZE", 10)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    populate_data(150, bind=engine)
+    rng = np.random.default_rng(0)
+
+    with Session(bind=engine) as db:
+        repository = SQLiteMaterialRepository(db)
+        neighbours_repository = SQLiteMaterialNeighboursRepository(db)
+        assert update_neighbour_lists(repository, neighbours_repository) == 0 # lists were not built
+        assert neighbours_repository.get_neighbours(1, 10) is None
+
+        build_neighbour_lists(repository, neighbours_repository)
+        assert neighbours_repository.is_up_to_date(10)
+
+        for _ in range(12):
+            repository.add_material(create_material(rng))
+            assert update_neighbour_lists(repository, neighbours_repository) == 1
+        assert neighbours_repository.is_up_to_date(10)
+
+        # incrementally updated lists are the same as lists built from scratch
+        ids, vectors = repository.get_similarity_engine().get_snapshot()
+        positions, similarities = compute_neighbour_lists(vectors, 10)
+        for row in range(len(ids)):
+            neighbour_ids, neighbour_similarities = neighbours_repository.get_neighbours(int(ids[row]), 10)
+            assert list(neighbour_ids) == list(ids[positions[row]])
+            np.testing.assert_allclose(neighbour_similarities, similarities[row], rtol=0, atol=1e-12)
+
+        # pages in the lists are read from them, the same as computed ones
+        for kwargs in ({"limit": 10}, {"limit": 3, "offset": 4}, {"limit": 10, "min_similarity": 0.3}):
+            expected = calculate_similarity_using_id(160, repository, **kwargs)
+            result = calculate_similarity_using_id(160, repository, neighbours_repository, **kwargs)
+            assert [row for row, _ in result] == [row for row, _ in expected]
+            np.testing.assert_allclose([similarity for _, similarity in result], [similarity for _, similarity in expected], rtol=0, atol=1e-6)
+
+        # material stored without updating the lists makes them outdated
+        repository.add_material(create_material(rng))
+        assert not neighbours_repository.is_up_to_date(10)
+        assert neighbours_repository.get_neighbours(1, 10) is None
+        assert update_neighbour_lists(repository, neighbours_repository) == 1
+        assert neighbours_repository.get_neighbours(1, 10) is not None
@@ -0,0 +1,97 @@
+import numpy as np
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.db.repository.sqlite_material_repository import SQLiteMaterialRepository, MATERIAL_ROW_COLUMNS
+from app.models.material import Base, Material, CHARACTERISTICS_COLUMNS
+from app.models.material_name_search import MATERIAL_NAME_SEARCH_TABLE, create_material_name_search
+from app.schemas.material_category import MaterialCategory
+from app.schemas.name_match import NameMatch
+from app.services.image_service import get_material_response, get_material_row_content
+from app.services.populate_db import populate_data
+
+
+def test_material_rows_match_materials():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    populate_data(200, bind=engine)
+
+    with Session(bind=engine) as db:
+        repository = SQLiteMaterialRepository(db)
+        for filters in ({}, {"name_filter": "a"}, {"categories": [MaterialCategory.WOOD, MaterialCategory.METAL]}):
+            materials = repository.get_materials(**filters)
+            rows = repository.get_material_rows(**filters)
+            assert [get_material_row_content(row) for row in rows] == [get_material_response(material).model_dump(mode="json") for material in materials]
+
+        ids = np.random.default_rng(0).permutation([material.id for material in materials]).tolist() + [10**9]
+        assert [row[0] for row in repository.get_material_rows_by_ids(ids)] == ids[:-1]
+
+def test_material_pages_use_name_order_index():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    populate_data(50, bind=engine)
+
+    with Session(bind=engine) as db:
+        repository = SQLiteMaterialRepository(db)
+        rows = repository.get_material_rows()
+        after = repository.get_material_row_key(rows[19])
+        assert repository.get_material_rows(after=after, limit=10) == rows[20:30]
+        assert list(repository.iterate_material_rows(page_size=7)) == rows
+
+        statement = repository._filter_materials(select(*MATERIAL_ROW_COLUMNS), None, None)
+        plan = " ".join(row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {statement}")))
+        assert "ix_materials_lower_name_id" in plan and "TEMP B-TREE" not in plan # sorted by the index
+
+def test_material_name_search():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    names = ["ShinyGem", "gemShiny", "SHINYwood", "Shinny_x", "DullWave", "Ab%cd", "Steel"]
+    with Session(bind=engine) as db:
+        db.add_all(Material(name=name, category=MaterialCategory.WOOD, is_original=False, **{column.key: 0.5 for column in CHARACTERISTICS_COLUMNS}) for name in names)
+        db.commit()
+
+        repository = SQLiteMaterialRepository(db)
+        def search(name, name_match):
+            return [row[1] for row in repository.get_material_rows(name, name_match=name_match)]
+
+        assert search("shiny", NameMatch.SUBSTRING) == ["gemShiny", "ShinyGem", "SHINYwood"]
+        assert search("shiny", NameMatch.PREFIX) == ["ShinyGem", "SHINYwood"]
+        assert search("sh", NameMatch.PREFIX) == ["Shinny_x", "ShinyGem", "SHINYwood"] # too short for trigrams
+        assert search("b%", NameMatch.SUBSTRING) == search("%cd", NameMatch.SUBSTRING) == ["Ab%cd"]
+        assert search("shinny", NameMatch.FUZZY) == ["gemShiny", "Shinny_x", "ShinyGem", "SHINYwood"]
+        assert [(row[1], score) for row, score in repository.search_material_rows("shinny", limit=2)] == [("Shinny_x", 1.0), ("gemShiny", 0.5)]
+        assert search("stell", NameMatch.FUZZY) == search("steal", NameMatch.FUZZY) == ["Steel"] # one typo in a short name
+        assert search("sxeel", NameMatch.FUZZY) == ["Steel"]
+
+        # index follows changes of the materials table
+        material = db.scalars(select(Material).where(Material.name == "DullWave")).one()
+        material.name = "ShinyWave"
+        db.delete(db.scalars(select(Material).where(Material.name == "gemShiny")).one())
+        db.commit()
+        assert search("shiny", NameMatch.SUBSTRING) == ["ShinyGem", "ShinyWave", "SHINYwood"]
+        assert search("dull", NameMatch.SUBSTRING) == []
+
+    # index of a DB created before it existed is filled with the stored names
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE {MATERIAL_NAME_SEARCH_TABLE}"))
+        create_material_name_search(connection)
+    with Session(bind=engine) as db:
+        assert [row[1] for row in SQLiteMaterialRepository(db).get_material_rows("wave")] == ["ShinyWave"]
+
+def test_material_name_search_folds_unicode_case():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    names = ["Žula_red", "žula_blue", "zula"]
+    with Session(bind=engine) as db:
+        db.add_all(Material(name=name, category=MaterialCategory.WOOD, is_original=False, **{column.key: 0.5 for column in CHARACTERISTICS_COLUMNS}) for name in names)
+        db.commit()
+
+        repository = SQLiteMaterialRepository(db)
+        def search(name, name_match):
+            return sorted(row[1] for row in repository.get_material_rows(name, name_match=name_match))
+
+        # short filters (without the trigram index) fold the case like the index does
+        for name_match in (NameMatch.SUBSTRING, NameMatch.PREFIX, NameMatch.FUZZY):
+            assert search("žu", name_match) == search("ŽUL", name_match) == ["Žula_red", "žula_blue"]
+        assert search("Ž", NameMatch.SUBSTRING) == ["Žula_red", "žula_blue"]
@@ -0,0 +1,57 @@
+# generates data/peak_counts.json - expected results of the peak counting in statistical features for a subset of the stored
+# images, computed by the findpeaks package the features used before (findpeaks 2.6.6, not a dependency of the server)
+# the package is used as it is - its tie-breaking of equal histogram values (_make_unique) is deterministic, but quadratic
+# in the number of equal values and takes about 7 minutes per histogram, so the corpus is small
+# run from repository root: python -m tests.domain.fingerprinting.generate_peak_counts
+
+import json
+import os
+
+import numpy as np
+from PIL import Image
+
+from app.domain.fingerprinting.veronika_features import StatisticalFeatures
+
+STORED_IMAGES_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "images")
+PEAK_COUNTS_PATH = os.path.join(os.path.dirname(__file__), "data", "peak_counts.json")
+IMAGE_STEP = 28 # every n-th stored image is in the corpus
+
+def get_peak_inputs(sf: StatisticalFeatures, img: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # (scaled sector sums, Lab color histogram) of the image - inputs of the 1D and 2D peak counting in compute()
+    img_lab, img_lch = sf.rgb2other(img)
+    ft_ps = sf.power_spectrum(sf.center_crop(img_lch[..., 0], 256))
+    all_sum = sf.mean_circular_sectors_cut(ft_ps).sum(axis=0)
+    all_sum_red = (all_sum - all_sum.min()) / (all_sum.max() - all_sum.min())
+
+    bins = sf._clr_multicolored_bins
+    histogram, _, _ = np.histogram2d(img_lab[..., 1].reshape(-1), img_lab[..., 2].reshape(-1), bins=[bins, bins], weights=img_lab[..., 0].reshape(-1))
+    return all_sum_red, histogram
+
+def read_image(name: str) -> np.ndarray:
+    return np.asarray(Image.open(os.path.join(STORED_IMAGES_DIR, name)).convert("RGB"))
+
+def get_corpus_names() -> list[str]:
+    return sorted(name for name in os.listdir(STORED_IMAGES_DIR) if name.endswith(".jpg"))[::IMAGE_STEP]
+
+def main():
+    import findpeaks
+
+    sf = StatisticalFeatures()
+    expected = {}
+    for name in get_corpus_names():
+        all_sum_red, histogram = get_peak_inputs(sf, read_image(name))
+
+        peaks = findpeaks.findpeaks(method="topology", verbose=0).fit(all_sum_red)["persistence"][["y", "score"]].values
+        multicolored = findpeaks.findpeaks(limit=30, verbose=0).fit(histogram)["persistence"]
+        expected[name] = {
+            "pattern_peaks": sorted(int(y) for y, score in peaks if score > 0.5),
+            "multicolored_peaks": len(multicolored)
+        }
+        print(name, expected[name])
+
+    os.makedirs(os.path.dirname(PEAK_COUNTS_PATH), exist_ok=True)
+    with open(PEAK_COUNTS_PATH, "w") as file:
+        json.dump(expected, file, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import numpy as np
+import skimage.color
+
+from app.domain.fingerprinting.color_conversion import LChConverter
+
+
+def assert_close_to_skimage(img: np.ndarray, img_lab: np.ndarray, img_lch: np.ndarray):
+    expected_lab = skimage.color.rgb2lab(img, "D65")
+    expected_lch = skimage.color.lab2lch(expected_lab)
+    assert img_lab.dtype == img_lch.dtype == np.float32
+
+    assert np.allclose(img_lab, expected_lab, rtol=0, atol=1e-3)
+    assert np.allclose(img_lch[..., :2], expected_lch[..., :2], rtol=0, atol=1e-3)
+
+    # hue is compared as an angle and only for colors with some chroma (hue of gray is arbitrary)
+    hue_difference = np.abs(img_lch[..., 2] - expected_lch[..., 2])
+    hue_difference = np.minimum(hue_difference, 2*np.pi - hue_difference)
+    assert np.all(hue_difference[expected_lch[..., 1] > 0.1] < 1e-3)
+    assert np.all((img_lch[..., 2] >= 0) & (img_lch[..., 2] < 2*np.pi))
+
+def test_convert_matches_skimage_for_uint8_colors():
+    # a grid over the whole RGB cube, including black, white and grays
+    levels = np.r_[np.arange(0, 256, 15), 255].astype(np.uint8)
+    img = np.stack(np.meshgrid(levels, levels, levels, indexing="ij"), axis=-1).reshape(-1, len(levels), 3)
+
+    assert_close_to_skimage(img, *LChConverter().convert(img))
+
+def test_convert_matches_skimage_for_float_image_stacks():
+    imgs = np.random.default_rng(0).uniform(0, 1, size=(2, 40, 30, 3))
+    assert_close_to_skimage(imgs, *LChConverter().convert(imgs))
+
+def test_reused_buffers_are_overwritten_by_next_conversion():
+    converter = LChConverter()
+    rng = np.random.default_rng(1)
+    first, second = rng.integers(0, 256, size=(2, 8, 8, 3), dtype=np.uint8)
+
+    first_lab, _ = converter.convert(first, reuse_buffers=True)
+    second_lab, second_lch = converter.convert(second, reuse_buffers=True)
+    assert second_lab is first_lab
+    assert_close_to_skimage(second, second_lab, second_lch)
+
+    own_lab, _ = converter.convert(first) # without reuse_buffers results are new arrays
+    assert own_lab is not second_lab
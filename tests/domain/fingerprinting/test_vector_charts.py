@@ -0,0 +1,31 @@
+import math
+
+import numpy as np
+
+from app.domain.fingerprinting.ratings import RATING_NAMES, RATING_CHANGE
+from app.domain.fingerprinting.vector_charts import get_line_geometry, get_polar_geometry, render_svg
+
+
+def test_polar_geometry_follows_rating_change_order():
+    ratings = np.linspace(-2.5, 2.5, len(RATING_NAMES))
+    points = get_polar_geometry(ratings)["points"]
+
+    assert [point["name"] for point in points] == [RATING_NAMES[i] for i in RATING_CHANGE]
+    assert points[0]["angle"] == 0 and points[4]["angle"] == 90 # clockwise from the top
+    for point in points:
+        radius = (point["rating"] + 2.5) / 5
+        angle = math.radians(point["angle"])
+        assert math.isclose(point["x"], radius * math.sin(angle)) and math.isclose(point["y"], radius * math.cos(angle))
+
+def test_line_geometry_and_svg():
+    ratings = np.zeros(len(RATING_NAMES))
+    ratings[0], ratings[-1] = 2.5, -2.5
+    points = get_line_geometry(ratings)["points"]
+
+    assert (points[0]["x"], points[0]["y"]) == (0, 1)
+    assert (points[-1]["x"], points[-1]["y"]) == (1, 0)
+    assert all(point["y"] == 0.5 for point in points[1:-1])
+
+    for kind in ("line", "polar"):
+        svg = render_svg(kind, ratings, "#123456")
+        assert svg.count("<circle") >= len(RATING_NAMES) and "#123456" in svg
@@ -0,0 +1,117 @@
+import json
+import math
+
+import numpy as np
+import scipy.stats
+import pytest
+
+from app.domain.fingerprinting.topology_peaks import count_peaks_1d, count_peaks_2d
+from app.domain.fingerprinting.veronika_features import StatisticalFeatures
+from tests.domain.fingerprinting.generate_peak_counts import PEAK_COUNTS_PATH, get_peak_inputs, read_image
+
+
+@pytest.fixture(name="sf", scope="module")
+def statistical_features_fixture():
+    return StatisticalFeatures()
+
+def mean_circular_sectors_cut_with_masks(sf: StatisticalFeatures, ft_ps: np.ndarray) -> np.ndarray:
+    # original implementation - mean of the shifted spectrum in each sector mask times the number of pixels of the mask
+    sz = ft_ps.shape[0]
+    sector_size = int(360/sf.SECTORS_NUM)
+    middle = math.floor(sz/2)
+    fourier = np.fft.fftshift(ft_ps)
+
+    mean_all = np.zeros((sf.CIR_NUM, math.ceil(sf.SECTORS_NUM/2)))
+    sum_all = np.zeros_like(mean_all)
+    for i in range(math.ceil(sf.SECTORS_NUM/2)):
+        angles = (270 + i*sector_size, 270 + sector_size + i*sector_size)
+        for j in range(sf.CIR_NUM):
+            big_size = math.floor(middle/sf.CIR_NUM)*(j+1) if j != sf.CIR_NUM-1 else middle
+            small_size = math.floor(middle/sf.CIR_NUM)*j
+            mask = sf.sector_mask(sz, (middle, middle), big_size, angles) & ~sf.sector_mask(sz, (middle, middle), small_size, angles)
+            mean_all[j, i] = np.mean(fourier[mask])
+            sum_all[j, i] = np.count_nonzero(mask)
+
+    return mean_all*sum_all
+
+def test_mean_circular_sectors_cut_matches_masks(sf: StatisticalFeatures):
+    rng = np.random.default_rng(0)
+    img = rng.uniform(0, 100, size=(256, 256))
+    img[::8] += 50 # stripes, so the spectrum is not flat
+    ft_ps = np.abs(np.fft.fft2(img))**2
+
+    expected = mean_circular_sectors_cut_with_masks(sf, ft_ps)
+    assert np.allclose(sf.mean_circular_sectors_cut(sf.power_spectrum(img)), expected, rtol=1e-12, atol=0)
+    assert np.array_equal(sf._patt_sum_all, np.bincount(sf._patt_bins, weights=sf._patt_weights, minlength=sf._patt_sum_all.size).reshape(sf._patt_sum_all.shape))
+
+def test_power_spectrum_is_half_of_full_spectrum(sf: StatisticalFeatures):
+    imgs = np.random.default_rng(2).uniform(0, 100, size=(2, 256, 256)).astype(np.float32)
+    full = np.abs(np.fft.fft2(imgs))**2
+
+    for reuse_buffers in (False, True, True):
+        half = sf.power_spectrum(imgs, reuse_buffers=reuse_buffers)
+        assert half.shape == (2, 256, 129)
+        assert np.allclose(half, full[..., :129], rtol=1e-10)
+        assert np.allclose(half.reshape(2, -1)[:, sf._ft_half_index], full.reshape(2, -1), rtol=1e-10)
+
+    # PSD of the half spectrum is the same as binned mean of the full one
+    kfreq = np.fft.fftfreq(256) * 256
+    knrm = np.sqrt(kfreq.reshape(-1, 1)**2 + kfreq.reshape(1, -1)**2).reshape(-1)
+    expected = scipy.stats.binned_statistic(knrm, full.reshape(2, -1), statistic="mean", bins=sf._ft_kbins)[0]*sf._ft_kbins2
+    assert np.allclose(sf.count_only_psd(half), expected, rtol=1e-10)
+
+def test_count_only_psd_is_identical_to_binned_statistic(sf: StatisticalFeatures):
+    ft_ps = sf.power_spectrum(np.random.default_rng(3).uniform(0, 100, size=(3, 256, 256)))
+
+    # previous implementation - binning of all the pixels by binned_statistic for every spectrum
+    weights = np.bincount(sf._ft_half_index, minlength=sf._ft_knrm.size)
+    sums = scipy.stats.binned_statistic(sf._ft_knrm, ft_ps.reshape(3, -1)*weights, statistic="sum", bins=sf._ft_kbins)[0]
+    expected = sums/sf._ft_kcounts*sf._ft_kbins2
+
+    assert np.array_equal(sf.count_only_psd(ft_ps), expected)
+    assert np.array_equal(sf.count_only_psd(ft_ps[1]), expected[1])
+
+def test_compute_matches_reference_values(sf: StatisticalFeatures):
+    rng = np.random.default_rng(1)
+    imgs = rng.uniform(0, 1, size=(3, 300, 280, 3))
+    imgs[1, ::10] = 0 # stripes
+    imgs[2] = 0 # black image - zero variance and no pattern
+
+    for img in imgs[:2]:
+        features = sf.compute(img)
+        assert features.shape == (14,)
+
+        # reference values computed the way the original code did
+        lch = sf.rgb2other(img)[1]
+        luma = lch[..., 0]
+        assert np.allclose(features[:3], (np.percentile(luma, 99), np.percentile(luma, 1), np.mean(luma)))
+        assert np.isclose(features[4], scipy.stats.skew(luma, axis=None))
+        crop = sf.center_crop(luma, 256)
+        psd = sf.count_only_psd(sf.power_spectrum(crop))
+        assert np.allclose(features[7:10], [np.mean(psd[0:5]), np.mean(psd[5:50]), np.mean(psd[50:128])], rtol=1e-10)
+        assert np.isclose(features[10], np.mean(lch[..., 0]*lch[..., 1]))
+
+    assert np.array_equal(sf.compute(imgs[2])[[4, 5, 6, 11, 12]], [0, 0, 0, 1, 1]) # skew, kurtosis, directionality, pattern strength, peaks
+
+def test_peak_counts_match_findpeaks(sf: StatisticalFeatures):
+    # expected results of the findpeaks package on stored images (see generate_peak_counts.py)
+    with open(PEAK_COUNTS_PATH) as file:
+        expected = json.load(file)
+
+    for name, counts in expected.items():
+        all_sum_red, histogram = get_peak_inputs(sf, read_image(name))
+        assert count_peaks_1d(all_sum_red, min_score=0.5) == counts["pattern_peaks"], name
+        assert count_peaks_2d(histogram, limit=30) == counts["multicolored_peaks"], name
+
+def test_peak_counts_of_simple_inputs():
+    assert count_peaks_1d(np.array([0, 1, 0, 0.2, 0, 0.9, 0.1]), min_score=0.5) == [1, 5]
+    assert count_peaks_1d(np.array([0, 1, 1, 0]), min_score=0.5) == [1] # plateau is one peak at its first position
+
+    histogram = np.full((64, 64), 50.0)
+    histogram[:4] = 0
+    histogram[10:14, 10:14] = 250
+    histogram[40:44, 50:54] = 200
+    assert count_peaks_2d(histogram, limit=30) == 3 # two peaks and the valley
+
+    histogram[histogram == 50] = 0 # peaks are separated by values below the limit, so the lower one never merges and gets no score
+    assert count_peaks_2d(histogram, limit=30) == 2
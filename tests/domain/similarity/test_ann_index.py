@@ -0,0 +1,79 @@
+import threading
+import time
+
+import numpy as np
+
+from app.domain.similarity.ann_index import IVFIndex, recall_at_k
+from app.domain.similarity.similarity_engine import SimilarityEngine
+
+
+def clustered_vectors(count, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(-2.5, 2.5, size=(50, 16))
+    return (centers[rng.integers(0, 50, count)] + rng.normal(0, 0.3, size=(count, 16))).astype(np.float32)
+
+def test_ivf_recall_against_exact_ranking():
+    vectors = clustered_vectors(5000)
+    index = IVFIndex.build(vectors)
+
+    assert recall_at_k(index, vectors, vectors[:50], k=20) >= 0.9
+    assert len(index.search(vectors[0])) < len(vectors) / 2 # only part of the catalogue is scored
+
+def test_ivf_incremental_insert_and_save(tmp_path):
+    vectors = clustered_vectors(3001)
+    index = IVFIndex.build(vectors[:3000])
+
+    index.add(np.array([3000]), vectors[3000:])
+    assert 3000 in index.search(vectors[3000])
+
+    path = str(tmp_path / "index.npz")
+    ids = np.arange(1, 3002)
+    index.save(path, ids)
+
+    loaded = IVFIndex.load(path, ids)
+    assert len(loaded) == 3001
+    assert np.array_equal(loaded.search(vectors[10]), index.search(vectors[10]))
+    assert IVFIndex.load(path, ids + 1) is None # index of different materials is not loaded
+
+def test_engine_approximate_mode():
+    vectors = clustered_vectors(2000)
+    engine = SimilarityEngine(min_index_size=1000)
+    engine.add(np.arange(2000), vectors, ["METAL"] * 2000)
+
+    exact_ids, exact_similarities = engine.score(vectors[5])
+    engine.build_index()
+    approximate_ids, approximate_similarities = engine.score(vectors[5], approximate=True)
+
+    assert len(approximate_ids) < len(exact_ids)
+    assert approximate_ids[np.argmax(approximate_similarities)] == 5
+    np.testing.assert_allclose(approximate_similarities, exact_similarities[approximate_ids])
+
+    # materials added after the index was built are searchable as well
+    engine.add([2000], vectors[5:6], ["METAL"])
+    approximate_ids, _ = engine.score(vectors[5], approximate=True)
+    assert 2000 in approximate_ids
+
+def test_engine_builds_index_in_background(monkeypatch):
+    vectors = clustered_vectors(2000)
+    engine = SimilarityEngine(min_index_size=1000)
+    engine.add(np.arange(2000), vectors, ["METAL"] * 2000)
+
+    built = threading.Event()
+    build = IVFIndex.build
+    def wait_and_build(*args):
+        built.wait()
+        return build(*args)
+    monkeypatch.setattr(IVFIndex, "build", wait_and_build)
+
+    # queries do not wait for the index, they are exact until it is built
+    approximate_ids, _ = engine.score(vectors[5], approximate=True)
+    assert len(approximate_ids) == 2000
+    assert engine.index is None and engine.is_index_building()
+
+    built.set()
+    for _ in range(500):
+        if not engine.is_index_building():
+            break
+        time.sleep(0.01)
+    assert engine.index is not None
+    assert len(engine.score(vectors[5], approximate=True)[0]) < 2000
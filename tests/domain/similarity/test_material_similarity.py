@@ -0,0 +1,72 @@
+import numpy as np
+
+from app.domain.similarity.material_similarity import calculate_similarity, calculate_similarity_batch
+from app.domain.similarity.similarity_engine import SimilarityEngine, select_top_k
+
+
+def random_vectors(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-2.75, 2.75, size=(count, 16))
+
+def test_batch_similarity_matches_scalar_similarity():
+    vectors = random_vectors(200)
+    target = random_vectors(1, seed=1)[0]
+
+    expected = np.array([calculate_similarity(target, vector) for vector in vectors])
+    result = calculate_similarity_batch(target, vectors)
+
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-12)
+
+def test_engine_ranking_matches_scalar_ranking():
+    vectors = random_vectors(1000)
+    ids = np.arange(1, 1001)
+    target = vectors[10]
+
+    engine = SimilarityEngine()
+    for start in range(0, 1000, 100): # added in chunks to exercise growing of the matrix
+        engine.add(ids[start:start + 100], vectors[start:start + 100], ["METAL"] * 100)
+
+    ranked_ids, similarities = engine.rank(target)
+
+    # the engine stores float32 vectors, so the scores are compared to the float32 rounded characteristics
+    expected = np.array([calculate_similarity(target, vector) for vector in vectors.astype(np.float32).astype(np.float64)])
+    np.testing.assert_allclose(similarities, np.sort(expected)[::-1], rtol=0, atol=1e-12)
+    assert ranked_ids[0] == 11
+    assert list(ranked_ids) == list(ids[np.argsort(-expected, kind="stable")])
+
+def test_engine_scores_only_filtered_candidates():
+    vectors = random_vectors(300)
+    categories = ["METAL", "WOOD", "FABRIC"] * 100
+    found_ids = [i for i in range(300) if i % 2] # e.g. found by name
+
+    engine = SimilarityEngine()
+    engine.add(np.arange(300), vectors, categories)
+
+    ids, similarities = engine.score(vectors[0], categories=["WOOD", "PAPER"], material_ids=found_ids)
+
+    expected_ids = [i for i in range(300) if categories[i] == "WOOD" and i % 2]
+    assert list(ids) == expected_ids
+    np.testing.assert_allclose(similarities, calculate_similarity_batch(vectors[0], vectors[expected_ids].astype(np.float32)))
+
+    ids, _ = engine.score(vectors[0], categories=["PAPER"])
+    assert len(ids) == 0
+
+    ids, _ = engine.score(vectors[0], categories=["WOOD"], material_ids=[1, 4, 5, 7, 1000])
+    assert list(ids) == [1, 4, 7]
+
+def test_top_k_selection_matches_full_sort():
+    similarities = np.random.default_rng(2).uniform(-1, 1, size=500)
+    similarities[[3, 30]] = np.nan
+    full_order = list(np.argsort(-np.where(np.isnan(similarities), -np.inf, similarities), kind="stable"))
+
+    assert list(select_top_k(similarities)) == full_order
+    assert list(select_top_k(similarities, limit=20)) == full_order[:20]
+    assert list(select_top_k(similarities, limit=20, offset=490)) == full_order[490:]
+    assert list(select_top_k(similarities, limit=5, offset=600)) == []
+
+    threshold = np.nanquantile(similarities, 0.9)
+    assert list(select_top_k(similarities, min_similarity=threshold)) == [i for i in full_order if similarities[i] >= threshold]
+
+    candidates = np.zeros(500, dtype=bool)
+    candidates[::7] = True
+    assert list(select_top_k(similarities, limit=10, candidates=candidates)) == [i for i in full_order if candidates[i]][:10]
@@ -0,0 +1,37 @@
+import numpy as np
+
+from app.domain.similarity.material_similarity import calculate_similarity_batch
+from app.domain.similarity.neighbour_lists import compute_neighbour_lists, insert_neighbour, get_entry_threshold
+from app.domain.similarity.similarity_engine import select_top_k
+
+
+def test_neighbour_lists_match_ranking():
+    vectors = np.random.default_rng(0).uniform(-2.75, 2.75, size=(300, 16)).astype(np.float32)
+    vectors[10] = vectors[20] = vectors[30] # ties
+    vectors[40] = 1.0 # constant vector, undefined similarity
+
+    positions, similarities = compute_neighbour_lists(vectors, 15, block_size=7, workers=2)
+    assert positions.shape == similarities.shape == (300, 15)
+
+    for row in range(300):
+        expected_similarities = calculate_similarity_batch(vectors[row], vectors)
+        expected = select_top_k(expected_similarities, limit=15)
+        assert list(positions[row]) == list(expected)
+        np.testing.assert_allclose(similarities[row], expected_similarities[expected], rtol=0, atol=1e-12)
+
+    positions, _ = compute_neighbour_lists(vectors[:5], 15) # smaller catalogue than the lists
+    assert positions.shape == (5, 5)
+
+def test_insert_neighbour():
+    ids, similarities = np.array([1, 2, 3]), np.array([1.0, 0.5, 0.2])
+
+    new_ids, new_similarities = insert_neighbour(ids, similarities, 9, 0.5, 3) # after the neighbour with the same similarity
+    assert list(new_ids) == [1, 2, 9] and list(new_similarities) == [1.0, 0.5, 0.5]
+    assert insert_neighbour(ids, similarities, 9, 0.2, 3) is None
+    assert insert_neighbour(ids, similarities, 2, 0.9, 3) is None # already in the list
+
+    new_ids, _ = insert_neighbour(ids, similarities, 9, np.nan, 4) # undefined similarity is last
+    assert list(new_ids) == [1, 2, 3, 9]
+
+    assert get_entry_threshold(similarities, 3) == 0.2
+    assert get_entry_threshold(similarities, 4) is None
@@ -0,0 +1,49 @@
+from fastapi.testclient import TestClient
+
+import app.core.config as config
+from app.main import app as application
+
+
+def test_readiness_after_startup(monkeypatch):
+    monkeypatch.setattr(config, "PRELOAD_MODELS", True)
+    with TestClient(application) as client: # entering the client runs app lifespan which loads the models
+        response = client.get("/health/ready")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["ready"] is True
+    assert data["load_time_seconds"] > 0
+    assert set(data["component_load_times"]) == {"imports", "statistical_features", "clip", "mlp"}
+
+def test_readiness_without_preloaded_models(monkeypatch):
+    from app.services.model_registry import model_registry
+
+    monkeypatch.setattr(config, "PRELOAD_MODELS", False)
+    model_registry.unload()
+    with TestClient(application) as client: # models are loaded by the first analysis
+        response = client.get("/health/ready")
+
+    assert response.status_code == 200
+    assert response.json()["ready"] is False and response.json()["preload"] is False
+    assert not model_registry.is_ready()
+
+def test_database_status(monkeypatch):
+    monkeypatch.setattr(config, "PRELOAD_MODELS", False)
+    with TestClient(application) as client:
+        response = client.get("/health/database")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["journal_mode"] == "wal"
+    assert data["read_pool"]["size"] > 0 and data["write_pool"]["size"] > 0
+    assert data["pending_writes"] == 0
+
+def test_similarity_index_status(monkeypatch):
+    monkeypatch.setattr(config, "PRELOAD_MODELS", False)
+    with TestClient(application) as client:
+        response = client.get("/health/similarity-index")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["materials_count"] >= 0
+    assert "recall_at_k" not in data # recall is measured by the similarity benchmark, not by the probe
@@ -1,3 +1,4 @@
+import json
 import tempfile
 import pytest
 import io
@@ -9,12 +10,15 @@ from sqlalchemy.pool import StaticPool
 import os
 
 from app.db.repository.repository_factory import get_material_repository
+from app.db.repository.sqlite_material_neighbours_repository import SQLiteMaterialNeighboursRepository
 from app.db.repository.sqlite_material_repository import SQLiteMaterialRepository
 from app.main import app as application
 from app.db.database import get_db
 from app.models.material import Base
 import app.models
 import app.core.config as config
+from app.services.neighbour_service import build_neighbour_lists
+from app.services.populate_db import populate_data
 
 
 @pytest.fixture(name="session")
@@ -47,7 +51,9 @@ def repository_fixture(session):
     return SQLiteMaterialRepository(session)
 
 @pytest.fixture(name="client")
-def client_fixture(repository, session):
+def client_fixture(repository, session, monkeypatch):
+    monkeypatch.setattr(config, "PRELOAD_MODELS", False) # models are loaded only by tests which analyse images
+
     def override_get_db():
         try:
             yield session
@@ -191,6 +197,10 @@ def test_get_materials_with_filter(client: TestClient):
     for material in data:
         assert "Filter" in material["name"]
 
+    # name filter is case-insensitive (same as name filter of similar materials)
+    response = client.get("/materials", params={"name": "filter_TEST"})
+    assert [material["name"] for material in response.json()] == ["Filter_test_material"]
+
 def test_get_material_image_not_found(client: TestClient):
     response = client.get("/materials/123456/image/specular")
     assert response.status_code == 404
@@ -389,4 +399,353 @@ def test_material_images_are_stored_correctly(client: TestClient, temp_image_dir
         Image.open(specular_path)
         Image.open(non_specular_path)
     except Exception as e:
-        pytest.fail(f"Failed to open stored images: {e}")
\ No newline at end of file
+        pytest.fail(f"Failed to open stored images: {e}")
+
+def test_get_similar_materials_limit_and_similarity(client: TestClient):
+    material_ids = []
+    for name, color in (("Red_limit_test", (255, 0, 0)), ("Blue_limit_test", (0, 0, 255)), ("Green_limit_test", (0, 255, 0))):
+        response = client.post(
+            "/materials",
+            files={
+                "specular_image": ("specular.png", create_colored_test_image(color), "image/png"),
+                "non_specular_image": ("non_specular.png", create_colored_test_image(color), "image/png"),
+            },
+            data={
+                "name": name,
+                "category": "PLASTIC",
+                "store_in_db": "true",
+            },
+        )
+        assert response.status_code == 201
+        material_ids.append(response.json()["id"])
+
+    response = client.get(f"/materials/{material_ids[0]}/similar")
+    assert response.status_code == 200
+    all_materials = response.json()
+    assert len(all_materials) == 3
+    similarities = [material["similarity"] for material in all_materials]
+    assert similarities == sorted(similarities, reverse=True)
+    assert all_materials[0]["id"] == material_ids[0]
+    assert all_materials[0]["similarity"] == pytest.approx(1.0)
+
+    response = client.get(f"/materials/{material_ids[0]}/similar", params={"limit": 1, "offset": 1})
+    assert response.status_code == 200
+    assert [material["id"] for material in response.json()] == [all_materials[1]["id"]]
+
+    response = client.get(f"/materials/{material_ids[0]}/similar", params={"min_similarity": similarities[1]})
+    assert response.status_code == 200
+    assert [material["id"] for material in response.json()] == [material["id"] for material in all_materials[:2]]
+
+    # catalogue is too small for approximate index, so approximate mode returns exact results
+    response = client.get(f"/materials/{material_ids[0]}/similar", params={"mode": "APPROXIMATE"})
+    assert response.status_code == 200
+    assert response.json() == all_materials
+
+def test_create_material_rejected_when_analysis_queue_full(client: TestClient, test_images, monkeypatch):
+    from app.services.analysis_executor import analysis_executor
+    monkeypatch.setattr(analysis_executor, "queue_size", 0) # every analysis is over the limit
+
+    specular_image, non_specular_image = test_images
+    response = client.post(
+        "/materials",
+        files={
+            "specular_image": ("specular.png", specular_image, "image/png"),
+            "non_specular_image": ("non_specular.png", non_specular_image, "image/png"),
+        },
+        data={
+            "name": "Busy_test",
+            "category": "METAL",
+            "store_in_db": "false",
+        },
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+def test_create_material_large_jpeg_and_invalid_non_specular(client: TestClient, temp_image_dir):
+    large_jpeg = io.BytesIO()
+    Image.new("RGB", (2000, 1500), color=(0, 128, 255)).save(large_jpeg, format="JPEG")
+    large_jpeg.seek(0)
+    truncated_jpeg = io.BytesIO(large_jpeg.getvalue()[:200]) # valid header, missing image data
+
+    response = client.post(
+        "/materials",
+        files={
+            "specular_image": ("specular.jpg", large_jpeg, "image/jpeg"),
+            "non_specular_image": ("non_specular.jpg", truncated_jpeg, "image/jpeg"),
+        },
+        data={
+            "name": "Large_jpeg_test",
+            "category": "METAL",
+            "store_in_db": "true",
+        },
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Non specular image is not a valid image."
+
+    large_jpeg.seek(0)
+    response = client.post(
+        "/materials",
+        files={
+            "specular_image": ("specular.jpg", large_jpeg, "image/jpeg"),
+            "non_specular_image": ("non_specular.png", create_test_image(), "image/png"),
+        },
+        data={
+            "name": "Large_jpeg_test",
+            "category": "METAL",
+            "store_in_db": "true",
+        },
+    )
+    assert response.status_code == 201
+    material_id = response.json()["id"]
+
+    stored_image = Image.open(os.path.join(temp_image_dir, app.core.config.get_specular_image_name(material_id)))
+    assert stored_image.size == (500, 500)
+
+def test_create_material_reuploaded_images_are_not_analysed_again(client: TestClient):
+    from app.services.model_registry import model_registry
+
+    def post_material():
+        return client.post(
+            "/materials",
+            files={
+                "specular_image": ("specular.png", create_colored_test_image("yellow"), "image/png"),
+                "non_specular_image": ("non_specular.png", create_colored_test_image("purple"), "image/png"),
+            },
+            data={
+                "name": "Cache_test",
+                "category": "METAL",
+                "store_in_db": "false",
+            },
+        )
+
+    first = post_material()
+    inference_count = model_registry.inference_count
+    second = post_material()
+
+    assert first.status_code == second.status_code == 200
+    assert model_registry.inference_count == inference_count # ratings of the second upload come from the cache
+    assert first.json()["characteristics"] == second.json()["characteristics"]
+
+def post_material_with_statistics(client: TestClient, name: str, store_in_db: bool):
+    return client.post(
+        "/materials",
+        files={
+            "specular_image": ("specular.png", create_colored_test_image((200, 180, 20)), "image/png"),
+            "non_specular_image": ("non_specular.png", create_colored_test_image((20, 40, 200)), "image/png"),
+        },
+        data={
+            "name": name,
+            "category": "WOOD",
+            "store_in_db": str(store_in_db).lower(),
+            "include_statistics": "true",
+        },
+    )
+
+def test_create_material_with_statistics(client: TestClient, monkeypatch):
+    response = post_material_with_statistics(client, "Statistics_test", store_in_db=True)
+    assert response.status_code == 201
+    material = response.json()
+    statistics = material["statistics"]
+    assert statistics["material_id"] == material["id"]
+    assert len(statistics["non_specular"]["statistics"]) == len(statistics["specular"]["normalized_statistics"]) == 14
+    assert statistics["non_specular"]["statistics"] != statistics["specular"]["statistics"]
+
+    # statistics are stored with the material, so they are not computed again
+    import app.services.material_service as material_service
+    monkeypatch.setattr(material_service, "compute_image_statistics", lambda *args: pytest.fail("statistics computed again"))
+    response = client.get(f"/materials/{material['id']}/statistics")
+    assert response.status_code == 200
+    assert response.json() == statistics
+
+    # statistics are not part of the response unless requested
+    response = client.post(
+        "/materials",
+        files={
+            "specular_image": ("specular.png", create_test_image(), "image/png"),
+            "non_specular_image": ("non_specular.png", create_test_image(), "image/png"),
+        },
+        data={"name": "No_statistics_test", "category": "WOOD", "store_in_db": "false"},
+    )
+    assert response.status_code == 200
+    assert response.json()["statistics"] is None
+
+def test_get_statistics_of_material_stored_without_them(client: TestClient, session, monkeypatch):
+    from app.models.material_statistics import MaterialStatistics
+
+    material_id = post_material_with_statistics(client, "Older_material", store_in_db=True).json()["id"]
+    session.query(MaterialStatistics).delete() # material stored before statistics were stored at ingest
+    session.commit()
+
+    from app.services.model_registry import model_registry
+    model_registry.unload()
+    response = client.get(f"/materials/{material_id}/statistics")
+    assert response.status_code == 200
+    statistics = response.json()
+    assert statistics["specular"]["statistics"]["luminance_mean"] > 0
+    assert not model_registry.is_ready() # statistics do not load CLIP and the MLP
+
+    import app.services.material_service as material_service
+    monkeypatch.setattr(material_service, "compute_image_statistics", lambda *args: pytest.fail("statistics computed again"))
+    assert client.get(f"/materials/{material_id}/statistics").json() == statistics
+
+def test_get_statistics_not_found(client: TestClient):
+    response = client.get("/materials/9999/statistics")
+    assert response.status_code == 404
+
+def test_get_material_plot(client: TestClient, temp_image_dir, monkeypatch):
+    material_id = post_material_with_statistics(client, "Plot_test", store_in_db=True).json()["id"]
+
+    for kind, size in (("line", (1500, 900)), ("polar", (1500, 1000))):
+        response = client.get(f"/materials/{material_id}/plot/{kind}", params={"color": "red"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+        assert Image.open(io.BytesIO(response.content)).size == size
+
+    etag = response.headers["etag"]
+    response = client.get(f"/materials/{material_id}/plot/polar", params={"color": "red"}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    # other color is another plot
+    assert client.get(f"/materials/{material_id}/plot/polar", params={"color": "#00ff00"}, headers={"If-None-Match": etag}).status_code == 200
+
+    # second request is served from the cached file
+    assert any("_polar_plot_" in name for name in os.listdir(temp_image_dir))
+    from app.domain.fingerprinting.fingerprint_plots import plot_renderer
+    monkeypatch.setattr(plot_renderer, "render_png", lambda *args: pytest.fail("plot rendered again"))
+    cached = client.get(f"/materials/{material_id}/plot/polar", params={"color": "red"})
+    assert cached.status_code == 200
+    assert cached.headers["etag"] == etag
+
+def test_get_material_plot_invalid(client: TestClient):
+    material_id = post_material_with_statistics(client, "Plot_invalid_test", store_in_db=True).json()["id"]
+
+    assert client.get(f"/materials/{material_id}/plot/polar", params={"color": "not-a-color"}).status_code == 400
+    assert client.get(f"/materials/{material_id}/plot/bar").status_code == 422
+    assert client.get("/materials/9999/plot/line").status_code == 404
+
+def test_get_material_chart_svg_and_json(client: TestClient, temp_image_dir):
+    material_id = post_material_with_statistics(client, "Chart_test", store_in_db=True).json()["id"]
+
+    svg = client.get(f"/materials/{material_id}/plot/polar", params={"color": "red", "format": "svg"})
+    assert svg.status_code == 200
+    assert svg.headers["content-type"] == "image/svg+xml"
+    assert svg.text.startswith("<svg") and 'stroke="#ff0000"' in svg.text
+    assert len(svg.content) < 16000
+
+    geometry = client.get(f"/materials/{material_id}/plot/line", params={"format": "json"}).json()
+    characteristics = client.get("/materials").json()[0]["characteristics"]
+    assert [point["rating"] for point in geometry["points"]][:2] == [characteristics["color_vibrancy"], characteristics["surface_roughness"]]
+    assert os.listdir(temp_image_dir) and not any("_plot_" in name for name in os.listdir(temp_image_dir)) # nothing rendered
+
+def test_get_materials_pages_and_stream(client: TestClient, session, monkeypatch):
+    populate_data(60, bind=session.get_bind()) # random names repeat, ties are ordered by ID
+    all_materials = client.get("/materials").json()
+    assert len(all_materials) == 60
+
+    pages, cursor = [], None
+    while True:
+        response = client.get("/materials", params={"limit": 7, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert [len(page) for page in pages] == [7] * 8 + [4]
+    assert [material for page in pages for material in page] == all_materials
+
+    monkeypatch.setattr("app.services.material_service.MATERIALS_STREAM_PAGE_SIZE", 8)
+    response = client.get("/materials", params={"stream": "true"})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == all_materials
+
+    # stream continues after the cursor, filters apply to pages and stream
+    cursor = client.get("/materials", params={"limit": 10}).headers["X-Next-Cursor"]
+    response = client.get("/materials", params={"stream": "true", "cursor": cursor})
+    assert [json.loads(line) for line in response.text.splitlines()] == all_materials[10:]
+    response = client.get("/materials", params={"categories": ["WOOD"], "limit": 100})
+    assert response.json() == [material for material in all_materials if material["category"] == "WOOD"]
+    assert "X-Next-Cursor" not in response.headers
+
+def test_get_materials_invalid_cursor(client: TestClient):
+    for cursor in ("not a cursor", "WyJhIl0", "eyJhIjogMX0"): # not base64, ["a"], {"a": 1}
+        assert client.get("/materials", params={"cursor": cursor}).status_code == 400
+        assert client.get("/materials", params={"cursor": cursor, "stream": "true"}).status_code == 400
+    assert client.get("/materials", params={"limit": 0}).status_code == 422
+
+def test_search_materials_and_name_match(client: TestClient, session):
+    populate_data(60, bind=session.get_bind()) # names are an adjective and a noun, e.g. ShinyGem
+    all_materials = client.get("/materials").json()
+
+    response = client.get("/materials", params={"name": "shiny", "name_match": "PREFIX"})
+    assert response.json() == [material for material in all_materials if material["name"].lower().startswith("shiny")]
+
+    response = client.get("/materials/search", params={"name": "shinny", "limit": 100})
+    assert response.status_code == 200
+    found = response.json()
+    assert found and all(material["name"].startswith("Shiny") for material in found if material["score"] == 1.0)
+    assert [material["score"] for material in found] == sorted((material["score"] for material in found), reverse=True)
+    assert client.get("/materials/search", params={"name": "sh"}).status_code == 422
+
+    found = client.get("/materials/search", params={"name": "Wavw"}).json() # one typo
+    assert found and all("Wave" in material["name"] for material in found)
+
+    # similarity filters search names in the same index
+    material_id = all_materials[0]["id"]
+    response = client.get(f"/materials/{material_id}/similar", params={"name": "shinny", "name_match": "FUZZY"})
+    fuzzy_ids = {material["id"] for material in client.get("/materials", params={"name": "shinny", "name_match": "FUZZY"}).json()}
+    assert {material["id"] for material in response.json()} == fuzzy_ids
+
+def test_get_similar_materials_from_neighbour_lists(client: TestClient, session, monkeypatch):
+    populate_data(40, bind=session.get_bind())
+    material_id = client.get("/materials").json()[0]["id"]
+    params = {"limit": 5, "offset": 2}
+    expected = client.get(f"/materials/{material_id}/similar", params=params).json()
+
+    monkeypatch.setattr(config, "NEIGHBOUR_LIST_SIZE", 10)
+    neighbours_repository = SQLiteMaterialNeighboursRepository(session)
+    build_neighbour_lists(SQLiteMaterialRepository(session), neighbours_repository)
+    response = client.get(f"/materials/{material_id}/similar", params=params).json()
+    assert [material["id"] for material in response] == [material["id"] for material in expected]
+    assert [material["similarity"] for material in response] == pytest.approx([material["similarity"] for material in expected])
+
+    # stored material is added to the lists
+    response = client.post(
+        "/materials",
+        files={
+            "specular_image": ("specular.png", create_test_image(), "image/png"),
+            "non_specular_image": ("non_specular.png", create_test_image(), "image/png"),
+        },
+        data={"name": "Neighbour_test", "category": "WOOD", "store_in_db": "true"},
+    )
+    assert response.status_code == 201
+    assert neighbours_repository.is_up_to_date(10)
+    neighbour_ids, _ = neighbours_repository.get_neighbours(response.json()["id"], 10)
+    assert neighbour_ids[0] == response.json()["id"]
+
+def test_create_material_stored_when_statistics_and_neighbour_lists_fail(client: TestClient, session, monkeypatch):
+    from app.db.repository.sqlite_material_statistics_repository import SQLiteMaterialStatisticsRepository
+
+    populate_data(20, bind=session.get_bind())
+    monkeypatch.setattr(config, "NEIGHBOUR_LIST_SIZE", 10)
+    neighbours_repository = SQLiteMaterialNeighboursRepository(session)
+    build_neighbour_lists(SQLiteMaterialRepository(session), neighbours_repository)
+
+    def fail(*args):
+        raise RuntimeError("write failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(SQLiteMaterialStatisticsRepository, "add_statistics", fail)
+        patch.setattr(SQLiteMaterialNeighboursRepository, "update_neighbours", fail)
+        response = post_material_with_statistics(client, "Failed_writes_test", store_in_db=True)
+    assert response.status_code == 201
+    material_id = response.json()["id"]
+    assert not neighbours_repository.is_up_to_date(10)
+
+    # statistics are computed from the stored images, the next stored material adds both to the lists
+    response = client.get(f"/materials/{material_id}/statistics")
+    assert response.status_code == 200
+    assert response.json()["specular"]["statistics"]["luminance_mean"] > 0
+
+    response = post_material_with_statistics(client, "Next_material", store_in_db=True)
+    assert response.status_code == 201
+    assert neighbours_repository.is_up_to_date(10)
+    assert neighbours_repository.get_neighbours(material_id, 10) is not None
@@ -0,0 +1,73 @@
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.database_writer import database_writer
+from app.db.repository.sqlite_fingerprint_cache_repository import SQLiteFingerprintCacheRepository
+from app.models.material import Base
+from app.models.fingerprint_cache_entry import FingerprintCacheEntry
+from app.services.fingerprint_cache import FingerprintCache, get_fingerprint_cache_key
+
+
+def create_repository(max_entries):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return SQLiteFingerprintCacheRepository(sessionmaker(bind=engine), max_entries)
+
+def test_cache_key():
+    image = np.zeros((4, 4, 3), dtype=np.uint8)
+    other = image.copy()
+    other[0, 0, 0] = 1
+
+    assert get_fingerprint_cache_key(image, image, "v1") == get_fingerprint_cache_key(image.copy(), image.copy(), "v1")
+    assert get_fingerprint_cache_key(image, image, "v1") != get_fingerprint_cache_key(image, other, "v1")
+    assert get_fingerprint_cache_key(image, other, "v1") != get_fingerprint_cache_key(other, image, "v1")
+    assert get_fingerprint_cache_key(image, image, "v1") != get_fingerprint_cache_key(image, image, "v2")
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = FingerprintCache(max_entries=2)
+    cache.put("a", np.full(16, 1))
+    cache.put("b", np.full(16, 2))
+    cache.get("a")
+    cache.put("c", np.full(16, 3))
+
+    assert cache.get("b") is None
+    assert cache.get("a")[0] == 1
+    assert cache.get("c")[0] == 3
+    assert (cache.memory_hits, cache.misses) == (3, 1)
+
+def test_persistent_cache():
+    repository = create_repository(max_entries=2)
+    ratings = np.arange(16, dtype=np.float32) / 4
+
+    FingerprintCache(max_entries=10, repository=repository).put("a", ratings)
+    cache = FingerprintCache(max_entries=10, repository=repository) # e.g. other worker process
+    assert np.array_equal(cache.get("a"), ratings)
+    assert cache.repository_hits == 1
+    cache.get("a")
+    assert cache.memory_hits == 1
+
+    cache.put("b", ratings)
+    cache.put("c", ratings)
+    assert repository.get_ratings("a") is None # oldest entry is evicted from the table
+    assert repository.get_ratings("c") is not None
+
+def test_persistent_cache_hits_touch_only_stale_entries():
+    repository = create_repository(max_entries=10)
+    repository.add_ratings("a", np.zeros(16, dtype=np.float32))
+
+    def get_last_used_at():
+        database_writer.run(lambda: None) # waits for the writes submitted before
+        with repository.session_factory() as db:
+            return db.get(FingerprintCacheEntry, "a").last_used_at
+
+    last_used_at = get_last_used_at()
+    assert repository.get_ratings("a") is not None
+    assert get_last_used_at() == last_used_at # recently used entry is not written by a hit
+
+    with repository.session_factory() as db:
+        db.get(FingerprintCacheEntry, "a").last_used_at = last_used_at - repository.touch_interval_seconds
+        db.commit()
+    assert repository.get_ratings("a") is not None
+    assert get_last_used_at() >= last_used_at
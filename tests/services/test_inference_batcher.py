@@ -0,0 +1,27 @@
+import torch
+
+from app.services.inference_batcher import InferenceBatcher
+from app.services.model_registry import model_registry
+
+
+class FakeAnalyzer:
+    def __init__(self):
+        self.batches = []
+
+    def get_ratings_batch(self, imgs: torch.Tensor):
+        self.batches.append(len(imgs) // 2)
+        # rating of a material is the mean of its non specular image, so results can be matched to requests
+        return imgs[0::2].reshape(len(imgs) // 2, -1).mean(dim=1, keepdim=True).repeat(1, 16).numpy()
+
+def test_concurrent_requests_are_batched(monkeypatch):
+    analyzer = FakeAnalyzer()
+    monkeypatch.setattr(model_registry, "get_analyzer", lambda: analyzer)
+
+    batcher = InferenceBatcher(max_batch_size=4, max_wait_ms=200)
+    futures = [batcher.submit(torch.full((2, 3, 4, 4), float(i))) for i in range(6)]
+    results = [future.result(timeout=5) for future in futures]
+    batcher.shutdown()
+
+    assert [result[0] for result in results] == [float(i) for i in range(6)] # every request gets its own ratings
+    assert analyzer.batches == [4, 2]
+    assert batcher.get_batch_size_distribution() == {4: 1, 2: 1}